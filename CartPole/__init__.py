@@ -17,55 +17,61 @@ import timeit
 # To detect the latest csv file
 
 import numpy as np
-import pandas as pd
 from Control_Toolkit.Controllers import template_controller
 from Control_Toolkit.others.environment import EnvironmentBatched
 from Control_Toolkit.others.globals_and_utils import (
     get_available_controller_names, get_available_optimizer_names, get_controller_name, get_optimizer_name, import_controller_by_name)
 from others.globals_and_utils import MockSpace, create_rng, load_config
-from others.p_globals import (P_GLOBALS, J_fric, L, m_cart, M_fric, TrackHalfLength,
+from others.p_globals import (J_fric, L, m_cart, M_fric, TrackHalfLength,
                               controlBias, controlDisturbance, export_globals,
                               g, k, m_pole, u_max, v_max)
-# Interpolate function to create smooth random track
-from scipy.interpolate import BPoly, interp1d
-# Run range() automatically adding progress bar in terminal
-from tqdm import trange
 
 from CartPole._CartPole_mathematical_helpers import wrap_angle_rad
 from CartPole.cartpole_model import Q2u, s0
 from CartPole.cartpole_numba import (cartpole_integration_numba,
                                      cartpole_ode_numba, edge_bounce_numba)
+from CartPole.downsampling import plot_downsampled
+from CartPole.instrumentation import ControllerLatencyTracker, Instrumentation
 from CartPole.latency_adder import LatencyAdder
 from CartPole.load import get_full_paths_to_csvs, load_csv_recording
 from CartPole.noise_adder import NoiseAdder
+from CartPole.recording_metadata import recording_header
 from CartPole.state_utilities import (ANGLE_COS_IDX, ANGLE_IDX, ANGLE_SIN_IDX,
                                       ANGLED_IDX, POSITION_IDX, POSITIOND_IDX)
+from CartPole.state_snapshot import StateSnapshot
+from CartPole.warmup import warmup_controller, warmup_dynamics_kernels
 
 # region Imported modules
 
-try:
-    # Use gitpython to get a current revision number and use it in description of experimental data
-    from git import Repo
-except:
-    pass
-
 # check memory usage of chosen methods. Commented by default
 # from memory_profiler import profile
 
-# region Graphics imports
-import matplotlib.pyplot as plt
-# rc sets global parameters for matplotlib; transforms is used to rotate the Mast
-from matplotlib import animation, rc, transforms
-# Shapes used to draw a Cart and the slider
-from matplotlib.patches import (Circle, FancyArrowPatch, FancyBboxPatch,
-                                Rectangle)
-
 # Angle convention to rotate the mast in right direction - depends on used Equation
 from CartPole.cartpole_model import ANGLE_CONVENTION
 
-# Set the font parameters for matplotlib figures
-font = {'size': 22}
-rc('font', **font)
+# region Graphics imports
+# matplotlib, pandas, scipy, tqdm and gitpython are imported where they are used,
+# so that a headless simulation (e.g. data generation, gym environment) loads only numpy and numba.
+plt = None
+animation = transforms = None
+Circle = FancyArrowPatch = FancyBboxPatch = Rectangle = None
+
+
+def _import_graphics():
+    """Imports matplotlib into the module namespace at the first use of graphics"""
+    global plt, animation, transforms, Circle, FancyArrowPatch, FancyBboxPatch, Rectangle
+    if plt is not None:
+        return
+    import matplotlib.pyplot as plt
+    # rc sets global parameters for matplotlib; transforms is used to rotate the Mast
+    from matplotlib import animation, rc, transforms
+    # Shapes used to draw a Cart and the slider
+    from matplotlib.patches import (Circle, FancyArrowPatch, FancyBboxPatch,
+                                    Rectangle)
+
+    # Set the font parameters for matplotlib figures
+    font = {'size': 22}
+    rc('font', **font)
 # endregion
 
 # endregion
@@ -75,6 +81,21 @@ PATH_TO_EXPERIMENT_RECORDINGS_DEFAULT = config["cartpole"]["PATH_TO_EXPERIMENT_R
 
 rng = create_rng(__name__, config["cartpole"]["seed"])
 
+# Methods timed if instrumentation is enabled in config.yml: method name -> stage name
+INSTRUMENTED_STAGES = {
+    'update_state': 'update_state',
+    'update_parameters': 'parameters_update',
+    'update_target_position': 'target_update',
+    'update_target_equilibrium': 'target_update',
+    'cartpole_integration': 'integration',
+    'edge_bounce': 'edge_bounce',
+    'add_noise_and_latency': 'noise_and_latency',
+    'Update_Q': 'controller_update',
+    'cartpole_ode': 'ode',
+    'save_csv_routine': 'saving',
+    'save_history_csv': 'saving_to_file',
+}
+
 
 class CartPole(EnvironmentBatched):
     num_states = 6
@@ -218,6 +239,9 @@ class CartPole(EnvironmentBatched):
         self.slider_max = 1.0
         self.slider_value = 0.0
 
+        # State handed over from the simulation thread to the animation, see publish_snapshot
+        self.snapshot = StateSnapshot()
+
         self.show_hanging_pole = False
 
         self.physical_to_graphics = None
@@ -254,7 +278,7 @@ class CartPole(EnvironmentBatched):
         self.Slider_Arrow = None
         self.t2 = None  # An abstract container for the transform rotating the mast
 
-        self.init_graphical_elements()  # Assign proper object to the above variables
+        # Proper objects are assigned to the above variables by init_graphical_elements at the first drawing
         # endregion
         
         self.target_position = 0.0
@@ -264,6 +288,11 @@ class CartPole(EnvironmentBatched):
         self.time_last_target_equilibrium_change = None
 
         self.Q_update_time = None
+        self.controller_latency = ControllerLatencyTracker()  # Reset with every new experiment
+
+        # Per-stage timers of the simulation loop, see CartPole/instrumentation.py
+        self.instrumentation = Instrumentation(**self.config["instrumentation"])
+        self.instrumentation.instrument_methods(self, INSTRUMENTED_STAGES)
 
         # region Initialize CartPole in manual-stabilization mode
         self.set_controller(controller_name='manual-stabilization')
@@ -475,6 +504,8 @@ class CartPole(EnvironmentBatched):
 
 
     def edge_bounce(self):
+        if self.instrumentation.enabled and abs(self.s[POSITION_IDX]) >= TrackHalfLength:
+            self.instrumentation.count('edge_bounces')
         # Elastic collision at edges
         self.s[ANGLE_IDX], self.s[ANGLED_IDX], self.s[POSITION_IDX], self.s[POSITIOND_IDX] = edge_bounce_numba(
             self.s[ANGLE_IDX],
@@ -508,6 +539,9 @@ class CartPole(EnvironmentBatched):
                     {"target_position": self.target_position, "target_equilibrium": self.target_equilibrium, 'L': float(self.L_for_controller)}
                 ))
                 self.Q_update_time = timeit.default_timer()-update_start
+                self.controller_latency.add(self.Q_update_time, self.time)
+                if self.instrumentation.enabled:
+                    self.instrumentation.record('controller_step', update_start, self.Q_update_time)
                 self.Q_applied = self.Q_calculated + controlDisturbance * rng.standard_normal(size=np.shape(self.Q_calculated), dtype=np.float32) + controlBias
 
             self.Q = self.Q_applied
@@ -575,40 +609,10 @@ class CartPole(EnvironmentBatched):
             print('Saving to the file: {}'.format(self.csv_filepath))
             # Write the .csv file
             with open(self.csv_filepath, "a", newline='') as outfile:
+                # Static part of the header (git revision, dt, controller, parameters) is formatted once per configuration
+                outfile.write(recording_header(length_of_experiment, self.dt_simulation, self.dt_controller, self.dt_save,
+                                               self.controller_name, self.optimizer_name))
                 writer = csv.writer(outfile)
-
-                writer.writerow(['# ' + 'This is CartPole simulation from {} at time {}'
-                                .format(datetime.now().strftime('%d.%m.%Y'), datetime.now().strftime('%H:%M:%S'))])
-                try:
-                    repo = Repo()
-                    git_revision = repo.head.object.hexsha
-                except:
-                    git_revision = 'unknown'
-                writer.writerow(['# ' + 'Done with git-revision: {}'
-                                .format(git_revision)])
-
-                writer.writerow(['#'])
-                writer.writerow(['# Length of experiment: {} s'.format(str(length_of_experiment))])
-
-                writer.writerow(['#'])
-                writer.writerow(['# Time intervals dt:'])
-                writer.writerow(['# Simulation: {} s'.format(str(self.dt_simulation))])
-                writer.writerow(['# Controller update: {} s'.format(str(self.dt_controller))])
-                writer.writerow(['# Saving: {} s'.format(str(self.dt_save))])
-
-                writer.writerow(['#'])
-
-                writer.writerow(['# Controller: {}'.format(self.controller_name)])
-                if self.optimizer_name:
-                    writer.writerow(['# MPC Optimizer: {}'.format(self.optimizer_name)])
-
-                writer.writerow(['#'])
-                writer.writerow(['# Parameters:'])
-                for k in P_GLOBALS.__dict__:
-                    writer.writerow(['# ' + k + ': ' + str(getattr(P_GLOBALS, k))])
-                writer.writerow(['#'])
-
-                writer.writerow(['# Data:'])
                 writer.writerow(self.dict_history.keys())
 
         elif mode == 'save online':
@@ -645,9 +649,17 @@ class CartPole(EnvironmentBatched):
         data = load_csv_recording(file_paths[0])
         return data, file_paths[0]
 
+    # load the recording as column arrays for replay (memory-mapped if big)
+    def load_history_replay(self, csv_name=None):
+        from CartPole.replay import ReplayRecording
+        file_paths = get_full_paths_to_csvs(default_locations=self.path_to_experiment_recordings, csv_names=csv_name)
+        return ReplayRecording.from_csv(file_paths[0]), file_paths[0]
+
     # Method plotting the dynamic evolution over time of the CartPole
     # It should be called after an experiment and only if experiment data was saved
+    # Long histories are plotted downsampled to their min/max at the visible resolution, refined on zoom
     def summary_plots(self, adaptive_mode=False, title=''):
+        _import_graphics()
 
         if adaptive_mode:
             number_of_subplots = 5
@@ -663,33 +675,33 @@ class CartPole(EnvironmentBatched):
 
         # Plot angle error
         axs[0].set_ylabel("Angle (deg)", fontsize=fontsize_labels)
-        axs[0].plot(np.array(self.dict_history['time']), np.array(self.dict_history['angle']) * 180.0 / np.pi,
-                    'b', markersize=12, label='Ground Truth')
+        plot_downsampled(axs[0], np.array(self.dict_history['time']), np.array(self.dict_history['angle']) * 180.0 / np.pi,
+                         'b', markersize=12, label='Ground Truth')
         axs[0].tick_params(axis='both', which='major', labelsize=fontsize_ticks)
 
         # Plot position
         axs[1].set_ylabel("position (m)", fontsize=fontsize_labels)
-        axs[1].plot(self.dict_history['time'], self.dict_history['position'], 'g', markersize=12,
-                    label='Ground Truth')
+        plot_downsampled(axs[1], self.dict_history['time'], self.dict_history['position'], 'g', markersize=12,
+                         label='Ground Truth')
         axs[1].tick_params(axis='both', which='major', labelsize=fontsize_ticks)
 
         # Plot motor input command
         try:
             axs[2].set_ylabel("motor (N)", fontsize=fontsize_labels)
-            axs[2].plot(self.dict_history['time'], self.dict_history['u'], 'r', markersize=12,
-                        label='motor')
+            plot_downsampled(axs[2], self.dict_history['time'], self.dict_history['u'], 'r', markersize=12,
+                             label='motor')
             axs[2].tick_params(axis='both', which='major', labelsize=fontsize_ticks)
             axs[2].set_ylim(bottom=-1.05*u_max, top=1.05*u_max)
         except KeyError:
             axs[2].set_ylabel("motor normalized (-)", fontsize=fontsize_labels)
-            axs[2].plot(self.dict_history['time'], self.dict_history['Q'], 'r', markersize=12,
-                        label='motor')
+            plot_downsampled(axs[2], self.dict_history['time'], self.dict_history['Q'], 'r', markersize=12,
+                             label='motor')
             axs[2].tick_params(axis='both', which='major', labelsize=fontsize_ticks)
             axs[2].set_ylim(bottom=-1.05, top=1.05)
 
         # Plot target position
         axs[3].set_ylabel("position target (m)", fontsize=fontsize_labels)
-        axs[3].plot(self.dict_history['time'], self.dict_history['target_position'], 'k')
+        plot_downsampled(axs[3], self.dict_history['time'], self.dict_history['target_position'], 'k')
         axs[3].tick_params(axis='both', which='major', labelsize=fontsize_ticks)
 
 
@@ -761,6 +773,9 @@ class CartPole(EnvironmentBatched):
         else:
             raise NotImplementedError('There is no mode corresponding to this value of turning_points_period variable')
 
+        # Interpolate function to create smooth random track
+        from scipy.interpolate import BPoly, interp1d
+
         # Try algorithm setting derivative to 0 a each point
         if self.interpolation_type == '0-derivative-smooth':
             yder = [[y[i], 0] for i in range(len(y))]
@@ -891,6 +906,8 @@ class CartPole(EnvironmentBatched):
         else:
             raise ValueError('Unknown save mode value')
 
+        self.instrumentation.reset()
+
         # Create csv file for saving
         self.save_history_csv(csv_name=csv, mode='init', length_of_experiment=self.length_of_experiment)
 
@@ -898,6 +915,9 @@ class CartPole(EnvironmentBatched):
         if save_mode == 'online':
             self.save_history_csv(csv_name=csv, mode='save online')
 
+        # Run range() automatically adding progress bar in terminal
+        from tqdm import trange
+
         # Run the CartPole experiment for number of time
         for _ in trange(self.number_of_timesteps_in_random_experiment):
 
@@ -927,6 +947,7 @@ class CartPole(EnvironmentBatched):
                 self.save_history_csv(csv_name=csv, mode='save online')
                 self.save_flag = False
 
+        import pandas as pd
         data = pd.DataFrame(self.dict_history)
 
         if save_mode == 'offline':
@@ -938,6 +959,13 @@ class CartPole(EnvironmentBatched):
         mean_abs_angle = np.mean(np.abs(self.dict_history["angle"])) * 180.0 / np.pi
         print(f"Mean absolute distance to target: {mean_abs_dist}m\nMean absolute angle: {mean_abs_angle}deg")
 
+        self.controller_latency.print_report()
+
+        if self.instrumentation.enabled:
+            self.instrumentation.print_summary()
+            self.instrumentation.export_json(self.csv_filepath[:-4] + '_instrumentation.json')
+            self.instrumentation.export_chrome_trace(self.csv_filepath[:-4] + '_trace.json')
+
         # Set CartPole state - the only use is to make sure that experiment history is discared
         # Maybe you can delete this line
         self.set_cartpole_state_at_t0(reset_mode=0)
@@ -982,13 +1010,13 @@ class CartPole(EnvironmentBatched):
 
             else:
                 self.controller.configure()
-            
-                
+
+        if self.config["warmup"]:
+            self.warmup()
+
         # Set the maximal allowed value of the slider - relevant only for GUI
-        if self.controller_name == 'manual-stabilization':
-            self.Slider_Arrow.set_positions((0, 0), (0, 0))
-        else:
-            self.Slider_Bar.set_width(0.0)
+        if self.Mast is not None:
+            self.reset_slider_drawing()
 
         # TODO: optimally reset_dict_history would be False and the controller could be switched during experiment
         #   The False option is not implemented yet. So it is possible to switch controller only when the experiment is not running.
@@ -997,6 +1025,41 @@ class CartPole(EnvironmentBatched):
 
         return True
 
+    def warmup(self):
+        """
+        Compiles numba kernels of the simulation step and of the batched dynamics,
+        and the kernels of the current controller (see CartPole/warmup.py).
+        The state of CartPole is not changed.
+
+        :returns: dict with time in seconds taken by each part
+        """
+        timings = {}
+
+        # Run the numba-compiled steps of update_state on the current state and restore it
+        # Two steps: argument types at the first simulation step differ from these later (outputs of numba functions)
+        start = timeit.default_timer()
+        s, angleDD, positionDD, u, dt_simulation = np.copy(self.s), self.angleDD, self.positionDD, self.u, self._dt_simulation
+        if self._dt_simulation is None:
+            self._dt_simulation = 0.002  # Only the type matters for compilation
+        for _ in range(2):
+            self.cartpole_integration()
+            self.edge_bounce()
+            self.u = Q2u(self.Q)
+            self.cartpole_ode()
+        self.s[...], self.angleDD, self.positionDD, self.u, self._dt_simulation = s, angleDD, positionDD, u, dt_simulation
+        timings['simulation_step'] = timeit.default_timer() - start
+
+        timings['dynamics_batched'] = warmup_dynamics_kernels()
+
+        if self.controller_name != 'manual-stabilization':
+            timings['controller'] = warmup_controller(
+                self.controller,
+                self.s,
+                {"target_position": self.target_position, "target_equilibrium": self.target_equilibrium, 'L': float(self.L_for_controller)}
+            )
+
+        return timings
+
     # This method resets the internal state of the CartPole instance
     # The starting state (for t = 0) may be
     # all zeros (reset_mode = 0)
@@ -1012,6 +1075,8 @@ class CartPole(EnvironmentBatched):
         except NotImplementedError:
             pass
 
+        self.controller_latency.reset(self.controller_name, deadline=self.dt_controller)
+
         # reset global variables
         global k, m_cart, m_pole, g, J_fric, M_fric, L, v_max, u_max, controlDisturbance, controlBias, TrackHalfLength
         k[...], m_cart[...], m_pole[...], g[...], J_fric[...], M_fric[...], L[...], v_max[...], u_max[...], controlDisturbance[...], controlBias[...], TrackHalfLength[...] = export_globals()
@@ -1057,11 +1122,14 @@ class CartPole(EnvironmentBatched):
                 # in this case slider corresponds already to the power of the motor
                 self.Q_applied = self.slider_value
             else:  # in this case slider gives a target position, lqr regulator
+                update_start = timeit.default_timer()
                 self.Q_applied = float(self.controller.step(
                     self.s,
                     self.time,
                     {"target_position": self.target_position, "target_equilibrium": self.target_equilibrium, "L": float(self.L_for_controller)}
                 ))
+                # First call of a controller often includes compilation - it is kept as a spike
+                self.controller_latency.add(timeit.default_timer() - update_start, self.time)
                 self.Q_applied = self.Q_calculated + controlDisturbance * rng.standard_normal(
                     size=np.shape(self.Q_calculated), dtype=np.float32) + controlBias
 
@@ -1180,6 +1248,7 @@ class CartPole(EnvironmentBatched):
 
     # This method initializes CartPole elements to be plotted in CartPole GUI
     def init_graphical_elements(self):
+        _import_graphics()
 
         self.CartLength = 10.0
         self.WheelRadius = 0.5
@@ -1237,6 +1306,14 @@ class CartPole(EnvironmentBatched):
                                             arrowstyle='fancy', mutation_scale=50)
         self.Slider_Bar = Rectangle((0.0, 0.0), self.slider_value, 1.0)
         self.t2 = transforms.Affine2D().rotate(0.0)  # An abstract container for the transform rotating the mast
+        self.reset_slider_drawing()
+
+    # Depending on the controller the slider is displayed either as bar or as an arrow - the other one is hidden
+    def reset_slider_drawing(self):
+        if self.controller_name == 'manual-stabilization':
+            self.Slider_Arrow.set_positions((0, 0), (0, 0))
+        else:
+            self.Slider_Bar.set_width(0.0)
 
     # This method accepts the mouse position and updated the slider value accordingly
     # The mouse position has to be captured by a function not included in this class
@@ -1253,6 +1330,8 @@ class CartPole(EnvironmentBatched):
     # This method draws elements and set properties of the CartPole figure
     # which do not change at every frame of the animation
     def draw_constant_elements(self, fig, AxCart, AxSlider):
+        if self.Mast is None:
+            self.init_graphical_elements()
 
         ## Upper chart with Cart Picture
         # Set x and y limits
@@ -1320,34 +1399,40 @@ class CartPole(EnvironmentBatched):
     # e.g. animation function from matplotlib package
     def update_drawing(self):
 
+        # While a thread publishes snapshots draw the most recent one, not the state it is just updating
+        if self.snapshot.active:
+            s, Q, L_drawn, _ = self.snapshot.read()
+        else:
+            s, Q, L_drawn = self.s, self.Q, float(L)
+
         self.x_acceleration_arrow = (
-                                   self.s[POSITION_IDX]*self.physical_to_graphics +
-                                   # np.sign(self.Q) * (self.CartLength / 2.0) +
-                                   self.scaling_dx_acceleration_arrow * self.Q
+                                   s[POSITION_IDX]*self.physical_to_graphics +
+                                   # np.sign(Q) * (self.CartLength / 2.0) +
+                                   self.scaling_dx_acceleration_arrow * Q
         )
 
-        self.Acceleration_Arrow.set_positions((self.s[POSITION_IDX]*self.physical_to_graphics, self.y_acceleration_arrow),
+        self.Acceleration_Arrow.set_positions((s[POSITION_IDX]*self.physical_to_graphics, self.y_acceleration_arrow),
                                              (self.x_acceleration_arrow, self.y_acceleration_arrow))
 
         # Draw mast
-        mast_position = (self.s[POSITION_IDX]*self.physical_to_graphics - (self.MastThickness / 2.0))
+        mast_position = (s[POSITION_IDX]*self.physical_to_graphics - (self.MastThickness / 2.0))
         self.Mast.set_x(mast_position)
-        self.Mast.set_height(self.mast_height_maximal_drawing_units * (float(L) / self.max_height_maximal_physical_units))
+        self.Mast.set_height(self.mast_height_maximal_drawing_units * (L_drawn / self.max_height_maximal_physical_units))
         # Draw rotated mast
         t21 = transforms.Affine2D().translate(-mast_position, -1.25 * self.WheelRadius)
         if ANGLE_CONVENTION == 'CLOCK-NEG':
-            t22 = transforms.Affine2D().rotate(self.s[ANGLE_IDX])
+            t22 = transforms.Affine2D().rotate(s[ANGLE_IDX])
         elif ANGLE_CONVENTION == 'CLOCK-POS':
-            t22 = transforms.Affine2D().rotate(-self.s[ANGLE_IDX])
+            t22 = transforms.Affine2D().rotate(-s[ANGLE_IDX])
         else:
             raise ValueError('Unknown angle convention')
         t23 = transforms.Affine2D().translate(mast_position, 1.25 * self.WheelRadius)
         self.t2 = t21 + t22 + t23
         # Draw Chassis
-        self.Chassis.set_x(self.s[POSITION_IDX]*self.physical_to_graphics - (self.CartLength / 2.0))
+        self.Chassis.set_x(s[POSITION_IDX]*self.physical_to_graphics - (self.CartLength / 2.0))
         # Draw Wheels
-        self.WheelLeft.center = (self.s[POSITION_IDX]*self.physical_to_graphics - self.WheelToMiddle, self.y_wheel)
-        self.WheelRight.center = (self.s[POSITION_IDX]*self.physical_to_graphics + self.WheelToMiddle, self.y_wheel)
+        self.WheelLeft.center = (s[POSITION_IDX]*self.physical_to_graphics - self.WheelToMiddle, self.y_wheel)
+        self.WheelRight.center = (s[POSITION_IDX]*self.physical_to_graphics + self.WheelToMiddle, self.y_wheel)
         # Draw SLider
         if self.controller_name == 'manual-stabilization':
             self.Slider_Bar.set_width(self.slider_value)
@@ -1357,8 +1442,14 @@ class CartPole(EnvironmentBatched):
         return self.Mast, self.t2, self.Chassis, self.WheelRight, self.WheelLeft,\
                self.Slider_Bar, self.Slider_Arrow, self.Acceleration_Arrow
 
-    # A function redrawing the changing elements of the Figure
-    def run_animation(self, fig):
+    # Hands the current state over to the animation (without blocking either of them)
+    def publish_snapshot(self):
+        self.snapshot.publish(self.s, self.Q, L, self.time)
+
+    # A function redrawing the changing elements of the Figure, at most max_fps times per second
+    def run_animation(self, fig, max_fps=100.0):
+        if self.Mast is None:
+            self.init_graphical_elements()
         def init():
             # Adding variable elements to the Figure
             fig.AxCart.add_patch(self.Mast)
@@ -1385,7 +1476,7 @@ class CartPole(EnvironmentBatched):
                                        init_func=init,
                                        frames=300,
                                        # fargs=(CartPoleInstance,), # It was used when this function was a part of GUI class. Now left as an example how to add arguments to FuncAnimation
-                                       interval=10,
+                                       interval=1000.0 / max_fps,
                                        blit=True,
                                        repeat=True)
         return anim
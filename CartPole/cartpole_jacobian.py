@@ -56,7 +56,7 @@ oo = lambdify((x, v, t, o, u, k, m_cart, m_pole, L, J_fric, M_fric, g), sym.diff
 ou = lambdify((x, v, t, o, u, k, m_cart, m_pole, L, J_fric, M_fric, g), sym.diff(oD, u, 1), "numpy")
 
 
-def cartpole_jacobian(s: Union[np.ndarray, SimpleNamespace], u: float):
+def cartpole_jacobian(s: Union[np.ndarray, SimpleNamespace], u: float, L=param_L):
     """
     Jacobian of cartpole ode with the following structure:
 
@@ -68,6 +68,7 @@ def cartpole_jacobian(s: Union[np.ndarray, SimpleNamespace], u: float):
     
     :param s: State vector following the globally defined variable order
     :param u: Force applied on cart in unnormalized range
+    :param L: Length of the pole (half of it), by default the current global value
 
     The Jacobian is used to linearize the CartPole dynamics around the origin
 
@@ -101,13 +102,13 @@ def cartpole_jacobian(s: Union[np.ndarray, SimpleNamespace], u: float):
 
     J[1, 0] = 0.0  # vx
 
-    J[1, 1] = vv(position, positionD, angle, angleD, u, param_k, param_M, param_m, param_L, param_J_fric, param_M_fric, param_g)
+    J[1, 1] = vv(position, positionD, angle, angleD, u, param_k, param_M, param_m, L, param_J_fric, param_M_fric, param_g)
 
-    J[1, 2] = vt(position, positionD, angle, angleD, u, param_k, param_M, param_m, param_L, param_J_fric, param_M_fric, param_g)
+    J[1, 2] = vt(position, positionD, angle, angleD, u, param_k, param_M, param_m, L, param_J_fric, param_M_fric, param_g)
 
-    J[1, 3] = vo(position, positionD, angle, angleD, u, param_k, param_M, param_m, param_L, param_J_fric, param_M_fric, param_g)
+    J[1, 3] = vo(position, positionD, angle, angleD, u, param_k, param_M, param_m, L, param_J_fric, param_M_fric, param_g)
 
-    J[1, 4] = vu(position, positionD, angle, angleD, u, param_k, param_M, param_m, param_L, param_J_fric, param_M_fric, param_g)
+    J[1, 4] = vu(position, positionD, angle, angleD, u, param_k, param_M, param_m, L, param_J_fric, param_M_fric, param_g)
 
     J[2, 0] = 0.0  # tx
 
@@ -121,13 +122,13 @@ def cartpole_jacobian(s: Union[np.ndarray, SimpleNamespace], u: float):
 
     J[3, 0] = 0.0  # ox
 
-    J[3, 1] = ov(position, positionD, angle, angleD, u, param_k, param_M, param_m, param_L, param_J_fric, param_M_fric, param_g)
+    J[3, 1] = ov(position, positionD, angle, angleD, u, param_k, param_M, param_m, L, param_J_fric, param_M_fric, param_g)
 
-    J[3, 2] = ot(position, positionD, angle, angleD, u, param_k, param_M, param_m, param_L, param_J_fric, param_M_fric, param_g)
+    J[3, 2] = ot(position, positionD, angle, angleD, u, param_k, param_M, param_m, L, param_J_fric, param_M_fric, param_g)
 
-    J[3, 3] = oo(position, positionD, angle, angleD, u, param_k, param_M, param_m, param_L, param_J_fric, param_M_fric, param_g)
+    J[3, 3] = oo(position, positionD, angle, angleD, u, param_k, param_M, param_m, L, param_J_fric, param_M_fric, param_g)
 
-    J[3, 4] = ou(position, positionD, angle, angleD, u, param_k, param_M, param_m, param_L, param_J_fric, param_M_fric, param_g)
+    J[3, 4] = ou(position, positionD, angle, angleD, u, param_k, param_M, param_m, L, param_J_fric, param_M_fric, param_g)
 
     return J
 
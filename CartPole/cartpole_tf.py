@@ -26,11 +26,6 @@ controlDisturbance = tf.convert_to_tensor(controlDisturbance)
 controlBias = tf.convert_to_tensor(controlBias)
 TrackHalfLength = tf.convert_to_tensor(TrackHalfLength)
 
-###
-# FIXME: Currently tf predictor is not modeling edge bounce!
-###
-
-
 # _cartpole_ode_tf = tf.function(_cartpole_ode, jit_compile=True)
 _cartpole_ode_tf = _cartpole_ode
 
@@ -55,26 +50,23 @@ edge_bounce_wrapper_tf = edge_bounce_wrapper
 
 @CompileTF
 def edge_bounce_wrapper(angle, angle_cos, angleD, position, positionD, t_step, L=L):
-    angle_bounced = tf.TensorArray(tf.float32, size=tf.size(angle), dynamic_size=False)
-    angleD_bounced = tf.TensorArray(tf.float32, size=tf.size(angleD), dynamic_size=False)
-    position_bounced = tf.TensorArray(tf.float32, size=tf.size(position), dynamic_size=False)
-    positionD_bounced = tf.TensorArray(tf.float32, size=tf.size(positionD), dynamic_size=False)
+    """
+    Elastic collision at track edges for a whole batch of states - the same as edge_bounce_numba,
+    but branch-free (tf.where instead of if), so that it can be compiled with XLA and does not loop over batch.
+    """
+    bounce = tf.logical_or(position >= TrackHalfLength, -position >= TrackHalfLength)  # Without abs as in edge_bounce
 
-    for i in tf.range(tf.size(position)):
-        angle_i, angleD_i, position_i, positionD_i = edge_bounce_tf(angle[i], angle_cos[i], angleD[i], position[i],
-                                                                    positionD[i],
-                                                                    t_step, L)
-        angle_bounced = angle_bounced.write(i, angle_i)
-        angleD_bounced = angleD_bounced.write(i, angleD_i)
-        position_bounced = position_bounced.write(i, position_i)
-        positionD_bounced = positionD_bounced.write(i, positionD_i)
+    angleD_bounced = angleD - 2 * (positionD * angle_cos) / L
+    angle_bounced = angle + angleD_bounced * t_step
+    positionD_bounced = -positionD
+    position_bounced = position + positionD_bounced * t_step
 
-    angle_bounced_tensor = angle_bounced.stack()
-    angleD_bounced_tensor = angleD_bounced.stack()
-    position_bounced_tensor = position_bounced.stack()
-    positionD_bounced_tensor = positionD_bounced.stack()
+    angle = tf.where(bounce, angle_bounced, angle)
+    angleD = tf.where(bounce, angleD_bounced, angleD)
+    position = tf.where(bounce, position_bounced, position)
+    positionD = tf.where(bounce, positionD_bounced, positionD)
 
-    return angle_bounced_tensor, angleD_bounced_tensor, position_bounced_tensor, positionD_bounced_tensor
+    return angle, angleD, position, positionD
 
 
 @CompileTF
@@ -123,9 +115,8 @@ def _cartpole_fine_integration_tf(angle, angleD,
         angle, angleD, position, positionD = cartpole_integration_tf(angle, angleD, angleDD, position, positionD,
                                                                      positionDD, t_step, )
 
-        # The edge bounce calculation seems to be too much for a GPU to tackle
-        # angle_cos = tf.cos(angle)
-        # angle, angleD, position, positionD = edge_bounce_wrapper(angle, angle_cos, angleD, position, positionD, t_step, L)
+        angle_cos = tf.cos(angle)
+        angle, angleD, position, positionD = edge_bounce_wrapper(angle, angle_cos, angleD, position, positionD, t_step, L)
 
         angle_cos = tf.cos(angle)
         angle_sin = tf.sin(angle)
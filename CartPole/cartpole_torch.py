@@ -0,0 +1,170 @@
+"""
+PyTorch version of the CartPole dynamics: ODE, fine integration, edge bounce and Q2u.
+The equations are the same as in cartpole_model.py - see there before changing anything.
+
+The functions with leading underscore take all parameters as explicit tensor arguments and are written
+to compile with torch.jit.script and torch.compile, e.g.
+    _cartpole_fine_integration_torch_scripted = torch.jit.script(_cartpole_fine_integration_torch)
+The functions without underscore are convenience wrappers filling in the default parameters.
+"""
+
+from typing import Tuple
+
+import torch
+from torch import Tensor
+
+from others.p_globals import (J_fric, L, m_cart, M_fric, TrackHalfLength,
+                              controlBias, controlDisturbance, g, k, m_pole, u_max,
+                              v_max)
+
+from CartPole.state_utilities import (ANGLE_COS_IDX, ANGLE_IDX, ANGLE_SIN_IDX,
+                                      ANGLED_IDX, POSITION_IDX, POSITIOND_IDX)
+
+k = torch.tensor(k)
+m_cart = torch.tensor(m_cart)
+m_pole = torch.tensor(m_pole)
+g = torch.tensor(g)
+J_fric = torch.tensor(J_fric)
+M_fric = torch.tensor(M_fric)
+L = torch.tensor(L)
+v_max = torch.tensor(v_max)
+u_max = torch.tensor(u_max)
+controlDisturbance = torch.tensor(controlDisturbance)
+controlBias = torch.tensor(controlBias)
+TrackHalfLength = torch.tensor(TrackHalfLength)
+
+
+def _cartpole_ode(ca: Tensor, sa: Tensor, angleD: Tensor, positionD: Tensor, u: Tensor,
+                  k: Tensor, m_cart: Tensor, m_pole: Tensor, g: Tensor,
+                  J_fric: Tensor, M_fric: Tensor, L: Tensor) -> Tuple[Tensor, Tensor]:
+    """
+    Calculates current values of second derivative of angle and position
+    from current value of angle and position, and their first derivatives
+
+    :returns: angular acceleration, horizontal acceleration
+    """
+
+    A = (k + 1.0) * (m_cart + m_pole) - m_pole * (ca ** 2)
+    F_fric = - M_fric * positionD  # Force resulting from cart friction, notice that the mass of the cart is not explicitly there
+    T_fric = - J_fric * angleD  # Torque resulting from pole friction
+
+    positionDD = (
+            (
+                    m_pole * g * sa * ca  # Movement of the cart due to gravity
+                    + ((T_fric * ca) / L)  # Movement of the cart due to pend' s friction in the joint
+                    + (k + 1.0) * (
+                            - (m_pole * L * (
+                                        angleD ** 2) * sa)  # Keeps the Cart-Pole center of mass fixed when pole rotates
+                            + F_fric  # Braking of the cart due its friction
+                            + u  # Effect of force applied to cart
+                    )
+            ) / A
+    )
+
+    angleDD = (
+            (
+                    g * sa + positionDD * ca + T_fric / (m_pole * L)
+            ) / ((k + 1.0) * L)
+    )
+
+    return angleDD, positionDD
+
+
+def cartpole_ode(s: Tensor, u: Tensor,
+                 k=k, m_cart=m_cart, m_pole=m_pole, g=g, J_fric=J_fric, M_fric=M_fric, L=L):
+    angleDD, positionDD = _cartpole_ode(
+        s[..., ANGLE_COS_IDX], s[..., ANGLE_SIN_IDX], s[..., ANGLED_IDX], s[..., POSITIOND_IDX], u,
+        k, m_cart, m_pole, g, J_fric, M_fric, L
+    )
+    return angleDD, positionDD
+
+
+def _edge_bounce(angle: Tensor, angle_cos: Tensor, angleD: Tensor, position: Tensor, positionD: Tensor,
+                 t_step: float, L: Tensor, TrackHalfLength: Tensor) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
+    """Elastic collision at track edges for a whole batch of states, branch-free as edge_bounce_wrapper in cartpole_tf.py"""
+    bounce = (position >= TrackHalfLength) | (-position >= TrackHalfLength)
+
+    angleD_bounced = angleD - 2.0 * (positionD * angle_cos) / L
+    angle_bounced = angle + angleD_bounced * t_step
+    positionD_bounced = -positionD
+    position_bounced = position + positionD_bounced * t_step
+
+    angle = torch.where(bounce, angle_bounced, angle)
+    angleD = torch.where(bounce, angleD_bounced, angleD)
+    position = torch.where(bounce, position_bounced, position)
+    positionD = torch.where(bounce, positionD_bounced, positionD)
+
+    return angle, angleD, position, positionD
+
+
+def edge_bounce(angle, angle_cos, angleD, position, positionD, t_step, L=L):
+    return _edge_bounce(angle, angle_cos, angleD, position, positionD, float(t_step), L, TrackHalfLength)
+
+
+def Q2u(Q):
+    """
+    Converts dimensionless motor power [-1,1] to a physical force acting on a cart.
+
+    In future there might be implemented here a more sophisticated model of a motor driving CartPole
+    """
+    u = u_max * Q  # Q is drive -1:1 range
+
+    return u
+
+
+def _cartpole_fine_integration_torch(angle: Tensor, angleD: Tensor,
+                                     angle_cos: Tensor, angle_sin: Tensor,
+                                     position: Tensor, positionD: Tensor,
+                                     u: Tensor, t_step: float,
+                                     intermediate_steps: int, k: Tensor,
+                                     m_cart: Tensor, m_pole: Tensor,
+                                     g: Tensor, J_fric: Tensor,
+                                     M_fric: Tensor, L: Tensor,
+                                     TrackHalfLength: Tensor) -> Tuple[Tensor, Tensor, Tensor, Tensor, Tensor, Tensor]:
+    for _ in range(intermediate_steps):
+        # Find second derivative for CURRENT "k" step (same as in input).
+        # State and u in input are from the same timestep, output is belongs also to THE same timestep ("k")
+        angleDD, positionDD = _cartpole_ode(angle_cos, angle_sin, angleD, positionD, u,
+                                            k, m_cart, m_pole, g, J_fric, M_fric, L)
+
+        # Find NEXT "k+1" state [angle, angleD, position, positionD], Euler step
+        angle, angleD, position, positionD = (
+            angle + angleD * t_step,
+            angleD + angleDD * t_step,
+            position + positionD * t_step,
+            positionD + positionDD * t_step,
+        )
+
+        angle_cos = torch.cos(angle)
+        angle, angleD, position, positionD = _edge_bounce(angle, angle_cos, angleD, position, positionD,
+                                                          t_step, L, TrackHalfLength)
+
+        angle_cos = torch.cos(angle)
+        angle_sin = torch.sin(angle)
+
+        angle = torch.atan2(angle_sin, angle_cos)  # Wrap angle to +/-π
+
+    return angle, angleD, position, positionD, angle_cos, angle_sin
+
+
+def cartpole_fine_integration_torch(s, u, t_step, intermediate_steps,
+                                    k=k, m_cart=m_cart, m_pole=m_pole, g=g, J_fric=J_fric, M_fric=M_fric, L=L):
+    """
+    Integrates the state s by intermediate_steps Euler steps of length t_step, with edge bounce.
+
+    :param s: state of cartpole, [batch_size, num_states]
+    :param u: force applied on cart in N, [batch_size]
+    :returns: next state of s
+    """
+    (
+        angle, angleD, position, positionD, angle_cos, angle_sin
+    ) = _cartpole_fine_integration_torch(
+        s[..., ANGLE_IDX], s[..., ANGLED_IDX],
+        s[..., ANGLE_COS_IDX], s[..., ANGLE_SIN_IDX],
+        s[..., POSITION_IDX], s[..., POSITIOND_IDX],
+        u, float(t_step), int(intermediate_steps),
+        k, m_cart, m_pole, g, J_fric, M_fric, torch.as_tensor(L), TrackHalfLength,
+    )
+
+    s_next = torch.stack([angle, angleD, angle_cos, angle_sin, position, positionD], dim=-1)
+    return s_next
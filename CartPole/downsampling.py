@@ -0,0 +1,69 @@
+"""
+Min/max downsampling of long time series for interactive plots.
+
+MinMaxPyramid is built once per series: level k keeps for every bucket of 2**k consecutive samples
+the indices of its minimum and maximum. A query for a visible x range picks the finest level giving at most
+max_points points and returns the min and max of each bucket in their original order,
+so that peaks are never lost however far the plot is zoomed out.
+plot_downsampled draws such a series and re-queries it whenever the x limits of the axes change (zoom, pan).
+"""
+
+import numpy as np
+
+MAX_POINTS = 4000  # About two points per pixel of a full-screen plot
+
+
+class MinMaxPyramid:
+    def __init__(self, x, y):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+
+        # levels[k - 1]: (indices of minima, indices of maxima) of buckets of 2**k samples
+        self.levels = []
+        min_idx = max_idx = np.arange(len(self.y))
+        while len(min_idx) > 1:
+            min_idx = self._pair(min_idx, np.less_equal)
+            max_idx = self._pair(max_idx, np.greater_equal)
+            self.levels.append((min_idx, max_idx))
+
+    def _pair(self, idx, compare):
+        """Merges consecutive buckets, keeping the index of the smaller/bigger value"""
+        if len(idx) % 2:
+            idx = np.append(idx, idx[-1])
+        left, right = idx[0::2], idx[1::2]
+        return np.where(compare(self.y[left], self.y[right]), left, right)
+
+    def query(self, x_min=-np.inf, x_max=np.inf, max_points=MAX_POINTS):
+        """Points (x, y) representing the series between x_min and x_max (plus one point beyond each end)"""
+        start = max(np.searchsorted(self.x, x_min, side='left') - 1, 0)
+        stop = min(np.searchsorted(self.x, x_max, side='right') + 1, len(self.x))
+        if stop - start <= max_points:
+            return self.x[start:stop], self.y[start:stop]
+
+        level = min(int(np.ceil(np.log2(2.0 * (stop - start) / max_points))), len(self.levels))
+        min_idx, max_idx = self.levels[level - 1]
+        bucket_start, bucket_stop = start >> level, -(-stop >> level)
+        min_idx, max_idx = min_idx[bucket_start:bucket_stop], max_idx[bucket_start:bucket_stop]
+        # First and last sample keep the line spanning the whole range
+        idx = np.empty(2 * len(min_idx) + 2, dtype=min_idx.dtype)
+        idx[0], idx[-1] = start, stop - 1
+        idx[1:-1:2] = np.minimum(min_idx, max_idx)
+        idx[2:-1:2] = np.maximum(min_idx, max_idx)
+        idx = np.clip(idx, start, stop - 1)
+        return self.x[idx], self.y[idx]
+
+
+def plot_downsampled(ax, x, y, *args, max_points=MAX_POINTS, **kwargs):
+    """
+    As ax.plot(x, y, *args, **kwargs) for a series sorted by x, drawing at most max_points points of it
+    at any zoom. Returns the Line2D.
+    """
+    pyramid = MinMaxPyramid(x, y)
+    line, = ax.plot(*pyramid.query(max_points=max_points), *args, **kwargs)
+
+    def on_xlim_changed(ax):
+        line.set_data(*pyramid.query(*ax.get_xlim(), max_points=max_points))
+
+    # A plain function (not a bound method) is kept alive by the callback registry together with the pyramid
+    ax.callbacks.connect('xlim_changed', on_xlim_changed)
+    return line
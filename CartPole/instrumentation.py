@@ -0,0 +1,269 @@
+"""
+Low-overhead instrumentation of the simulation loop.
+
+Every instrumented stage (e.g. integration, edge bounce, controller step) gets a call counter
+and a streaming histogram of its duration, from which percentiles (p50, p99, ...) are read.
+The first max_trace_events individual events are also kept and can be exported in Chrome trace-event format
+(open in chrome://tracing or https://ui.perfetto.dev) to see how the stages are laid out in time.
+
+When disabled nothing is wrapped and the simulation runs without any overhead.
+Enable it in config.yml (cartpole: instrumentation: enabled).
+"""
+
+import heapq
+import json
+import math
+from datetime import datetime
+from functools import wraps
+from timeit import default_timer
+
+import numpy as np
+
+
+class StreamingHistogram:
+    """
+    Histogram with logarithmically spaced bins, for durations (or other positive values) spanning many orders of magnitude.
+    Memory does not grow with number of samples; percentiles are exact up to the bin width
+    (about 5% relative with the default 50 bins per decade).
+    """
+
+    def __init__(self, min_value=1.0e-7, max_value=1.0e2, bins_per_decade=50):
+        self.log10_min_value = math.log10(min_value)
+        self.bins_per_decade = bins_per_decade
+        self.number_of_bins = int(math.ceil((math.log10(max_value) - self.log10_min_value) * bins_per_decade))
+        self.bin_edges = 10.0 ** (self.log10_min_value + np.arange(self.number_of_bins + 1) / bins_per_decade)
+        self.reset()
+
+    def reset(self):
+        self.counts = np.zeros(self.number_of_bins, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _bin_index(self, value):
+        if value <= 0.0:
+            return 0
+        index = int((math.log10(value) - self.log10_min_value) * self.bins_per_decade)
+        return min(max(index, 0), self.number_of_bins - 1)
+
+    def add(self, value):
+        self.counts[self._bin_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """q-th percentile (0-100); the geometric center of the bin in which it falls, clipped to observed min/max"""
+        if self.count == 0:
+            return None
+        rank = q / 100.0 * self.count
+        index = int(np.searchsorted(np.cumsum(self.counts), max(rank, 1), side='left'))
+        value = math.sqrt(self.bin_edges[index] * self.bin_edges[index + 1])
+        return min(max(value, self.min), self.max)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def summary(self, percentiles=(50, 90, 99, 99.9)):
+        summary = {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.mean,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+        }
+        for q in percentiles:
+            summary['p{:g}'.format(q)] = self.percentile(q)
+        return summary
+
+    def nonzero_bins(self):
+        """Lower bin edges and counts of the non-empty bins"""
+        nonzero = np.nonzero(self.counts)[0]
+        return self.bin_edges[nonzero].tolist(), self.counts[nonzero].tolist()
+
+
+class Instrumentation:
+    """
+    Per-stage timers and counters.
+
+    Methods of an object are instrumented with instrument_methods, which replaces them with timed wrappers
+    set as instance attributes - the class and the calling code stay unchanged.
+    Durations measured elsewhere are added with record.
+    """
+
+    def __init__(self, enabled=False, max_trace_events=200000):
+        self.enabled = enabled
+        self.max_trace_events = max_trace_events
+
+        self.histograms = {}
+        self.counters = {}
+        self.trace_events = []
+        self.time_origin = default_timer()
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+        self.counters = {}
+        self.trace_events = []
+        self.time_origin = default_timer()
+
+    def record(self, stage, start, duration):
+        """Adds a single measurement; start is a default_timer() timestamp, duration in seconds"""
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = StreamingHistogram()
+        histogram.add(duration)
+        if len(self.trace_events) < self.max_trace_events:
+            self.trace_events.append((stage, start, duration))
+
+    def count(self, counter, n=1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def wrap(self, stage, function):
+        """Returns function measuring its duration as stage"""
+        @wraps(function)
+        def timed(*args, **kwargs):
+            start = default_timer()
+            result = function(*args, **kwargs)
+            self.record(stage, start, default_timer() - start)
+            return result
+
+        return timed
+
+    def instrument_methods(self, obj, stages):
+        """
+        Replaces methods of obj with timed versions, if instrumentation is enabled.
+
+        :param stages: dict method name -> stage name. Several methods can be assigned to the same stage.
+        """
+        if not self.enabled:
+            return
+        for method_name, stage in stages.items():
+            setattr(obj, method_name, self.wrap(stage, getattr(obj, method_name)))
+
+    def summary(self):
+        """dict stage -> count, total, mean, min, max and percentiles of the durations in seconds"""
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def print_summary(self):
+        summary = self.summary()
+        if not summary:
+            return
+        total = summary.get('update_state', {}).get('total') or sum(s['total'] for s in summary.values())
+        print('{:>20} {:>10} {:>12} {:>12} {:>12} {:>12} {:>8}'.format(
+            'stage', 'count', 'mean [us]', 'p50 [us]', 'p99 [us]', 'max [us]', 'share'))
+        for stage, s in sorted(summary.items(), key=lambda item: -item[1]['total']):
+            print('{:>20} {:>10} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f} {:>7.1f}%'.format(
+                stage, s['count'], s['mean'] * 1.0e6, s['p50'] * 1.0e6, s['p99'] * 1.0e6, s['max'] * 1.0e6,
+                100.0 * s['total'] / total))
+        for counter, value in self.counters.items():
+            print('{:>20} {:>10}'.format(counter, value))
+
+    def export_json(self, path):
+        histograms = {}
+        for stage, histogram in self.histograms.items():
+            bin_lower_edges, counts = histogram.nonzero_bins()
+            histograms[stage] = {'bin_lower_edges': bin_lower_edges, 'counts': counts}
+        with open(path, 'w') as f:
+            json.dump({
+                'unit': 's',
+                'stages': self.summary(),
+                'counters': self.counters,
+                'histograms': histograms,
+                'trace_events_recorded': len(self.trace_events),
+            }, f, indent=2)
+
+    def export_chrome_trace(self, path):
+        """Complete ('X') events with timestamps in microseconds, as expected by chrome://tracing and Perfetto"""
+        events = [
+            {
+                'name': stage,
+                'cat': 'cartpole',
+                'ph': 'X',
+                'ts': (start - self.time_origin) * 1.0e6,
+                'dur': duration * 1.0e6,
+                'pid': 0,
+                'tid': 0,
+            }
+            for stage, start, duration in self.trace_events
+        ]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': self.counters}, f)
+
+
+class ControllerLatencyTracker:
+    """
+    Latency statistics of a controller: streaming histogram with tail percentiles,
+    number of steps exceeding the deadline (dt_controller) and the worst spikes with timestamps.
+    Is used to check if a controller fits the time budget of the physical cartpole.
+    """
+
+    def __init__(self, controller_name='', deadline=None, number_of_spikes=10):
+        self.number_of_spikes = number_of_spikes
+        self.histogram = StreamingHistogram()
+        self.reset(controller_name, deadline)
+
+    def reset(self, controller_name=None, deadline=None):
+        if controller_name is not None:
+            self.controller_name = controller_name
+        self.deadline = deadline
+        self.histogram.reset()
+        self.deadline_misses = 0
+        self.spikes = []  # min-heap of (latency, step index, simulation time, wall-clock time)
+
+    def add(self, latency, simulation_time):
+        step_index = self.histogram.count
+        self.histogram.add(latency)
+        if self.deadline is not None and latency > self.deadline:
+            self.deadline_misses += 1
+        if len(self.spikes) < self.number_of_spikes:
+            heapq.heappush(self.spikes, (latency, step_index, simulation_time, datetime.now().isoformat(timespec='milliseconds')))
+        elif latency > self.spikes[0][0]:
+            heapq.heapreplace(self.spikes, (latency, step_index, simulation_time, datetime.now().isoformat(timespec='milliseconds')))
+
+    def worst_spikes(self):
+        """Spikes sorted from the worst, as dicts with latency, step index, simulation and wall-clock time"""
+        return [
+            {'latency': latency, 'step': step_index, 'simulation_time': simulation_time, 'wall_time': wall_time}
+            for latency, step_index, simulation_time, wall_time in sorted(self.spikes, reverse=True)
+        ]
+
+    def summary(self):
+        summary = self.histogram.summary()
+        summary.update({
+            'controller': self.controller_name,
+            'deadline': self.deadline,
+            'deadline_misses': self.deadline_misses,
+            'worst_spikes': self.worst_spikes(),
+        })
+        return summary
+
+    def short_report(self):
+        """One-line report, e.g. for a GUI label"""
+        if self.histogram.count == 0:
+            return 'Controller latency (ms): -'
+        report = 'Controller latency (ms): p50 {:.2f}, p99 {:.2f}, max {:.2f}'.format(
+            self.histogram.percentile(50) * 1.0e3, self.histogram.percentile(99) * 1.0e3, self.histogram.max * 1.0e3)
+        if self.deadline is not None:
+            report += ', >dt: {}/{}'.format(self.deadline_misses, self.histogram.count)
+        return report
+
+    def print_report(self):
+        if self.histogram.count == 0:
+            return
+        s = self.histogram.summary()
+        print('Latency of controller {} over {} steps (ms): mean {:.3f}, p50 {:.3f}, p90 {:.3f}, p99 {:.3f}, p99.9 {:.3f}, max {:.3f}'.format(
+            self.controller_name, s['count'], s['mean'] * 1.0e3, s['p50'] * 1.0e3, s['p90'] * 1.0e3, s['p99'] * 1.0e3,
+            s['p99.9'] * 1.0e3, s['max'] * 1.0e3))
+        if self.deadline is not None:
+            print('Steps exceeding dt_controller = {} ms: {} ({:.2f}%)'.format(
+                self.deadline * 1.0e3, self.deadline_misses, 100.0 * self.deadline_misses / s['count']))
+        print('Worst spikes:')
+        for spike in self.worst_spikes():
+            print('    {:.3f} ms at step {}, simulation time {:.3f} s, {}'.format(
+                spike['latency'] * 1.0e3, spike['step'], spike['simulation_time'], spike['wall_time']))
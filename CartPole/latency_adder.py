@@ -3,8 +3,6 @@ import numpy as np
 from CartPole.state_utilities import STATE_VARIABLES, \
     ANGLE_IDX, ANGLED_IDX, POSITION_IDX, POSITIOND_IDX, ANGLE_COS_IDX, ANGLE_SIN_IDX
 
-from tqdm import trange
-
 MAX_LATENCY_LEN = 200  # Total size of latency buffer.
 
 class LatencyAdder():
@@ -46,6 +44,13 @@ class LatencyAdder():
         else:
             self.latency_buffer_current_index += 1
 
+    def fill_latency_buffer(self, s):
+        """
+        Sets all states in the buffer to s, e.g. at the start of an episode,
+        so that the delayed state does not come from the previous one
+        """
+        self.latency_buffer[...] = s
+
     def access_past_value(self, latency_buffer_current_index, i):
         """
         i gives how many steps in the past lays the requested state
@@ -81,6 +86,8 @@ class LatencyAdder():
         self.max_latency = MAX_LATENCY_LEN*self.dt_sampling
 
 if __name__ == '__main__':
+    from tqdm import trange
+
     from CartPole.state_utilities import create_cartpole_state
 
     LatencyAdderInstance = LatencyAdder()
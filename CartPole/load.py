@@ -3,7 +3,6 @@ import csv
 
 import os
 import glob
-import pandas as pd
 
 def get_full_paths_to_csvs(default_locations='', csv_names=None):
     """
@@ -88,6 +87,8 @@ def get_full_paths_to_csvs(default_locations='', csv_names=None):
 
 # load csv file with experiment recording (e.g. for replay)
 def load_csv_recording(file_path):
+    import pandas as pd  # Imported here, so that a headless simulation does not load pandas
+
     if isinstance(file_path, list):
         file_path = file_path[0]
 
@@ -1,6 +1,5 @@
 import numpy as np
 from others.globals_and_utils import create_rng, load_config
-from tqdm import trange
 
 from CartPole._CartPole_mathematical_helpers import wrap_angle_rad
 from CartPole.state_utilities import (ANGLE_COS_IDX, ANGLE_IDX, ANGLE_SIN_IDX,
@@ -84,6 +83,8 @@ class NoiseAdder:
         return s_noisy
 
 if __name__ == '__main__':
+    from tqdm import trange
+
     from CartPole.state_utilities import create_cartpole_state
 
     NoiseAdderInstance = NoiseAdder()
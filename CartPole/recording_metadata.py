@@ -0,0 +1,79 @@
+"""
+Metadata written in the header of experiment recordings.
+
+The git revision is resolved once per process; in containers without .git (or to skip the repository walk)
+it can be given with the environment variable CARTPOLE_GIT_REVISION.
+The header block is serialized once per configuration (time steps, controller, parameters)
+and reused for every file written with this configuration, e.g. by the data generator.
+"""
+
+import csv
+import io
+import os
+from datetime import datetime
+from functools import lru_cache
+
+from others.p_globals import P_GLOBALS
+
+GIT_REVISION_ENVIRONMENT_VARIABLE = 'CARTPOLE_GIT_REVISION'
+
+
+@lru_cache(maxsize=None)
+def get_git_revision():
+    """Hash of the current git commit, 'unknown' if not in a git repository or gitpython is not installed"""
+    git_revision = os.environ.get(GIT_REVISION_ENVIRONMENT_VARIABLE)
+    if git_revision:
+        return git_revision
+    try:
+        # Use gitpython to get a current revision number and use it in description of experimental data
+        from git import Repo
+        return Repo().head.object.hexsha
+    except Exception:
+        return 'unknown'
+
+
+def _csv_comment_lines(lines):
+    """Lines formatted by the csv writer as single-column rows, as they appear in the recording"""
+    buffer = io.StringIO(newline='')
+    csv.writer(buffer).writerows([line] for line in lines)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=64)
+def _static_header(dt_simulation, dt_controller, dt_save, controller_name, optimizer_name, parameters):
+    """Serialized header lines before and after the length of experiment"""
+    before_length = ['# ' + 'Done with git-revision: {}'.format(get_git_revision()), '#']
+
+    after_length = [
+        '#',
+        '# Time intervals dt:',
+        '# Simulation: {} s'.format(str(dt_simulation)),
+        '# Controller update: {} s'.format(str(dt_controller)),
+        '# Saving: {} s'.format(str(dt_save)),
+        '#',
+        '# Controller: {}'.format(controller_name),
+    ]
+    if optimizer_name:
+        after_length.append('# MPC Optimizer: {}'.format(optimizer_name))
+    after_length += ['#', '# Parameters:']
+    after_length += ['# ' + k + ': ' + str(value) for k, value in parameters]
+    after_length += ['#', '# Data:']
+
+    return _csv_comment_lines(before_length), _csv_comment_lines(after_length)
+
+
+def recording_header(length_of_experiment, dt_simulation, dt_controller, dt_save, controller_name, optimizer_name):
+    """
+    Header of a recording as csv-formatted text, up to (not including) the row with column names.
+    Only the date and the length of experiment are formatted at every call.
+    """
+    before_length, after_length = _static_header(
+        dt_simulation, dt_controller, dt_save, controller_name, optimizer_name, tuple(P_GLOBALS.__dict__.items()))
+    now = datetime.now()
+    return (
+        _csv_comment_lines([
+            '# ' + 'This is CartPole simulation from {} at time {}'.format(now.strftime('%d.%m.%Y'), now.strftime('%H:%M:%S'))])
+        + before_length
+        + _csv_comment_lines(['# Length of experiment: {} s'.format(str(length_of_experiment))])
+        + after_length
+    )
@@ -0,0 +1,157 @@
+"""
+Replay of experiment recordings from column arrays.
+
+A recording is converted once to one NumPy array per (numeric) column of the csv file.
+Recordings bigger than MEMMAP_MIN_FILE_SIZE are additionally cached as .npy files next to the csv
+and memory-mapped, so that replaying them again neither parses the csv nor loads it fully into memory.
+
+ReplayPlayer keeps the position in the recording: seeking to a row is O(1), to a time O(log n),
+and at a high speed-up rows are skipped, so that the replay keeps pace with the wall clock.
+"""
+
+import os
+
+import numpy as np
+
+from CartPole.load import load_csv_recording
+
+MEMMAP_MIN_FILE_SIZE = 64 * 1024 * 1024  # bytes
+CACHE_FOLDER_NAME = '.replay_cache'
+
+
+def _cache_folder(file_path):
+    """Folder with the columns of the recording as .npy files, invalidated by a change of the csv size or mtime"""
+    stat = os.stat(file_path)
+    folder, file_name = os.path.split(os.path.abspath(file_path))
+    name = '{}-{}-{}'.format(os.path.splitext(file_name)[0], stat.st_size, stat.st_mtime_ns)
+    return os.path.join(folder, CACHE_FOLDER_NAME, name)
+
+
+def _load_cached_columns(cache_folder):
+    return {
+        os.path.splitext(file_name)[0]: np.load(os.path.join(cache_folder, file_name), mmap_mode='r')
+        for file_name in sorted(os.listdir(cache_folder))
+        if file_name.endswith('.npy')
+    }
+
+
+def load_recording_columns(file_path, memmap=None):
+    """
+    Loads the numeric columns of a csv recording as a dict of 1D arrays.
+
+    :param memmap: True: cache the columns as .npy files and memory-map them, False: keep them in memory,
+        None: memory-map recordings bigger than MEMMAP_MIN_FILE_SIZE
+    """
+    if memmap is None:
+        memmap = os.path.getsize(file_path) >= MEMMAP_MIN_FILE_SIZE
+
+    if memmap:
+        cache_folder = _cache_folder(file_path)
+        if os.path.isdir(cache_folder):
+            return _load_cached_columns(cache_folder)
+
+    data = load_csv_recording(file_path)
+    if data is False:
+        raise ValueError('Cannot load recording {}'.format(file_path))
+    columns = {name: data[name].to_numpy() for name in data.select_dtypes('number').columns}
+
+    if memmap:
+        # Written to a temporary folder and renamed, so that an interrupted conversion never leaves a partial cache
+        temporary_folder = cache_folder + '.tmp{}'.format(os.getpid())
+        os.makedirs(temporary_folder, exist_ok=True)
+        for name, column in columns.items():
+            np.save(os.path.join(temporary_folder, name + '.npy'), np.ascontiguousarray(column))
+        os.replace(temporary_folder, cache_folder)
+        columns = _load_cached_columns(cache_folder)
+
+    return columns
+
+
+class ReplayRecording:
+    """Columns of a recording with the time step of every row"""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.time = columns['time']
+        self.length = len(self.time)
+
+        # Time step to the next row, the last row repeats the time step before it
+        self.dt = np.zeros(self.length, dtype=self.time.dtype)
+        if self.length > 1:
+            self.dt[:-1] = np.diff(self.time)
+            self.dt[-1] = self.dt[-2]
+
+    @classmethod
+    def from_csv(cls, file_path, memmap=None):
+        return cls(load_recording_columns(file_path, memmap=memmap))
+
+    def __len__(self):
+        return self.length
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def history_until(self, index):
+        """Rows up to (including) index as dict of lists, as CartPole.dict_history"""
+        return {name: column[:index + 1].tolist() for name, column in self.columns.items()}
+
+
+class ReplayPlayer:
+    """
+    Position in a ReplayRecording played back at a speed-up relative to the recorded time.
+
+    The playback time advances continuously with the wall clock and the shown row is the last one not after it.
+    Rows shorter than min_frame_period (of wall time) at the current speed-up are skipped.
+    """
+
+    def __init__(self, recording: ReplayRecording, min_frame_period=0.0):
+        self.recording = recording
+        self.min_frame_period = min_frame_period
+        # Against float rounding of the recorded time putting the playback time just before the next row
+        if len(recording) > 1:
+            self.time_tolerance = 1.0e-4 * (float(recording.time[-1]) - float(recording.time[0])) / (len(recording) - 1)
+        else:
+            self.time_tolerance = 0.0
+        self.index = 0
+        self.playback_time = float(recording.time[0])
+
+    @property
+    def finished(self):
+        return self.index >= len(self.recording) - 1
+
+    def seek(self, index):
+        """Jumps to a row"""
+        self.index = int(np.clip(index, 0, len(self.recording) - 1))
+        self.playback_time = float(self.recording.time[self.index])
+
+    def seek_time(self, time):
+        """Jumps to the last row not after time"""
+        self.seek(np.searchsorted(self.recording.time, time + self.time_tolerance, side='right') - 1)
+
+    def scrub(self, fraction):
+        """Jumps to a fraction (0 to 1) of the recording, e.g. set with a slider"""
+        self.seek(round(fraction * (len(self.recording) - 1)))
+
+    def frame_period(self, speedup):
+        """Wall time for which the current row should be shown"""
+        if np.isinf(speedup):
+            return 0.0
+        return max(float(self.recording.dt[self.index]) / speedup, self.min_frame_period)
+
+    def advance(self, wall_time, speedup):
+        """
+        Moves the playback time by wall_time * speedup and the row accordingly, at least by one row.
+        With infinite speed-up every row is shown.
+        """
+        if np.isinf(speedup):
+            self.seek(self.index + 1)
+            return
+        self.playback_time += wall_time * speedup
+        index = np.searchsorted(self.recording.time, self.playback_time + self.time_tolerance, side='right') - 1
+        if index <= self.index:
+            self.seek(self.index + 1)
+        else:
+            self.index = int(min(index, len(self.recording) - 1))
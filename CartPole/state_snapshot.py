@@ -0,0 +1,45 @@
+"""
+Snapshot of the values drawn by the GUI animation, handed over from the simulation thread without locks.
+
+The simulation publishes a snapshot after each batch of steps, the animation reads the most recent one at its own
+(capped) frame rate. Double buffering with a sequence counter (seqlock): the writer fills the buffer not being read
+and only then makes it current; the reader retries in the rare case the writer reused its buffer meanwhile.
+Neither thread ever waits for the other.
+"""
+
+import numpy as np
+
+from CartPole.state_utilities import STATE_VARIABLES
+
+_Q_IDX = len(STATE_VARIABLES)
+_L_IDX = _Q_IDX + 1
+_TIME_IDX = _Q_IDX + 2
+_SIZE = _Q_IDX + 3
+
+
+class StateSnapshot:
+    def __init__(self):
+        self._buffers = np.zeros((2, _SIZE), dtype=np.float64)
+        # Even: snapshot number sequence//2 complete, in buffer (sequence//2) % 2; odd: next snapshot being written
+        self.sequence = 0
+        self.active = False  # Whether a thread publishes snapshots, otherwise the live values should be drawn
+
+    def publish(self, s, Q, L, time):
+        """Called by the single writer (simulation thread)"""
+        number = self.sequence // 2 + 1
+        self.sequence += 1
+        buffer = self._buffers[number % 2]
+        buffer[:_Q_IDX] = s
+        buffer[_Q_IDX] = Q
+        buffer[_L_IDX] = L
+        buffer[_TIME_IDX] = time
+        self.sequence += 1
+
+    def read(self):
+        """Copy of the most recent complete snapshot as (s, Q, L, time)"""
+        while True:
+            sequence = self.sequence & ~1  # While a snapshot is written, the previous one is complete
+            values = self._buffers[(sequence // 2) % 2].copy()
+            # The writer reused this buffer only if it started writing the snapshot after the next one
+            if self.sequence - sequence < 3:
+                return values[:_Q_IDX], values[_Q_IDX], values[_L_IDX], values[_TIME_IDX]
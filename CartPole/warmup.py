@@ -0,0 +1,83 @@
+"""
+Ahead-of-time warm-up of the compiled kernels.
+
+numba compiles a function at its first call (or loads it from the on-disk cache, cache=True),
+TF traces and XLA-compiles at the first call of a compiled function.
+Without a warm-up this happens in the first simulation step and the first controller step,
+which then take up to seconds instead of microseconds - see the controller latency report.
+
+CartPole.warmup() uses the functions below; it is called by CartPole.set_controller if warmup is enabled in config.yml.
+
+Run as a script to pre-populate the numba on-disk cache, e.g. when building a container:
+    python -m CartPole.warmup
+    python -m CartPole.warmup --controllers mppi-cartpole lqr
+"""
+
+from timeit import default_timer
+
+import numpy as np
+
+from CartPole.cartpole_numba import cartpole_fine_integration_s_numba, cartpole_ode_numba
+from CartPole.state_utilities import create_cartpole_state
+from others.p_globals import L
+
+
+def warmup_dynamics_kernels(batch_sizes=(1, 2)):
+    """
+    Compiles the batched numba dynamics used by the ODE predictor, for 1D and 2D state arrays.
+    numba compiles once per argument types, not per shape - a small batch is representative of any batch size.
+
+    :returns: time taken in seconds
+    """
+    start = default_timer()
+    t_step = np.float32(0.002)
+    for batch_size in batch_sizes:
+        s = np.tile(create_cartpole_state(), (batch_size, 1))
+        u = np.zeros(batch_size, dtype=np.float32)
+        cartpole_ode_numba(s, u, L=float(L))
+        cartpole_fine_integration_s_numba(s, u, t_step, 1, L=float(L))
+        cartpole_fine_integration_s_numba(s, u, t_step, 1, L=L)
+    return default_timer() - start
+
+
+def warmup_controller(controller, s, updated_attributes):
+    """
+    Compiles the kernels of a controller.
+
+    Controllers may provide a warmup() method compiling their kernels without changing their state.
+    Otherwise one step is done at state s and the controller is reset with controller_reset, if it has one.
+
+    :returns: time taken in seconds
+    """
+    start = default_timer()
+    if hasattr(controller, 'warmup'):
+        controller.warmup()
+    else:
+        controller.step(np.copy(s), 0.0, updated_attributes)
+        try:
+            controller.controller_reset()
+        except (AttributeError, NotImplementedError):
+            pass
+    return default_timer() - start
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compile numba kernels (and the kernels of chosen controllers) '
+                                                 'to pre-populate the numba on-disk cache.')
+    parser.add_argument('--controllers', nargs='*', default=[],
+                        help='Names of controllers to warm up, as in config_controllers.yml, e.g. mppi-cartpole')
+    args = parser.parse_args()
+
+    from CartPole import CartPole
+
+    start = default_timer()
+    CartPoleInstance = CartPole()
+    CartPoleInstance.warmup()
+    print('Simulation and dynamics kernels ready after {:.2f} s'.format(default_timer() - start))
+    for controller_name in args.controllers:
+        start = default_timer()
+        CartPoleInstance.set_controller(controller_name=controller_name)
+        CartPoleInstance.warmup()
+        print('Controller {} ready after {:.2f} s'.format(controller_name, default_timer() - start))
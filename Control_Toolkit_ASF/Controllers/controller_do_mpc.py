@@ -9,6 +9,7 @@ import yaml
 from CartPole.cartpole_model import Q2u, cartpole_ode_namespace
 from CartPole.state_utilities import cartpole_state_vector_to_namespace
 from Control_Toolkit.Controllers import template_controller
+from Control_Toolkit_ASF.Controllers.do_mpc_solver import nlpsol_options, setup_solver
 from others.globals_and_utils import create_rng
 from SI_Toolkit.computation_library import NumpyLibrary, TensorType
 
@@ -77,12 +78,11 @@ class controller_do_mpc(template_controller):
             'store_solver_stats': []
         }
         self.mpc.set_param(**setup_mpc)
-        # self.mpc.set_param(nlpsol_opts={'ipopt.linear_solver': 'mumps'})
-        # Other possible linear solvers from hsl library
-        # The give better performance 2-3 times.
+        # Linear solver from config, falls back to MUMPS if HSL is not installed.
+        # Linear solvers from hsl library give better performance 2-3 times.
         # However if simulating at max speedup the simulation blocks. Issue with memory leak?
-        # self.mpc.set_param(nlpsol_opts={'ipopt.linear_solver': 'mumps'})
-        self.mpc.set_param(nlpsol_opts = {'ipopt.linear_solver': 'MA57'})
+        # IPOPT outputs (optimizer info printed to the console) are suppressed
+        self.mpc.set_param(nlpsol_opts=nlpsol_options(self.config_controller))
 
         self.rng = create_rng(self.__class__.__name__, self.config_controller["seed"])
         # # Standard version
@@ -116,11 +116,9 @@ class controller_do_mpc(template_controller):
 
         self.mpc.set_tvp_fun(self.tvp_fun)
 
-        # Suppress IPOPT outputs (optimizer info printed to the console)
-        suppress_ipopt = {'ipopt.print_level': 0, 'ipopt.sb': 'yes', 'print_time': 0}
-        self.mpc.set_param(nlpsol_opts=suppress_ipopt)
-
         self.mpc.setup()
+        # Compiled NLP (if code_generation), warm start and solve time statistics
+        self.solver = setup_solver(self.mpc, self.config_controller)
 
         # Set initial state
         self.x0 = self.mpc.x0
@@ -152,3 +150,9 @@ class controller_do_mpc(template_controller):
         Q = self.mpc.make_step(self.x0)
 
         return Q.item()*(1+self.p_Q*self.rng.uniform(-1.0, 1.0))
+
+    def controller_report(self):
+        self.solver.report()
+
+    def controller_reset(self):
+        self.solver.reset()
@@ -8,6 +8,7 @@ from CartPole.cartpole_model import (Q2u, TrackHalfLength,
                                      cartpole_ode_namespace, v_max)
 from CartPole.state_utilities import cartpole_state_vector_to_namespace
 from Control_Toolkit.Controllers import template_controller
+from Control_Toolkit_ASF.Controllers.do_mpc_solver import nlpsol_options, setup_solver
 from SI_Toolkit.computation_library import NumpyLibrary, TensorType
 
 
@@ -107,7 +108,8 @@ class controller_do_mpc_discrete(template_controller):
             'state_discretization': 'discrete'
         }
         self.mpc.set_param(**setup_mpc)
-        self.mpc.set_param(nlpsol_opts = {'ipopt.linear_solver': 'ma27'})
+        # Linear solver from config (falls back to MUMPS if HSL is not installed), IPOPT outputs suppressed
+        self.mpc.set_param(nlpsol_opts=nlpsol_options(self.config_controller))
 
         lterm = - 25 * self.model.aux['E_pot'] +\
                 1 * distance_difference +\
@@ -125,11 +127,9 @@ class controller_do_mpc_discrete(template_controller):
 
         self.mpc.set_tvp_fun(self.tvp_fun)
 
-        # Suppress IPOPT outputs
-        suppress_ipopt = {'ipopt.print_level': 0, 'ipopt.sb': 'yes', 'print_time': 0}
-        self.mpc.set_param(nlpsol_opts=suppress_ipopt)
-
         self.mpc.setup()
+        # Compiled NLP (if code_generation), warm start and solve time statistics
+        self.solver = setup_solver(self.mpc, self.config_controller)
 
         # Set initial state
         self.x0 = self.mpc.x0
@@ -161,3 +161,9 @@ class controller_do_mpc_discrete(template_controller):
         Q = self.mpc.make_step(self.x0)
 
         return Q.item()
+
+    def controller_report(self):
+        self.solver.report()
+
+    def controller_reset(self):
+        self.solver.reset()
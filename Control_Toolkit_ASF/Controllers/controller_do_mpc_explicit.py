@@ -0,0 +1,37 @@
+"""
+Explicit approximation of the do-mpc controller: the first action of do-mpc is interpolated in a table
+computed offline (see others/explicit_mpc/build_explicit_mpc.py and explicit_mpc_table.py) instead of solving the NLP.
+"""
+
+import warnings
+
+import numpy as np
+from Control_Toolkit.Controllers import template_controller
+from Control_Toolkit_ASF.Controllers.explicit_mpc_table import ExplicitMPCTable
+from SI_Toolkit.computation_library import NumpyLibrary, TensorType
+
+
+class controller_do_mpc_explicit(template_controller):
+    _computation_library = NumpyLibrary
+
+    def configure(self):
+        self.table = ExplicitMPCTable.load(self.config_controller["table_path"])
+        dt_table = self.table.metadata.get('dt')
+        if dt_table is not None and "dt" in self.config_controller and not np.isclose(dt_table, self.config_controller["dt"]):
+            warnings.warn('Explicit MPC table was computed for dt = {} s, the controller runs with dt = {} s'
+                          .format(dt_table, self.config_controller["dt"]))
+        self.point = np.zeros(len(self.table.names))
+        # do-mpc penalizes the change of the input, so its action depends on the previous one
+        self.Q_previous = 0.0
+
+    def step(self, s: np.ndarray, time=None, updated_attributes: "dict[str, TensorType]" = {}):
+        self.update_attributes(updated_attributes)
+
+        self.table.features(s, self.variable_parameters.target_position, self.Q_previous, out=self.point)
+        Q = self.table(self.point)
+        self.Q_previous = Q
+
+        return Q
+
+    def controller_reset(self):
+        self.Q_previous = 0.0
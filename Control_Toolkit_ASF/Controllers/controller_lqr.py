@@ -1,6 +1,12 @@
 """
 This is a linear-quadratic regulator
 It assumes that the input relation is u = Q*u_max (no fancy motor model) !
+
+With gain_schedule enabled, gains are precomputed over a grid of pole lengths L for the pole up and down equilibria
+and interpolated at every step for the L (and target equilibrium) passed to the controller.
+The grid is cached on disk, keyed by a hash of everything the gains depend on.
+
+step_batch computes the control of N cartpoles at once, e.g. to drive a batched simulation.
 """
 
 from SI_Toolkit.computation_library import NumpyLibrary, TensorType
@@ -8,21 +14,93 @@ import numpy as np
 import scipy
 import yaml
 import os
+import hashlib
 
+from CartPole._CartPole_mathematical_helpers import wrap_angle_rad, wrap_angle_rad_inplace
 from CartPole.cartpole_jacobian import cartpole_jacobian
-from CartPole.cartpole_model import s0, u_max
+from CartPole.cartpole_model import u_max
 from CartPole.state_utilities import (ANGLE_IDX, ANGLED_IDX, POSITION_IDX,
-                                      POSITIOND_IDX)
+                                      POSITIOND_IDX, create_cartpole_state)
 from Control_Toolkit.Controllers import template_controller
 from others.globals_and_utils import create_rng
+from others.p_globals import J_fric, L, M_fric, g, k, m_cart, m_pole
 
 config = yaml.load(open("config.yml", "r"), Loader=yaml.FullLoader)
 actuator_noise = config["cartpole"]["actuator_noise"]
 
+EQUILIBRIA = {1.0: 0.0, -1.0: np.pi}  # target_equilibrium -> angle: pole up, pole down
+
+
+def lqr_gain(Q, R, L=L, equilibrium_angle=0.0):
+    """
+    Solve the continuous time LQR controller for the cartpole linearized at rest at equilibrium_angle.
+    Returns the gain K (1 x 4), the solution matrix X and the closed loop system eigenvalues.
+    """
+    # Calculate Jacobian around equilibrium
+    s = create_cartpole_state({'angle': equilibrium_angle})
+    u = 0.0
+
+    jacobian = cartpole_jacobian(s, u, L=L)
+    A = jacobian[:, :-1]
+    B = np.reshape(jacobian[:, -1], newshape=(4, 1)) * u_max
+
+    # first, try to solve the ricatti equation
+    X = scipy.linalg.solve_continuous_are(A, B, Q, R)
+
+    # compute the LQR gain
+    if np.array(R).ndim == 0:
+        Ri = 1.0 / R
+    else:
+        Ri = np.linalg.inv(R)
+
+    K = np.dot(Ri, (np.dot(B.T, X)))
+
+    eigVals = np.linalg.eigvals(A - np.dot(B, K))
+
+    return K, X, eigVals
+
+
+class LQRGainSchedule:
+    """Gains on a grid of L for each equilibrium, linearly interpolated in L"""
+
+    def __init__(self, Q, R, L_range, L_points, cache_folder=None):
+        self.L_grid = np.linspace(L_range[0], L_range[1], L_points)
+
+        parameters = np.concatenate([
+            np.ravel(Q), np.ravel(R), self.L_grid, list(EQUILIBRIA.values()),
+            [float(p) for p in (u_max, k, m_cart, m_pole, g, J_fric, M_fric)],
+        ]).astype(np.float64)
+        self.key = hashlib.sha256(parameters.tobytes()).hexdigest()[:16]
+
+        cache_path = os.path.join(cache_folder, 'lqr_gains_{}.npy'.format(self.key)) if cache_folder else None
+        if cache_path is not None and os.path.isfile(cache_path):
+            self.gains = np.load(cache_path)
+        else:
+            self.gains = np.array([
+                [lqr_gain(Q, R, L=L_value, equilibrium_angle=angle)[0][0] for L_value in self.L_grid]
+                for angle in EQUILIBRIA.values()
+            ])  # equilibria x L_points x 4
+            if cache_path is not None:
+                os.makedirs(cache_folder, exist_ok=True)
+                np.save(cache_path, self.gains)
+
+        self.equilibrium_index = {target_equilibrium: i for i, target_equilibrium in enumerate(EQUILIBRIA)}
+
+    def gain(self, L_value, target_equilibrium=1.0):
+        return self.gain_batch(L_value, target_equilibrium)
+
+    def gain_batch(self, L_values, target_equilibria):
+        """Gains (... x 4) for arrays of L and target equilibria (>= 0: pole up, < 0: pole down)"""
+        L_values = np.clip(L_values, self.L_grid[0], self.L_grid[-1])
+        i = np.minimum(np.searchsorted(self.L_grid, L_values, side='right') - 1, len(self.L_grid) - 2)
+        weight = ((L_values - self.L_grid[i]) / (self.L_grid[i + 1] - self.L_grid[i]))[..., np.newaxis]
+        e = np.where(np.asarray(target_equilibria) >= 0.0, self.equilibrium_index[1.0], self.equilibrium_index[-1.0])
+        return (1.0 - weight) * self.gains[e, i] + weight * self.gains[e, i + 1]
+
 
 class controller_lqr(template_controller):
     _computation_library = NumpyLibrary
-    
+
     def configure(self):
         # From https://github.com/markwmuller/controlpy/blob/master/controlpy/synthesis.py#L8
         """Solve the continuous time LQR controller for a continuous time system.
@@ -46,51 +124,70 @@ class controller_lqr(template_controller):
         seed = self.config_controller["seed"]
         self.rng = create_rng(self.__class__.__name__, seed if seed==None else seed*2)
 
-        # Calculate Jacobian around equilibrium
-        # Set point around which the Jacobian should be linearized
-        # It can be here either pole up (all zeros) or pole down
-        s = s0
-        s[POSITION_IDX] = 0.0
-        s[POSITIOND_IDX] = 0.0
-        s[ANGLE_IDX] = 0.0
-        s[ANGLED_IDX] = 0.0
-        u = 0.0
-
-        jacobian = cartpole_jacobian(s, u)
-        A = jacobian[:, :-1]
-        B = np.reshape(jacobian[:, -1], newshape=(4, 1)) * u_max
-
         # Cost matrices for LQR controller
         self.Q = np.diag(self.config_controller["Q"]) # How much to punish x, v, theta, omega
         self.R = self.config_controller["R"]  # How much to punish Q
 
-        # first, try to solve the ricatti equation
-        X = scipy.linalg.solve_continuous_are(A, B, self.Q, self.R)
+        # Linearized around pole up for the current L
+        self.K, self.X, self.eigVals = lqr_gain(self.Q, self.R)
 
-        # compute the LQR gain
-        if np.array(self.R).ndim == 0:
-            Ri = 1.0 / self.R
+        gain_schedule = self.config_controller.get("gain_schedule", {}) or {}
+        if gain_schedule.get("enabled", False):
+            self.gain_schedule = LQRGainSchedule(
+                self.Q, self.R, gain_schedule["L_range"], gain_schedule["L_points"], gain_schedule.get("cache_folder"))
         else:
-            Ri = np.linalg.inv(self.R)
-
-        K = np.dot(Ri, (np.dot(B.T, X)))
-
-        eigVals = np.linalg.eigvals(A - np.dot(B, K))
-
-        self.K = K
-        self.X = X
-        self.eigVals = eigVals
+            self.gain_schedule = None
 
     def step(self, s: np.ndarray, time=None, updated_attributes: "dict[str, TensorType]" = {}):
         self.update_attributes(updated_attributes)
-        
+
+        angle = s[ANGLE_IDX]
+        if self.gain_schedule is None:
+            K = self.K[0]
+        else:
+            target_equilibrium = 1.0 if float(getattr(self.variable_parameters, "target_equilibrium", 1.0)) >= 0.0 else -1.0
+            K = self.gain_schedule.gain(float(self.variable_parameters.L), target_equilibrium)
+            angle = wrap_angle_rad(angle - EQUILIBRIA[target_equilibrium])
+
         state = np.array(
-            [[s[POSITION_IDX] - self.variable_parameters.target_position], [s[POSITIOND_IDX]], [s[ANGLE_IDX]], [s[ANGLED_IDX]]])
+            [s[POSITION_IDX] - self.variable_parameters.target_position, s[POSITIOND_IDX], angle, s[ANGLED_IDX]])
 
-        Q = np.dot(-self.K, state).item()
+        Q = -np.dot(K, state)
 
         Q *= (1 + self.p_Q * float(self.rng.uniform(self.action_low, self.action_high)))
 
         # Clip Q
         Q = np.clip(Q, -1.0, 1.0, dtype=np.float32)
         return Q
+
+    def step_batch(self, s: np.ndarray, target_positions, L=None, target_equilibria=None):
+        """
+        Control of N cartpoles at once.
+        s is N x 6 (order of STATE_VARIABLES), target_positions, L and target_equilibria are scalars or arrays of N.
+        L and target_equilibria matter only with the gain schedule,
+        by default the values last passed to step (through updated_attributes) are used.
+        Returns the N control inputs.
+        """
+        s = np.atleast_2d(s)
+        angle = s[:, ANGLE_IDX].astype(np.float64)
+        if self.gain_schedule is None:
+            K = self.K[0]
+        else:
+            if L is None:
+                L = self.variable_parameters.L
+            if target_equilibria is None:
+                target_equilibria = getattr(self.variable_parameters, 'target_equilibrium', 1.0)
+            L = np.broadcast_to(np.asarray(L, dtype=np.float64), angle.shape)
+            target_equilibria = np.broadcast_to(np.asarray(target_equilibria, dtype=np.float64), angle.shape)
+            K = self.gain_schedule.gain_batch(L, target_equilibria)
+            angle -= np.where(target_equilibria >= 0.0, EQUILIBRIA[1.0], EQUILIBRIA[-1.0])
+            wrap_angle_rad_inplace(angle)
+
+        state = np.stack(
+            [s[:, POSITION_IDX] - target_positions, s[:, POSITIOND_IDX], angle, s[:, ANGLED_IDX]], axis=-1)
+
+        Q = -np.sum(K * state, axis=-1)
+
+        Q *= (1 + self.p_Q * self.rng.uniform(self.action_low, self.action_high, size=len(s)))
+
+        return np.clip(Q, -1.0, 1.0, dtype=np.float32)
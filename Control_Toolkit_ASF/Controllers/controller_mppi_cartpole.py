@@ -568,6 +568,17 @@ class controller_mppi_cartpole(template_controller):
 
         return Q  # normed control input in the range [-1,1]
 
+    def warmup(self):
+        """Compiles the predictor and the numba cost kernels with the shapes used in step, without changing the controller state.
+        Called by CartPole.warmup() before an experiment."""
+        u = np.zeros_like(self.u)
+        delta_u = np.zeros_like(self.delta_u)
+        initial_state = np.tile(create_cartpole_state(), (num_rollouts, 1))
+        s_horizon = predictor.predict(initial_state, (u + delta_u)[..., np.newaxis])[:, :, : len(STATE_INDICES)]
+        S_tilde_k = np.sum(q(s_horizon[:, :-1, :], u, delta_u, np.zeros_like(self.u_prev), self.variable_parameters.target_position)[0], axis=1)
+        S_tilde_k += phi(s_horizon, self.variable_parameters.target_position)
+        update_inputs(u, S_tilde_k, delta_u)
+
     def update_control_vector(self):
         """
         MPPI stores a vector of best-guess-so-far control inputs for future steps.
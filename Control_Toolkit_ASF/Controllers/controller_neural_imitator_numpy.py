@@ -0,0 +1,61 @@
+"""
+Neural imitator evaluated with NumPy/numba instead of TensorFlow: the network trained to imitate a controller
+is exported once with SI_Toolkit_ASF/numpy_inference/export_network.py to <net_name>.npz in its folder
+and run by NumpyNetwork, a step taking microseconds and TF not being imported.
+
+The inputs of the network are taken by name from the state, target_position from the environment attributes
+and Q from the previous action of the controller.
+"""
+
+import os
+
+import numpy as np
+from CartPole.state_utilities import STATE_INDICES
+from Control_Toolkit.Controllers import template_controller
+from SI_Toolkit.computation_library import NumpyLibrary, TensorType
+from SI_Toolkit_ASF.numpy_inference.numpy_network import NumpyNetwork
+
+
+class controller_neural_imitator_numpy(template_controller):
+    _computation_library = NumpyLibrary
+
+    def configure(self):
+        net_name = self.config_controller["net_name"]
+        path = os.path.join(self.config_controller["PATH_TO_MODELS"], net_name, net_name + '.npz')
+        if not os.path.isfile(path):
+            raise FileNotFoundError('{} not found, export the network first with '
+                                    'python -m SI_Toolkit_ASF.numpy_inference.export_network'.format(path))
+        self.net = NumpyNetwork.load(path, batch_size=1)
+        if self.net.outputs != ['Q']:
+            raise ValueError('The neural imitator needs a network with the output Q, {} has {}'
+                             .format(net_name, self.net.outputs))
+
+        self.state_inputs = [(i, STATE_INDICES[name]) for i, name in enumerate(self.net.inputs) if name in STATE_INDICES]
+        self.target_position_input = self.net.inputs.index('target_position') \
+            if 'target_position' in self.net.inputs else None
+        self.Q_input = self.net.inputs.index('Q') if 'Q' in self.net.inputs else None
+        unknown_inputs = set(self.net.inputs) - set(STATE_INDICES) - {'target_position', 'Q'}
+        if unknown_inputs:
+            raise ValueError('Unknown inputs of the network {}: {}'.format(net_name, sorted(unknown_inputs)))
+
+        self.net_input = np.zeros((1, len(self.net.inputs)), dtype=np.float32)
+        self.Q_previous = 0.0
+
+    def step(self, s: np.ndarray, time=None, updated_attributes: "dict[str, TensorType]" = {}):
+        self.update_attributes(updated_attributes)
+
+        for i, state_index in self.state_inputs:
+            self.net_input[0, i] = s[state_index]
+        if self.target_position_input is not None:
+            self.net_input[0, self.target_position_input] = self.variable_parameters.target_position
+        if self.Q_input is not None:
+            self.net_input[0, self.Q_input] = self.Q_previous
+
+        Q = float(np.clip(self.net.step(self.net_input)[0], self.action_low, self.action_high)[0])
+        self.Q_previous = Q
+
+        return Q
+
+    def controller_reset(self):
+        self.net.reset()
+        self.Q_previous = 0.0
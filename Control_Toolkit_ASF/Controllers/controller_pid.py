@@ -22,6 +22,8 @@ A PID controller for the Cartpole using CartpoleSimulator conventions
         (around zero in upright position, this means in fact angle gets negative),
         causes motor to move to the right
         iff a term below has - sign"
+
+step_batch controls N cartpoles at once with BatchedPID, which keeps the errors of each cartpole in arrays.
 """
 
 import json
@@ -59,6 +61,74 @@ sensitivity_aP_gain = 1.0
 sensitivity_aI_gain = 1.0
 sensitivity_aD_gain = 0.01
 
+
+class BatchedPID:
+    """
+    The position and angle PID of controller_pid for N cartpoles at once.
+    Errors, integrals and previous errors are arrays of N, gains may be scalars or arrays of N (e.g. to compare gains).
+    """
+
+    def __init__(self, number_of_cartpoles,
+                 POSITION_KP, POSITION_KI, POSITION_KD, ANGLE_KP, ANGLE_KI, ANGLE_KD, ANGLE_TARGET=0.0):
+        self.POSITION_KP, self.POSITION_KI, self.POSITION_KD = POSITION_KP, POSITION_KI, POSITION_KD
+        self.ANGLE_KP, self.ANGLE_KI, self.ANGLE_KD = ANGLE_KP, ANGLE_KI, ANGLE_KD
+        self.ANGLE_TARGET = ANGLE_TARGET
+
+        self.time_last = None
+        self.position_error_integral = np.zeros(number_of_cartpoles)
+        self.angle_error_integral = np.zeros(number_of_cartpoles)
+        # nan - no previous error yet, no derivative term
+        self.position_error_previous = np.full(number_of_cartpoles, np.nan)
+        self.angle_error_previous = np.full(number_of_cartpoles, np.nan)
+
+    def reset(self, rows=slice(None)):
+        """Resets the PID of the given cartpoles (index or boolean mask), all by default"""
+        self.position_error_integral[rows] = 0.0
+        self.angle_error_integral[rows] = 0.0
+        self.position_error_previous[rows] = np.nan
+        self.angle_error_previous[rows] = np.nan
+        if isinstance(rows, slice) and rows == slice(None):
+            self.time_last = None
+
+    @staticmethod
+    def _pid(error, error_previous, error_integral, time_difference, KP, KI, KD, sensitivities):
+        # Error difference, 0 where there is no previous error or the time difference is too small
+        valid = (time_difference > 0.0001) & ~np.isnan(error_previous)
+        error_diff = np.where(valid, (error - error_previous) / np.maximum(time_difference, 0.0001), 0.0)
+        error_previous[...] = error
+
+        # Error integral, pI/aI not bigger than 1.0
+        KI = np.asarray(KI, dtype=np.float64)
+        error_integral += error * time_difference
+        limit = 1.0 / np.where(KI > 0.0, KI, 1.0)
+        error_integral[...] = np.where(KI > 0.0, np.clip(error_integral, -limit, limit), 0.0)
+
+        sensitivity_P, sensitivity_I, sensitivity_D = sensitivities
+        return KP * error * sensitivity_P + KI * error_integral * sensitivity_I + KD * error_diff * sensitivity_D
+
+    def step(self, s, target_positions, time):
+        """s is N x 6 (order of STATE_VARIABLES), target_positions scalar or array of N. Returns N motor commands."""
+        if self.time_last is None:
+            time_difference = 0.0
+        else:
+            time_difference = time - self.time_last
+        # Ignore time difference if the difference very big (see controller_pid.step)
+        time_difference = np.where(time_difference > 0.1, 0.0, time_difference)
+        self.time_last = time
+
+        position_error = s[:, cartpole_state_varname_to_index('position')] - target_positions
+        Q_position = self._pid(position_error, self.position_error_previous, self.position_error_integral,
+                               time_difference, self.POSITION_KP, self.POSITION_KI, self.POSITION_KD,
+                               (sensitivity_pP_gain, sensitivity_pI_gain, sensitivity_pD_gain))
+
+        angle_error = s[:, cartpole_state_varname_to_index('angle')] - self.ANGLE_TARGET
+        Q_angle = -self._pid(angle_error, self.angle_error_previous, self.angle_error_integral,
+                             time_difference, self.ANGLE_KP, self.ANGLE_KI, self.ANGLE_KD,
+                             (sensitivity_aP_gain, sensitivity_aI_gain, sensitivity_aD_gain))
+
+        return Q_angle + Q_position
+
+
 class controller_pid(template_controller):
     def configure(self):
 
@@ -125,6 +195,9 @@ class controller_pid(template_controller):
         # Final motor command - sum of angle-PID and position-PID motor commands
         self.Q = 0
 
+        # PID of step_batch, created at the first call
+        self.batched_pid = None
+
 
     def step(self, s: np.ndarray, time=None, updated_attributes: "dict[str, TensorType]" = {}):
         self.update_attributes(updated_attributes)
@@ -215,6 +288,26 @@ class controller_pid(template_controller):
 
         return self.Q
 
+    def step_batch(self, s: np.ndarray, target_positions, time=None):
+        """
+        Control of N cartpoles at once, with the current gains.
+        s is N x 6 (order of STATE_VARIABLES), target_positions scalar or array of N.
+        The errors of each cartpole are kept between calls; use self.batched_pid.reset(rows) when some of them restart.
+        Returns the N motor commands.
+        """
+        s = np.atleast_2d(s)
+        if self.batched_pid is None or len(self.batched_pid.angle_error_integral) != len(s):
+            self.batched_pid = BatchedPID(len(s), self.POSITION_KP, self.POSITION_KI, self.POSITION_KD,
+                                          self.ANGLE_KP, self.ANGLE_KI, self.ANGLE_KD, self.ANGLE_TARGET)
+        else:
+            # Gains may have been changed with keyboard or loaded from json
+            self.batched_pid.POSITION_KP, self.batched_pid.POSITION_KI, self.batched_pid.POSITION_KD = \
+                self.POSITION_KP, self.POSITION_KI, self.POSITION_KD
+            self.batched_pid.ANGLE_KP, self.batched_pid.ANGLE_KI, self.batched_pid.ANGLE_KD = \
+                self.ANGLE_KP, self.ANGLE_KI, self.ANGLE_KD
+            self.batched_pid.ANGLE_TARGET = self.ANGLE_TARGET
+        return self.batched_pid.step(s, target_positions, time)
+
     def printparams(self):
         print("\nAngle PID Control Parameters")
         print("    Set point       {0}".format(self.ANGLE_TARGET))
@@ -343,3 +436,6 @@ class controller_pid(template_controller):
 
         self.position_error_integral = 0.0
         self.angle_error_integral = 0.0
+
+        if self.batched_pid is not None:
+            self.batched_pid.reset()
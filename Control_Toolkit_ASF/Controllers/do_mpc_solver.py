@@ -0,0 +1,193 @@
+"""
+IPOPT solver options shared by the do-mpc controllers.
+
+- The linear solver from the config (HSL MA57/MA27 are fastest) is used if IPOPT can load it, MUMPS otherwise.
+- With code_generation, the NLP functions are compiled by CasADi C code generation into a shared library,
+  cached on disk under the hash of the generated code (so any change of model, cost or horizon compiles anew).
+- The solver of the do-mpc optimizer is wrapped by WarmStartedSolver, which measures the solve times and can start
+  IPOPT from the previous solution shifted by one step and from the previous multipliers
+  (do-mpc itself only restarts from the previous primal solution, unshifted).
+"""
+
+import hashlib
+import os
+import subprocess
+import tempfile
+import warnings
+from timeit import default_timer as timer
+
+import casadi
+import numpy as np
+
+IPOPT_SILENT = {'ipopt.print_level': 0, 'ipopt.sb': 'yes', 'print_time': 0}
+IPOPT_WARM_START = {
+    'ipopt.warm_start_init_point': 'yes',
+    'ipopt.warm_start_bound_push': 1e-6,
+    'ipopt.warm_start_slack_bound_push': 1e-6,
+    'ipopt.warm_start_mult_bound_push': 1e-6,
+}
+FALLBACK_LINEAR_SOLVER = 'mumps'
+
+_linear_solver_available = {}
+
+
+def linear_solver_available(linear_solver):
+    """Whether IPOPT can use the linear solver (HSL ones are not part of a plain install), checked on a tiny NLP"""
+    linear_solver = linear_solver.lower()
+    if linear_solver not in _linear_solver_available:
+        x = casadi.SX.sym('x')
+        try:
+            solver = casadi.nlpsol('linear_solver_check', 'ipopt', {'x': x, 'f': (x - 1.0) ** 2},
+                                   {**IPOPT_SILENT, 'ipopt.linear_solver': linear_solver})
+            solver(x0=0.0)
+            _linear_solver_available[linear_solver] = solver.stats()['success']
+        except RuntimeError:
+            _linear_solver_available[linear_solver] = False
+    return _linear_solver_available[linear_solver]
+
+
+def choose_linear_solver(linear_solver):
+    if linear_solver is None or linear_solver_available(linear_solver):
+        return linear_solver or FALLBACK_LINEAR_SOLVER
+    warnings.warn("IPOPT linear solver '{}' is not available, using '{}'".format(linear_solver, FALLBACK_LINEAR_SOLVER))
+    return FALLBACK_LINEAR_SOLVER
+
+
+def nlpsol_options(config_controller):
+    """IPOPT options for the do-mpc optimizer from the config of the controller"""
+    options = {**IPOPT_SILENT, 'ipopt.linear_solver': choose_linear_solver(config_controller.get('linear_solver'))}
+    if config_controller.get('warm_start_dual', False):
+        options.update(IPOPT_WARM_START)
+    if config_controller.get('max_iter') is not None:
+        options['ipopt.max_iter'] = int(config_controller['max_iter'])
+    return options
+
+
+def compile_nlp_solver(solver, options, cache_folder, compiler='gcc', flags=('-O1',)):
+    """
+    IPOPT solver of the NLP of solver with its functions compiled to a shared library.
+    The library is looked up in cache_folder under the hash of the generated C code and compiled only if missing.
+    """
+    os.makedirs(cache_folder, exist_ok=True)
+    with tempfile.TemporaryDirectory() as folder:
+        cwd = os.getcwd()
+        os.chdir(folder)  # generate_dependencies writes to the working directory
+        try:
+            source_name = solver.generate_dependencies('nlp.c')
+        finally:
+            os.chdir(cwd)
+        source_path = os.path.join(folder, source_name)
+        with open(source_path, 'rb') as f:
+            key = hashlib.sha256(f.read() + ' '.join((compiler,) + tuple(flags)).encode()).hexdigest()[:16]
+        library_path = os.path.abspath(os.path.join(cache_folder, 'nlp_{}.so'.format(key)))
+        if not os.path.isfile(library_path):
+            print('Compiling the NLP of do-mpc to {}, this takes a while the first time...'.format(library_path))
+            temporary_library_path = library_path + '.{}.tmp'.format(os.getpid())
+            subprocess.run([compiler, '-fPIC', '-shared', *flags, source_path, '-o', temporary_library_path], check=True)
+            os.replace(temporary_library_path, library_path)  # Atomic, other processes never load a partial library
+    return casadi.nlpsol(solver.name(), 'ipopt', library_path, options)
+
+
+def shift_indices(opt_x, n_horizon):
+    """Indices of the optimization variables of do-mpc (target, source) moving the solution one step forward"""
+    target, source = [], []
+    for key, length in (('_x', n_horizon + 1), ('_z', n_horizon), ('_u', n_horizon)):
+        for k in range(length - 1):
+            target.append(np.ravel(opt_x.f[key, k]))
+            source.append(np.ravel(opt_x.f[key, k + 1]))
+    return np.concatenate(target).astype(int), np.concatenate(source).astype(int)
+
+
+class WarmStartedSolver:
+    """
+    Replaces the solver S of a set up do-mpc optimizer, which calls it as S(x0=..., lbx=..., ...) and asks S.stats().
+    Each call is timed; optionally the initial guess (and the multipliers of the bounds) are shifted by one step
+    and the multipliers of the previous solution are passed to IPOPT.
+    """
+
+    def __init__(self, solver, opt_x=None, n_horizon=None, shift=False, dual=False):
+        self.solver = solver
+        self.shift = shift
+        self.dual = dual
+        self.shift_target, self.shift_source = shift_indices(opt_x, n_horizon) if shift else (None, None)
+        self.solve_times = []
+        self.iterations = []
+        self.successes = []
+        self.reset()
+
+    def reset(self):
+        """Forgets the previous solution (e.g. when the controller is reset)"""
+        self.lam_x = None
+        self.lam_g = None
+        self.previous_solution = False
+
+    def _shift(self, values):
+        values = np.array(values, dtype=np.float64).ravel()
+        values[self.shift_target] = values[self.shift_source]
+        return values
+
+    def __call__(self, **kwargs):
+        if self.previous_solution:
+            if self.shift:
+                kwargs['x0'] = self._shift(kwargs['x0'].cat if hasattr(kwargs['x0'], 'cat') else kwargs['x0'])
+            if self.dual:
+                kwargs['lam_x0'] = self._shift(self.lam_x) if self.shift else self.lam_x
+                kwargs['lam_g0'] = self.lam_g
+
+        start = timer()
+        result = self.solver(**kwargs)
+        self.solve_times.append(timer() - start)
+
+        stats = self.solver.stats()
+        self.iterations.append(stats.get('iter_count', np.nan))
+        self.successes.append(stats['success'])
+        self.lam_x, self.lam_g = result['lam_x'], result['lam_g']
+        self.previous_solution = True
+        return result
+
+    def stats(self):
+        return self.solver.stats()
+
+    def statistics(self):
+        """Solve time (s) and IPOPT iteration statistics over all calls so far"""
+        solve_times = np.array(self.solve_times)
+        if len(solve_times) == 0:
+            return {'solves': 0}
+        return {
+            'solves': len(solve_times),
+            'solve_time_mean': solve_times.mean(),
+            'solve_time_median': np.median(solve_times),
+            'solve_time_p95': np.percentile(solve_times, 95),
+            'solve_time_max': solve_times.max(),
+            'iterations_mean': np.nanmean(self.iterations),
+            'success_rate': np.mean(self.successes),
+        }
+
+    def report(self):
+        statistics = self.statistics()
+        if statistics['solves'] == 0:
+            print('do-mpc: no solves yet')
+            return
+        print('do-mpc: {} solves, solve time mean {:.2f} ms, median {:.2f} ms, 95th percentile {:.2f} ms, max {:.2f} ms; '
+              '{:.1f} IPOPT iterations on average, {:.1%} successful'
+              .format(statistics['solves'], statistics['solve_time_mean'] * 1000, statistics['solve_time_median'] * 1000,
+                      statistics['solve_time_p95'] * 1000, statistics['solve_time_max'] * 1000,
+                      statistics['iterations_mean'], statistics['success_rate']))
+
+
+def setup_solver(mpc, config_controller):
+    """
+    To be called after mpc.setup(): compiles the NLP if code_generation is set in the config
+    and wraps the solver of mpc with WarmStartedSolver. Returns the wrapper.
+    """
+    solver = mpc.S
+    if config_controller.get('code_generation', False):
+        try:
+            solver = compile_nlp_solver(solver, mpc.nlpsol_opts,
+                                        config_controller.get('code_generation_cache_folder', './.do_mpc_cache/'))
+        except (OSError, subprocess.CalledProcessError) as e:
+            warnings.warn('Compilation of the do-mpc NLP failed ({}), using it not compiled'.format(e))
+    mpc.S = WarmStartedSolver(solver, mpc.opt_x, mpc.n_horizon,
+                              shift=config_controller.get('warm_start_shift', False),
+                              dual=config_controller.get('warm_start_dual', False))
+    return mpc.S
@@ -0,0 +1,122 @@
+"""
+Lookup table of the first action of do-mpc on a regular grid, used by controller_do_mpc_explicit.
+
+The axes of the grid are features of the state (see FEATURES), e.g. the position relative to the target:
+the cartpole dynamics and the do-mpc cost depend on position and target only through their difference.
+The table is filled offline by others/explicit_mpc/build_explicit_mpc.py.
+Between the grid points the action is interpolated multilinearly (2**dimensions corners, compiled with numba),
+axes marked periodic (angle) wrap around, the other ones are clipped to their range.
+"""
+
+import json
+
+import numpy as np
+from numba import jit
+
+from CartPole.state_utilities import ANGLE_IDX, ANGLED_IDX, POSITION_IDX, POSITIOND_IDX
+
+# Feature name: function of (state, target_position, Q_previous)
+FEATURES = {
+    'position_error': lambda s, target_position, Q_previous: s[..., POSITION_IDX] - target_position,
+    'positionD': lambda s, target_position, Q_previous: s[..., POSITIOND_IDX],
+    'angle': lambda s, target_position, Q_previous: s[..., ANGLE_IDX],
+    'angleD': lambda s, target_position, Q_previous: s[..., ANGLED_IDX],
+    'Q_previous': lambda s, target_position, Q_previous: Q_previous + 0.0 * s[..., POSITION_IDX],
+}
+
+
+@jit(nopython=True, cache=True)
+def interpolate_multilinear(values, lower, step, sizes, periodic, point):
+    """Multilinear interpolation in the flattened (C order) grid of values at one point"""
+    dimensions = len(sizes)
+    index = np.empty(dimensions, dtype=np.int64)
+    weight = np.empty(dimensions)
+    for i in range(dimensions):
+        position = (point[i] - lower[i]) / step[i]
+        if periodic[i]:
+            position = position % sizes[i]
+            j = min(int(np.floor(position)), sizes[i] - 1)
+        else:
+            position = min(max(position, 0.0), sizes[i] - 1.0)
+            j = min(int(np.floor(position)), sizes[i] - 2)
+        index[i] = j
+        weight[i] = position - j
+
+    result = 0.0
+    for corner in range(1 << dimensions):
+        corner_weight = 1.0
+        flat_index = 0
+        for i in range(dimensions):
+            bit = (corner >> i) & 1
+            j = index[i] + bit
+            if j == sizes[i]:  # Only for periodic axes
+                j = 0
+            corner_weight *= weight[i] if bit else 1.0 - weight[i]
+            flat_index = flat_index * sizes[i] + j
+        result += corner_weight * values[flat_index]
+    return result
+
+
+@jit(nopython=True, cache=True)
+def interpolate_multilinear_batch(values, lower, step, sizes, periodic, points):
+    result = np.empty(len(points))
+    for n in range(len(points)):
+        result[n] = interpolate_multilinear(values, lower, step, sizes, periodic, points[n])
+    return result
+
+
+class ExplicitMPCTable:
+    """
+    Values on a grid given by axes: list of dicts with name (of FEATURES), points and either low and high
+    or periodic: true (range [-pi, pi), the end point being the start point).
+    metadata (dict) is saved along, e.g. the config of the controller the table approximates.
+    """
+
+    def __init__(self, axes, values=None, metadata=None):
+        self.axes = [dict(axis) for axis in axes]
+        self.names = [axis['name'] for axis in self.axes]
+        for name in self.names:
+            if name not in FEATURES:
+                raise ValueError("Unknown axis '{}', possible axes are {}".format(name, list(FEATURES)))
+        self.periodic = np.array([bool(axis.get('periodic', False)) for axis in self.axes])
+        self.sizes = np.array([int(axis['points']) for axis in self.axes], dtype=np.int64)
+        self.lower = np.array([-np.pi if periodic else float(axis['low']) for axis, periodic in zip(self.axes, self.periodic)])
+        upper = np.array([np.pi if periodic else float(axis['high']) for axis, periodic in zip(self.axes, self.periodic)])
+        self.step = (upper - self.lower) / np.where(self.periodic, self.sizes, self.sizes - 1)
+
+        self.values = np.full(tuple(self.sizes), np.nan) if values is None else np.asarray(values, dtype=np.float64)
+        if self.values.shape != tuple(self.sizes):
+            raise ValueError('Values of shape {} do not fit the axes {}'.format(self.values.shape, tuple(self.sizes)))
+        self.metadata = metadata or {}
+
+    def axis_points(self, i):
+        return self.lower[i] + self.step[i] * np.arange(self.sizes[i])
+
+    def grid_points(self):
+        """All grid points (number of points x dimensions), in the order of values.ravel()"""
+        grids = np.meshgrid(*[self.axis_points(i) for i in range(len(self.sizes))], indexing='ij')
+        return np.stack([grid.ravel() for grid in grids], axis=-1)
+
+    def features(self, s, target_position, Q_previous, out=None):
+        """Point(s) of the table for state(s) s (... x 6)"""
+        if out is None:
+            out = np.empty(np.shape(s)[:-1] + (len(self.names),))
+        for i, name in enumerate(self.names):
+            out[..., i] = FEATURES[name](s, target_position, Q_previous)
+        return out
+
+    def __call__(self, point):
+        return interpolate_multilinear(self.values.ravel(), self.lower, self.step, self.sizes, self.periodic,
+                                       np.asarray(point, dtype=np.float64))
+
+    def batch(self, points):
+        return interpolate_multilinear_batch(self.values.ravel(), self.lower, self.step, self.sizes, self.periodic,
+                                             np.ascontiguousarray(points, dtype=np.float64))
+
+    def save(self, path):
+        np.savez(path, values=self.values, axes=json.dumps(self.axes), metadata=json.dumps(self.metadata))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(json.loads(str(data['axes'])), data['values'], json.loads(str(data['metadata'])))
@@ -19,6 +19,7 @@ dd_weight = config["CartPole"]["quadratic_boundary_grad"]["dd_weight"]
 cc_weight = config["CartPole"]["quadratic_boundary_grad"]["cc_weight"]
 ep_weight = config["CartPole"]["quadratic_boundary_grad"]["ep_weight"]
 admissible_angle = np.deg2rad(config["CartPole"]["quadratic_boundary_grad"]["admissible_angle"], dtype=np.float32)
+cos_admissible_angle = float(np.cos(admissible_angle))  # Python float works with every computation library (incl. torch)
 ekp_weight = config["CartPole"]["quadratic_boundary_grad"]["ekp_weight"]
 ccrc_weight = config["CartPole"]["quadratic_boundary_grad"]["ccrc_weight"]
 R = config["CartPole"]["quadratic_boundary_grad"]["R"]
@@ -41,7 +42,7 @@ class quadratic_boundary_grad(cost_function_base):
     # cost for difference from upright position
     def _E_pot_cost(self, angle):
         """Compute penalty for not balancing pole upright (penalize large angles)"""
-        return 0.25 * (1.0 + self.lib.cos(admissible_angle) - self.lib.cos(angle + (1.0-self.variable_parameters.target_equilibrium)*self.lib.pi/2.0)) ** 2
+        return 0.25 * (1.0 + cos_admissible_angle - self.lib.cos(angle + (1.0-self.variable_parameters.target_equilibrium)*self.lib.pi/2.0)) ** 2
 
     def _E_kin_cost(self, angleD):
         """Compute penalty for not balancing pole upright (penalize large angles)"""
@@ -43,6 +43,7 @@ import csv
 # Import Cart class - the class keeping all the parameters and methods
 # related to CartPole which are not related to PyQt6 GUI
 from CartPole import CartPole
+from CartPole.replay import ReplayPlayer
 from CartPole.state_utilities import ANGLED_IDX, ANGLE_IDX, POSITION_IDX, POSITIOND_IDX, create_cartpole_state
 
 from GUI.gui_default_params import *
@@ -240,6 +241,8 @@ class MainWindow(QMainWindow):
         ld2.addWidget(self.labSpeedUp)
         self.labSliderInstant = QLabel('')
         ld2.addWidget(self.labSliderInstant)
+        self.labControllerLatency = QLabel('')
+        ld2.addWidget(self.labControllerLatency)
         layout.addLayout(ld2)
 
         # endregion
@@ -547,7 +550,7 @@ class MainWindow(QMainWindow):
         # region Start animation repeatedly redrawing changing elements of matplotlib figures (CartPole drawing and slider)
         # This animation runs ALWAYS when the GUI is open
         # The buttons of GUI only decide if new parameters are calculated or not
-        self.anim = self.CartPoleInstance.run_animation(self.fig)
+        self.anim = self.CartPoleInstance.run_animation(self.fig, max_fps=animation_max_fps)
         # endregion
 
 
@@ -562,24 +565,36 @@ class MainWindow(QMainWindow):
         except:
             pass
 
+        self.CartPoleInstance.snapshot.active = True
         self.looper.start_loop()
         while not self.terminate_experiment_or_replay_thread:
             if self.pause_experiment_or_replay_thread:
                 time.sleep(0.1)
             else:
-                # Calculations of the Cart state in the next timestep
-                self.CartPoleInstance.update_state()
-
-                # Terminate thread if random experiment reached its maximal length
-                if (
-                        self.CartPoleInstance.use_pregenerated_target_position
-                        and
-                        (self.CartPoleInstance.time >= self.CartPoleInstance.t_max_pre)
-                ):
-                    self.terminate_experiment_or_replay_thread = True
-
-                # FIXME: when Speedup empty in GUI I expected inf speedup but got error Loop timer was not initialized properly
+                steps_per_tick, self.looper.dt_target = self.simulation_steps_per_tick()
+                tick_deadline = time.perf_counter() + max(self.looper.dt_target, simulation_tick_min)
+                for _ in range(steps_per_tick):
+                    # Calculations of the Cart state in the next timestep
+                    self.CartPoleInstance.update_state()
+
+                    # Terminate thread if random experiment reached its maximal length
+                    if (
+                            self.CartPoleInstance.use_pregenerated_target_position
+                            and
+                            (self.CartPoleInstance.time >= self.CartPoleInstance.t_max_pre)
+                    ):
+                        self.terminate_experiment_or_replay_thread = True
+                        break
+
+                    # Computer too slow for the speed-up: draw at least once per tick
+                    if time.perf_counter() >= tick_deadline:
+                        break
+
+                # Only the last state of the tick is drawn
+                self.CartPoleInstance.publish_snapshot()
+
                 self.looper.sleep_leftover_time()
+        self.CartPoleInstance.snapshot.active = False
 
         # Save simulation history if user chose to do so at the end of the simulation
         if self.save_history:
@@ -594,6 +609,21 @@ class MainWindow(QMainWindow):
 
         self.experiment_or_replay_thread_terminated = True
 
+    def simulation_steps_per_tick(self):
+        """
+        Number of simulation steps per tick of the experiment loop and the target duration of the tick.
+        While a step at the current speed-up would last at least simulation_tick_min it gets its own tick,
+        otherwise several steps run in a tick (up to its duration for infinite speed-up) instead of sleeping after each.
+        """
+        dt_step = self.CartPoleInstance.dt_simulation / self.speedup
+        if dt_step >= simulation_tick_min:
+            return 1, dt_step
+        elif dt_step == 0.0:
+            return sys.maxsize, 0.0
+        else:
+            steps_per_tick = int(np.ceil(simulation_tick_min / dt_step))
+            return steps_per_tick, steps_per_tick * dt_step
+
     # endregion
 
     # region Thread replaying a saved experiment recording
@@ -608,8 +638,8 @@ class MainWindow(QMainWindow):
         # Check what is in the csv textbox
         csv_name = self.textbox.text()
 
-        # Load experiment history
-        history_pd, filepath = self.CartPoleInstance.load_history_csv(csv_name=csv_name)
+        # Load experiment history as column arrays
+        recording, filepath = self.CartPoleInstance.load_history_replay(csv_name=csv_name)
 
         # Set cartpole in the right mode (just to ensure slider behaves properly)
         with open(filepath, newline='') as f:
@@ -644,15 +674,14 @@ class MainWindow(QMainWindow):
                 self.update_rbs_optimizers_status(visible=self.CartPoleInstance.controller.has_optimizer)
                 break
 
-        # Augment the experiment history with simulation time step size
-        dt = []
-        row_iterator = history_pd.iterrows()
-        _, last = next(row_iterator)  # take first item from row_iterator
-        for i, row in row_iterator:
-            dt.append(row['time'] - last['time'])
-            last = row
-        dt.append(dt[-1])
-        history_pd['dt'] = np.array(dt)
+        time_column = recording['time']
+        position, positionD, angle = recording['position'], recording['positionD'], recording['angle']
+        Q_applied, target_position = recording['Q_applied'], recording['target_position']
+        u = recording['u'] if 'u' in recording else None
+        # TODO: Make it more general for all possible parameters
+        L_column = recording['L'] if 'L' in recording else None
+
+        player = ReplayPlayer(recording, min_frame_period=replay_min_frame_period)
 
         # Initialize loop timer (with arbitrary dt)
         replay_looper = loop_timer(dt_target=0.0)
@@ -660,46 +689,49 @@ class MainWindow(QMainWindow):
         # Start looping over history
         replay_looper.start_loop()
         global L
-        for index, row in history_pd.iterrows():
-            self.CartPoleInstance.s[POSITION_IDX] = row['position']
-            self.CartPoleInstance.s[POSITIOND_IDX] = row['positionD']
-            self.CartPoleInstance.s[ANGLE_IDX] = row['angle']
-            self.CartPoleInstance.time = row['time']
-            self.CartPoleInstance.dt = row['dt']
-            try:
-                self.CartPoleInstance.u = row['u']
-            except KeyError:
-                pass
-            self.CartPoleInstance.Q = row['Q_applied']
-            self.CartPoleInstance.target_position = row['target_position']
+        self.CartPoleInstance.snapshot.active = True
+        while True:
+            index = player.index
+            self.CartPoleInstance.s[POSITION_IDX] = position[index]
+            self.CartPoleInstance.s[POSITIOND_IDX] = positionD[index]
+            self.CartPoleInstance.s[ANGLE_IDX] = angle[index]
+            self.CartPoleInstance.time = time_column[index]
+            self.CartPoleInstance.dt = recording.dt[index]
+            if u is not None:
+                self.CartPoleInstance.u = u[index]
+            self.CartPoleInstance.Q = Q_applied[index]
+            self.CartPoleInstance.target_position = target_position[index]
             if self.CartPoleInstance.controller_name == 'manual-stabilization':
                 self.CartPoleInstance.slider_value = self.CartPoleInstance.Q
             else:
                 self.CartPoleInstance.slider_value = self.CartPoleInstance.target_position/TrackHalfLength
 
-            # TODO: Make it more general for all possible parameters
-            try:
-                L[...] = row['L']
-            except KeyError:
-                pass
-            except:
-                print('Error while assigning L')
-                print("Unexpected error:", sys.exc_info()[0])
-                print("Unexpected error:", sys.exc_info()[1])
+            if L_column is not None:
+                L[...] = L_column[index]
+
+            self.CartPoleInstance.publish_snapshot()
 
-            dt_target = (self.CartPoleInstance.dt / self.speedup)
-            replay_looper.dt_target = dt_target
+            # Rows shorter than replay_min_frame_period are skipped at high speed-up
+            replay_looper.dt_target = player.frame_period(self.speedup)
 
             replay_looper.sleep_leftover_time()
 
             if self.terminate_experiment_or_replay_thread:  # Means that stop button was pressed
                 break
 
-            while self.pause_experiment_or_replay_thread:  # Means that pause button was pressed
-                time.sleep(0.1)
+            if self.pause_experiment_or_replay_thread:  # Means that pause button was pressed
+                while self.pause_experiment_or_replay_thread:
+                    time.sleep(0.1)
+                replay_looper.start_loop()  # The pause does not advance the replay
+
+            if player.finished:
+                break
+
+            player.advance(replay_looper.circ_buffer_dt_real.last, self.speedup)
+        self.CartPoleInstance.snapshot.active = False
 
         if self.show_experiment_summary:
-            self.CartPoleInstance.dict_history = history_pd.loc[:index].to_dict(orient='list')
+            self.CartPoleInstance.dict_history = recording.history_until(index)
 
         self.experiment_or_replay_thread_terminated = True
 
@@ -855,6 +887,7 @@ class MainWindow(QMainWindow):
                 self.CartPoleInstance.controller.controller_report()
             except:
                 pass
+            self.CartPoleInstance.controller_latency.print_report()
 
         if self.simulator_mode == 'Physical CP':
             self.PhysicalCartPoleDriverInstance.quit_experiment()
@@ -918,6 +951,8 @@ class MainWindow(QMainWindow):
 
     # A thread redrawing labels (except for timer, which has its own function) of GUI every 0.1 s
     def set_labels_thread(self):
+        # Speed-up measured as the simulation (or replay) time elapsed between the updates of the labels
+        last_simulation_time, last_wall_time = self.CartPoleInstance.time, time.perf_counter()
         while (self.run_set_labels_thread):
             self.labSpeed.setText("Speed (m/s): " + str(np.around(self.CartPoleInstance.s[POSITIOND_IDX], 2)))
             self.labAngle.setText(
@@ -938,10 +973,16 @@ class MainWindow(QMainWindow):
 
             self.labTimeSim.setText('Simulation time (s): {:.2f}'.format(self.CartPoleInstance.time))
 
-            mean_dt_real = np.mean(self.looper.circ_buffer_dt_real)
-            if mean_dt_real > 0:
+            if self.CartPoleInstance.controller_name == 'manual-stabilization':
+                self.labControllerLatency.setText('')
+            else:
+                self.labControllerLatency.setText(self.CartPoleInstance.controller_latency.short_report())
+
+            simulation_time, wall_time = self.CartPoleInstance.time, time.perf_counter()
+            if simulation_time > last_simulation_time:
                 self.labSpeedUp.setText('Speed-up (measured): x{:.2f}'
-                                        .format(self.CartPoleInstance.dt_simulation / mean_dt_real))
+                                        .format((simulation_time - last_simulation_time) / (wall_time - last_wall_time)))
+            last_simulation_time, last_wall_time = simulation_time, wall_time
             sleep(0.1)
 
     # Function to measure the time of simulation as experienced by user
@@ -47,6 +47,10 @@ speedup_init = 1.0  # Multiplicative factor by which the simulation seen by the
 # E.g. 2.0 means that you watch simulation double speed
 # WARNING: This is the target value, max speedup is limited by speed of performing CartPole simulation
 # True instantaneous speedup is displayed in CartPole GUI as "Speed-up(measured)"
+replay_min_frame_period = 0.005  # s, at high speed-up replay skips recorded rows to show each at least so long
+simulation_tick_min = 0.005  # s, at high speed-up the simulation runs several steps per tick of at least this length
+# and only the last of them is drawn, instead of sleeping after every step
+animation_max_fps = 60.0  # Maximal frame rate of redrawing the CartPole
 
 # Action toggling between showing the ground level and above
 # and showing above and below ground level the length of the pole
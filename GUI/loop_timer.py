@@ -3,14 +3,50 @@ import numpy as np
 from timeit import default_timer as timer
 from time import sleep
 
-from collections import deque
-
 import warnings
 
+
+class RingBuffer:
+    """ Preallocated circular buffer of the last `size` float samples"""
+
+    def __init__(self, size: int) -> None:
+        self.values = np.zeros(size)
+        self.index = 0  # Where the next sample is written
+        self.count = 0
+
+    def append(self, value: float) -> None:
+        self.values[self.index] = value
+        self.index = (self.index + 1) % len(self.values)
+        self.count = min(self.count + 1, len(self.values))
+
+    @property
+    def last(self) -> float:
+        return self.values[self.index - 1]
+
+    def filled(self) -> np.ndarray:
+        """ The samples written so far (in no particular order)"""
+        return self.values[:self.count]
+
+    def mean(self) -> float:
+        return self.filled().mean() if self.count else 0.0
+
+    def std(self) -> float:
+        return self.filled().std() if self.count else 0.0
+
+
 class loop_timer():
-    """ Simple game loop timer that sleeps for leftover time (if any) at end of each iteration"""
+    """
+    Game loop timer that waits at the end of each iteration till the deadline of the iteration.
+
+    Deadlines are absolute (start + sum of dt_target of the iterations so far),
+    so that neither the overshoot of the OS sleep nor the time of computations accumulates to a drift.
+    It sleeps until SPIN_TIME before the deadline and busy-waits the rest, which is precise to microseconds.
+    If an iteration runs over by more than a full dt_target, the schedule restarts from now
+    instead of hurrying through the following iterations.
+    """
     LOG_INTERVAL_SEC = 10
     NUM_SAMPLES = 1000
+    SPIN_TIME = 0.0005  # s, sleep granularity of the OS is worse than that on most systems
 
     def __init__(self, rate_hz: float = None, dt_target: float = None, do_diagnostics: bool = False) -> None:
         """ Make a new loop_timer, specifying the target frame rate in Hz or time interval dt_target in seconds
@@ -29,18 +65,19 @@ class loop_timer():
             raise Exception('You must provide either rate_hz or dt!')
         elif (rate_hz is None) and (dt_target is not None):
             self.dt_target = dt_target  # rate_hz set automatically
-        elif (self.rate_hz is not None) and (self.dt_target is None):
+        elif (rate_hz is not None) and (dt_target is None):
             self.rate_hz = rate_hz  # dt_target set automatically
 
         self.first_call_done = False
 
         self.last_iteration_start_time = 0
+        self.deadline = 0
 
         self.do_diagnostics = do_diagnostics
         self.last_log_time = 0
-        self.circ_buffer_dt = deque(iterable=np.zeros(self.NUM_SAMPLES), maxlen=self.NUM_SAMPLES)
-        self.circ_buffer_leftover = deque(iterable=np.zeros(self.NUM_SAMPLES), maxlen=self.NUM_SAMPLES)
-        self.circ_buffer_dt_real = deque(iterable=np.zeros(50), maxlen=50)
+        self.circ_buffer_dt = RingBuffer(self.NUM_SAMPLES)
+        self.circ_buffer_leftover = RingBuffer(self.NUM_SAMPLES)
+        self.circ_buffer_dt_real = RingBuffer(50)
 
     @property
     def rate_hz(self):
@@ -76,9 +113,18 @@ class loop_timer():
     def start_loop(self):
         """ should be called to initialize the timer just before the entering the first loop"""
         self.last_iteration_start_time = timer()
+        self.deadline = self.last_iteration_start_time
         self.last_log_time = self.last_iteration_start_time
         self.first_call_done = True
 
+    def wait_until(self, deadline):
+        """ Sleeps coarsely, then spins till the deadline (timer() clock)"""
+        leftover_time = deadline - timer()
+        if leftover_time > self.SPIN_TIME:
+            sleep(leftover_time - self.SPIN_TIME)
+        while timer() < deadline:
+            pass
+
     def sleep_leftover_time(self):
         """
         Call at the very end of each iteration.
@@ -89,14 +135,16 @@ class loop_timer():
             raise Exception('Loop timer was not initialized properly')
 
         dt = (now - self.last_iteration_start_time)
-        leftover_time = self.dt_target - dt
+        self.deadline += self.dt_target
+        leftover_time = self.deadline - now
         if leftover_time > 0:
-            sleep(leftover_time)
-            dt_real = self.dt_target
-        else:
-            dt_real = dt
+            self.wait_until(self.deadline)
+        elif leftover_time < -self.dt_target:
+            self.deadline = now  # Too late to catch up, restart the schedule
 
-        self.last_iteration_start_time = timer()
+        iteration_end_time = timer()
+        dt_real = iteration_end_time - self.last_iteration_start_time
+        self.last_iteration_start_time = iteration_end_time
 
         # You need buffers not only for diagnostics, but also to measure speed-up
         self.circ_buffer_dt.append(dt)
@@ -120,8 +168,8 @@ class loop_timer():
                         warnings.warn('\nTime ran over by {:.3f}ms the allowed time of {:.3f} ms.\n'
                                       .format(-leftover_time * 1000, self.dt_target * 1000))
                 print('Average leftover time is {:.3f} ms and its variance {:.3f} ms'
-                      .format(np.mean(self.circ_buffer_leftover) * 1000,
-                              np.std(self.circ_buffer_leftover) * 1000))
+                      .format(self.circ_buffer_leftover.mean() * 1000,
+                              self.circ_buffer_leftover.std() * 1000))
                 print('Average total time of calculations is {:.3f} ms and its variance {:.3f} ms'
-                      .format(np.mean(self.circ_buffer_dt) * 1000,
-                              np.std(self.circ_buffer_dt) * 1000))
\ No newline at end of file
+                      .format(self.circ_buffer_dt.mean() * 1000,
+                              self.circ_buffer_dt.std() * 1000))
@@ -6,6 +6,9 @@ from CartPole.cartpole_model import ANGLE_IDX, POSITION_IDX
 from CartPole.cartpole_numba import cartpole_fine_integration_s_numba
 from others.p_globals import TrackHalfLength
 from run_data_generator import random_experiment_setter
+from GymlikeCartPole.reward import reward, termination
+from GymlikeCartPole.rgb_renderer import CartPoleRGBRenderer
+from SI_Toolkit.computation_library import NumpyLibrary
 
 import numpy as np
 
@@ -29,13 +32,16 @@ mode = config["mode"]
 class CartPoleEnv_LTC(gym.Env):
     metadata = {"render_modes": ["human", "rgb_array", "single_rgb_array"], "video.frames_per_second": 50, "render_fps": 50}
 
-    def __init__(self):
+    def __init__(self, render_mode: Optional[str] = None):
 
+        self.render_mode = render_mode
         self.CartPoleInstance = CartPole()
         self.RES = random_experiment_setter()
         self.mode = mode
 
         self.intermediate_steps = int(self.RES.dt_controller_update/self.RES.dt_simulation)
+        self.dt = np.float32(self.RES.dt_simulation * self.intermediate_steps)  # Time of one step of the env
+        self.lib = NumpyLibrary
 
         self.RES.length_of_experiment = length_of_episode
 
@@ -62,6 +68,7 @@ class CartPoleEnv_LTC(gym.Env):
 
         self.viewer = None
         self.screen = None
+        self.rgb_renderer = None
         self.isopen = False
 
         self.state = None
@@ -72,6 +79,7 @@ class CartPoleEnv_LTC(gym.Env):
 
         self.steps_beyond_done = None
 
+        self.experiment_set_up = False  # Random experiment (target trace, controller) is set up at the first reset
         self.reset()
 
     def step(self, action):
@@ -101,7 +109,7 @@ class CartPoleEnv_LTC(gym.Env):
         self.CartPoleInstance.add_noise_and_latency()
 
         # Update the total time of the simulation
-        self.CartPoleInstance.step_time()
+        self.CartPoleInstance.time += self.dt
 
         # Update target_position position depending on the mode of operation
         # self.CartPoleInstance.update_target_position()
@@ -115,15 +123,20 @@ class CartPoleEnv_LTC(gym.Env):
 
     def step_termination_and_reward(self):
         if self.mode == 'stabilization':
-            if not self.done:
-                # self.done = self.state[POSITION_IDX] < -self.x_threshold \
-                #             or self.state[POSITION_IDX] > self.x_threshold \
-                #             or self.state[ANGLE_IDX] < -self.theta_threshold_stabilization_radians \
-                #             or self.state[ANGLE_IDX] > self.theta_threshold_stabilization_radians
-                self.done = bool(self.done)
-
-            self.reward = self.get_reward(self.state, self.action)
-            self.done = self.is_done(self.lib, self.state)
+            if self.done:
+                if self.steps_beyond_done == 0:
+                    gym.logger.warn("""
+        You are calling 'step()' even though this environment has already returned
+        done = True. You should always call 'reset()' once you receive 'done = True'
+        Any further steps are undefined behavior.
+                        """)
+                self.steps_beyond_done += 1
+                self.reward = 0.0
+            else:
+                self.reward = self.get_reward(self.state, self.action)
+                self.done = self.is_done(self.state)
+                if self.done:
+                    self.steps_beyond_done = 0
 
         elif self.mode == 'follow target_position position':
             raise NotImplementedError  # TODO What is a suitable reward&termination condition for following target_position position?
@@ -132,44 +145,40 @@ class CartPoleEnv_LTC(gym.Env):
         else:
             raise ValueError('Unknown mode (definition of the task)')
 
-    def get_reward(self, state, action):
-        reached_final_time = bool(self.CartPoleInstance.time >= self.CartPoleInstance.length_of_experiment)
+    def get_reward(self, states, inputs):
+        """
+        Rewards of states from the current time of the episode on, without side effects.
+
+        :param states: single state (returns float) or trajectories (batch x horizon x state) with a step of the env
+            between the consecutive states, e.g. rollouts of an MPC optimizer (see cost_function_gym)
+        """
+        single_state = len(states.shape) == 1
+        if single_state:
+            states = self.lib.reshape(states, (1, 1, -1))
+        times = np.float32(self.CartPoleInstance.time) + self.dt * np.arange(states.shape[1], dtype=np.float32)
+        rewards = reward(self.lib, states, times, self.CartPoleInstance.length_of_experiment,
+                         self.x_threshold, self.theta_threshold_stabilization_radians)
+        return float(rewards[0, 0]) if single_state else rewards
 
-        if not self.is_done(self.lib, state):
-            if reached_final_time:
-                reward = 10.0
-            else:
-                reward = 1.0
-        elif self.steps_beyond_done is None:
-            reward = 1.0
-        else:
-            reward = 0.0
-        
-        return reward
-    
     def is_done(self, state):
-        reached_final_time = bool(self.CartPoleInstance.time >= self.CartPoleInstance.length_of_experiment)
-        if reached_final_time:
-            done = True
-        else:
-            done = False
-            
-        if self.steps_beyond_done is None:
-            # Pole just fell!
-            self.steps_beyond_done = 0
-        else:
-            if self.steps_beyond_done == 0:
-                gym.logger.warn("""
-        You are calling 'step()' even though this environment has already returned
-        done = True. You should always call 'reset()' once you receive 'done = True'
-        Any further steps are undefined behavior.
-                        """)
-            self.steps_beyond_done += 1
-        
-        return done
+        reached_final_time = self.CartPoleInstance.time >= self.CartPoleInstance.length_of_experiment
+        return bool(reached_final_time or termination(state, self.x_threshold, self.theta_threshold_stabilization_radians))
 
     def reset(self, seed: Optional[int] = None, options: Optional[dict] = None) -> Tuple[ObsType, dict]:
-        self.CartPoleInstance = self.RES.set(self.CartPoleInstance)
+        """
+        Starts a new episode from a random initial state, drawn with the rng of the environment (seeded with seed).
+        Random target trace, controller and history of the CartPole are set up only at the first reset
+        or if options contains {'full_reset': True}; later resets reuse them.
+        """
+        super().reset(seed=seed)
+
+        if not self.experiment_set_up or (options is not None and options.get('full_reset', False)):
+            self.CartPoleInstance = self.RES.set(self.CartPoleInstance)
+            self.experiment_set_up = True
+
+        initial_states, _ = self.RES.sample_initial_states(1, rng=self.np_random)
+        self.reset_episode(initial_states[0])
+
         self.state = self.CartPoleInstance.s
         self.CartPoleInstance.target_position = 0.0
         self.target_position = self.CartPoleInstance.target_position
@@ -179,8 +188,24 @@ class CartPoleEnv_LTC(gym.Env):
 
         return self.state, {}
 
+    def reset_episode(self, initial_state):
+        """Sets the CartPole to initial_state at time 0, keeping everything else"""
+        self.CartPoleInstance.s = initial_state
+        self.CartPoleInstance.time = 0.0
+        self.CartPoleInstance.LatencyAdderInstance.fill_latency_buffer(initial_state)
+        self.CartPoleInstance.s_with_noise_and_latency = np.copy(initial_state)
+
     def render(self):
         assert self.render_mode in self.metadata["render_modes"]
+
+        if self.render_mode in {"rgb_array", "single_rgb_array"}:
+            # Offscreen, without pygame
+            if self.state is None:
+                return None
+            if self.rgb_renderer is None:
+                self.rgb_renderer = CartPoleRGBRenderer(self.x_threshold)
+            return np.copy(self.rgb_renderer.render(self.state, self.target_position))
+
         import pygame
         from pygame import gfxdraw
         
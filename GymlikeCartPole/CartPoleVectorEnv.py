@@ -0,0 +1,147 @@
+"""
+Vectorized CartPole environment for RL training: num_envs independent cartpoles stepped together.
+
+The states are kept in a (num_envs x 6) array (order of STATE_VARIABLES) and all environments
+are integrated with a single call of the numba dynamics per step.
+Reward and termination are computed for the whole batch at once.
+Episodes are reset automatically following the gymnasium NEXT_STEP autoreset mode:
+the step after an episode ended returns the first observation of the next episode (with zero reward).
+
+Differences to CartPoleEnv_LTC: the latency of the sensors is not modelled (noise is, if enabled in config.yml)
+and no recording of the episodes is done.
+"""
+
+import os
+from typing import Any, Optional
+
+import gymnasium as gym
+import numpy as np
+from gymnasium.vector import AutoresetMode
+from gymnasium.vector.utils import batch_space
+
+from CartPole._CartPole_mathematical_helpers import wrap_angle_rad_inplace
+from CartPole.cartpole_model import Q2u
+from CartPole.cartpole_numba import cartpole_fine_integration_s_numba
+from CartPole.noise_adder import NOISE_MODE, sigma_angle, sigma_angleD, sigma_position, sigma_positionD
+from CartPole.state_utilities import (ANGLE_COS_IDX, ANGLE_IDX, ANGLE_SIN_IDX,
+                                      ANGLED_IDX, POSITION_IDX, POSITIOND_IDX,
+                                      STATE_VARIABLES, create_cartpole_state)
+from GymlikeCartPole.reward import FINAL_REWARD, STEP_REWARD, termination
+from GymlikeCartPole.rgb_renderer import CartPoleRGBRenderer
+from others.globals_and_utils import load_config
+from others.p_globals import TrackHalfLength
+from run_data_generator import generate_random_initial_states
+
+config = load_config(os.path.join("GymlikeCartPole", "config_gym.yml"))
+config_dt = load_config("config_data_gen.yml")["dt"]
+
+
+class CartPoleVectorEnv(gym.vector.VectorEnv):
+    metadata = {"render_modes": ["rgb_array"], "render_fps": 50, "autoreset_mode": AutoresetMode.NEXT_STEP}
+
+    def __init__(self, num_envs: Optional[int] = None, render_mode: Optional[str] = None):
+
+        self.num_envs = config["vector_env"]["num_envs"] if num_envs is None else num_envs
+        self.render_mode = render_mode
+        self.mode = config["mode"]
+        if self.mode != 'stabilization':
+            raise NotImplementedError('CartPoleVectorEnv is implemented only for stabilization task')
+
+        self.dt_simulation = np.float32(config_dt["simulation"])
+        self.intermediate_steps = int(round(config_dt["control"] / config_dt["simulation"]))
+        self.dt = self.dt_simulation * self.intermediate_steps  # Time of one env step
+        self.max_episode_steps = int(round(config["length_of_episode"] / self.dt))
+
+        limits = config["vector_env"]["init_limits"]
+        self.init_limits = [limits["position"], limits["positionD"], limits["angle"], limits["angleD"]]
+        self.init_state_stub = create_cartpole_state()
+        self.init_state_stub[...] = np.nan  # All state variables are random
+
+        # Angle at which to fail the episode
+        self.theta_threshold_stabilization_radians = 24 * np.pi / 360
+        self.x_threshold = 0.9 * TrackHalfLength  # Takes care that the cart is not going beyond the boundary
+
+        high = np.full(len(STATE_VARIABLES), np.finfo(np.float32).max, dtype=np.float32)
+        high[ANGLE_IDX] = np.pi
+        high[ANGLE_COS_IDX] = high[ANGLE_SIN_IDX] = 1.0
+        high[POSITION_IDX] = TrackHalfLength
+
+        self.single_action_space = gym.spaces.Box(low=-1.0, high=1.0, shape=(1,), dtype=np.float32)
+        self.action_space = batch_space(self.single_action_space, self.num_envs)
+        self.single_observation_space = gym.spaces.Box(-high, high, dtype=np.float32)
+        self.observation_space = batch_space(self.single_observation_space, self.num_envs)
+
+        self.states = None
+        self.target_positions = np.zeros(self.num_envs, dtype=np.float32)
+        self.steps = np.zeros(self.num_envs, dtype=np.int32)
+        self.prev_done = np.zeros(self.num_envs, dtype=np.bool_)
+
+        self.rgb_renderer = None
+
+    def reset(self, *, seed: Optional[int] = None, options: Optional[dict] = None):
+        super().reset(seed=seed)
+        self.states = generate_random_initial_states(self.init_state_stub, self.init_limits, self.np_random, self.num_envs)
+        self.target_positions[:] = 0.0
+        self.steps[:] = 0
+        self.prev_done[:] = False
+        return self.get_observations(), {}
+
+    def step(self, actions):
+        # Actions out of [-1, 1] are clipped rather than asserted, which would be a check per env and step
+        Q = np.clip(np.reshape(actions, self.num_envs), -1.0, 1.0).astype(np.float32)
+
+        self.states = cartpole_fine_integration_s_numba(self.states, Q2u(Q), self.dt_simulation, self.intermediate_steps)
+        self.steps += 1
+
+        terminated = self.is_terminated(self.states)
+        truncated = np.logical_and(self.steps >= self.max_episode_steps, ~terminated)
+        rewards = self.get_rewards(terminated, truncated)
+
+        # Reset the environments which terminated or were truncated in the last step
+        number_of_resets = np.count_nonzero(self.prev_done)
+        if number_of_resets:
+            self.states[self.prev_done] = generate_random_initial_states(
+                self.init_state_stub, self.init_limits, self.np_random, number_of_resets)
+            self.target_positions[self.prev_done] = 0.0
+            self.steps[self.prev_done] = 0
+            rewards[self.prev_done] = 0.0
+            terminated[self.prev_done] = False
+            truncated[self.prev_done] = False
+        self.prev_done = np.logical_or(terminated, truncated)
+
+        return self.get_observations(), rewards, terminated, truncated, {}
+
+    def is_terminated(self, states):
+        """Cart beyond x_threshold or, for stabilization, pole beyond the angle threshold"""
+        return termination(states, self.x_threshold, self.theta_threshold_stabilization_radians)
+
+    @staticmethod
+    def get_rewards(terminated, truncated):
+        """As CartPoleEnv_LTC: 1 per step, 10 for the last step of an episode lasting till the end"""
+        rewards = np.full(terminated.shape, STEP_REWARD, dtype=np.float32)
+        rewards[truncated] = FINAL_REWARD
+        return rewards
+
+    def get_observations(self):
+        observations = np.copy(self.states)
+        if NOISE_MODE != 'OFF':
+            noise = self.np_random.standard_normal(size=(self.num_envs, 4), dtype=np.float32)
+            observations[:, ANGLE_IDX] += sigma_angle * noise[:, 0]
+            wrap_angle_rad_inplace(observations[:, ANGLE_IDX])
+            observations[:, ANGLE_COS_IDX] = np.cos(observations[:, ANGLE_IDX])
+            observations[:, ANGLE_SIN_IDX] = np.sin(observations[:, ANGLE_IDX])
+            observations[:, POSITION_IDX] += sigma_position * noise[:, 1]
+            observations[:, ANGLED_IDX] += sigma_angleD * noise[:, 2]
+            observations[:, POSITIOND_IDX] += sigma_positionD * noise[:, 3]
+        return observations
+
+    def render(self):
+        """Frames of all environments (rgb_array mode), rendered offscreen in one batch"""
+        if self.render_mode != "rgb_array" or self.states is None:
+            return None
+        if self.rgb_renderer is None:
+            self.rgb_renderer = CartPoleRGBRenderer(self.x_threshold, screen_width=600, screen_height=400)
+        return tuple(np.copy(self.rgb_renderer.render_batch(self.states, self.target_positions)))
+
+    def close_extras(self, **kwargs: Any):
+        pass
@@ -0,0 +1,38 @@
+"""
+Reward and termination of the gym environments as pure functions of batched states.
+
+States may have any number of leading (batch) dimensions, e.g. (batch x horizon x state) for the rollouts of an MPC optimizer
+or (number of envs x state) for CartPoleVectorEnv. The functions work with any computation library
+(NumPy, TF, PyTorch), have no side effects and do not depend on the state of an environment.
+"""
+
+from CartPole.state_utilities import ANGLE_IDX, POSITION_IDX
+
+FINAL_REWARD = 10.0  # Reward of the step at which the episode reaches its full length
+STEP_REWARD = 1.0
+
+
+def termination(states, x_threshold, theta_threshold):
+    """
+    Boolean tensor of shape states.shape[:-1]:
+    True where the cart is beyond x_threshold or the pole beyond theta_threshold from upright.
+    Uses only operators, so works unchanged for NumPy arrays and TF/PyTorch tensors.
+    """
+    return (abs(states[..., POSITION_IDX]) > x_threshold) | (abs(states[..., ANGLE_IDX]) > theta_threshold)
+
+
+def reward(lib, states, times, length_of_episode, x_threshold, theta_threshold):
+    """
+    Rewards of trajectories of states (batch x horizon x state), float32 tensor (batch x horizon).
+
+    STEP_REWARD for every step until (including) the pole falls or the cart leaves the track,
+    FINAL_REWARD for the step reaching length_of_episode, 0 after termination.
+
+    :param lib: computation library of the states, e.g. NumpyLibrary
+    :param times: time of each step of the horizon, broadcastable to (batch x horizon)
+    """
+    terminated = lib.cast(termination(states, x_threshold, theta_threshold), lib.float32)
+    terminated_before = lib.cumsum(terminated, 1) - terminated
+    alive = lib.cast(terminated_before < 0.5, lib.float32)
+    reached_final_time = lib.cast(times >= length_of_episode, lib.float32)
+    return alive * (STEP_REWARD + (FINAL_REWARD - STEP_REWARD) * reached_final_time * (1.0 - terminated))
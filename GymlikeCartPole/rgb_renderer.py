@@ -0,0 +1,147 @@
+"""
+Offscreen renderer of the gym environments to RGB arrays, with NumPy only (no pygame, no display needed).
+
+The scene is the same as drawn by CartPoleEnv_LTC with pygame: track line, cart, pole, axle and target position.
+Static elements are rasterized once: the background with the track, the cart, its axle and the target marker
+as small sprites, and the pole as a cloud of pixel points in its own frame.
+For every frame only the sprites are pasted at their offsets and the pole points are rotated
+and written into a reused buffer. A batch of states (e.g. of CartPoleVectorEnv) is rendered in one go.
+"""
+
+import numpy as np
+
+from CartPole.state_utilities import ANGLE_IDX, POSITION_IDX
+
+BACKGROUND_COLOR = (255, 255, 255)
+TRACK_COLOR = (0, 0, 0)
+CART_COLOR = (0, 0, 0)
+POLE_COLOR = (202, 152, 101)
+AXLE_COLOR = (129, 132, 203)
+TARGET_COLOR = (231, 76, 60)
+
+
+def _disc_mask(radius):
+    """Boolean mask of a filled circle in a (2*radius+1) square"""
+    y, x = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    return x ** 2 + y ** 2 <= radius ** 2
+
+
+class CartPoleRGBRenderer:
+    """
+    Renders states (or batches of states) of the cartpole to uint8 RGB arrays of shape (screen_height, screen_width, 3).
+
+    Sizes in pixels are as in CartPoleEnv_LTC for a screen width of 1200 and are scaled with the screen width.
+    The returned arrays are buffers reused by the next call of the same method - copy them to keep.
+    """
+
+    def __init__(self, x_threshold, screen_width=1200, screen_height=800):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+
+        pixel_scale = screen_width / 1200.0
+        self.scale = screen_width / (2 * x_threshold)  # pixels per meter
+        pole_width = max(1.0, 10.0 * pixel_scale)
+        pole_length = self.scale * 0.1
+        cart_width = int(round(50.0 * pixel_scale))
+        cart_height = int(round(30.0 * pixel_scale))
+        axle_offset = cart_height / 4.0
+        track_height = int(round(100 * pixel_scale))  # Pixels from the bottom
+
+        # Rows counted from the top of the image
+        self.track_row = screen_height - 1 - track_height
+        self.axle_row = self.track_row - axle_offset
+
+        # Background with the track
+        self.background = np.empty((screen_height, screen_width, 3), dtype=np.uint8)
+        self.background[...] = BACKGROUND_COLOR
+        self.background[self.track_row, :] = TRACK_COLOR
+
+        # Cart and axle
+        self.cart_sprite = np.empty((cart_height, cart_width, 3), dtype=np.uint8)
+        self.cart_sprite[...] = CART_COLOR
+        self.cart_mask = np.ones((cart_height, cart_width), dtype=np.bool_)
+        self.cart_top_left = (self.track_row - cart_height // 2, -(cart_width // 2))  # Offsets from track row and cart x
+        self.axle_mask = _disc_mask(max(1, int(pole_width / 2)))
+        self.axle_sprite = np.empty(self.axle_mask.shape + (3,), dtype=np.uint8)
+        self.axle_sprite[...] = AXLE_COLOR
+
+        # Target marker
+        self.target_mask = _disc_mask(max(1, int(round(10 * pixel_scale))))
+        self.target_sprite = np.empty(self.target_mask.shape + (3,), dtype=np.uint8)
+        self.target_sprite[...] = TARGET_COLOR
+
+        # Pole as points in its own frame (across, along), spaced half a pixel, rotated around the axle at every frame
+        across = np.arange(-pole_width / 2, pole_width / 2 + 1e-9, 0.5)
+        along = np.arange(-pole_width / 2, pole_length - pole_width / 2 + 1e-9, 0.5)
+        self.pole_across, self.pole_along = [a.ravel().astype(np.float32) for a in np.meshgrid(across, along)]
+
+        self._frame = None
+        self._frames = None
+
+    def cart_x(self, positions):
+        return np.rint(np.asarray(positions) * self.scale + self.screen_width / 2.0).astype(np.int64)
+
+    @staticmethod
+    def _paste(frame, sprite, mask, top, left):
+        """Pastes sprite where mask is True with its top left corner at (top, left), clipped to the frame"""
+        height, width = frame.shape[:2]
+        top_clip, left_clip = max(0, -top), max(0, -left)
+        bottom, right = min(height, top + sprite.shape[0]), min(width, left + sprite.shape[1])
+        if bottom <= top + top_clip or right <= left + left_clip:
+            return
+        region = frame[top + top_clip:bottom, left + left_clip:right]
+        sprite_mask = mask[top_clip:bottom - top, left_clip:right - left]
+        region[sprite_mask] = sprite[top_clip:bottom - top, left_clip:right - left][sprite_mask]
+
+    def _pole_pixels(self, angles, cart_x):
+        """Rows and columns (number of states x number of pole points) of the pole pixels, may lie outside of the frame"""
+        cos, sin = np.cos(angles)[:, np.newaxis], np.sin(angles)[:, np.newaxis]
+        # Counterclockwise rotation by angle, y pointing up - as pygame rotate_rad in CartPoleEnv_LTC before flipping
+        x = cart_x[:, np.newaxis] + self.pole_across * cos - self.pole_along * sin
+        y_up = self.pole_across * sin + self.pole_along * cos
+        rows = np.rint(self.axle_row - y_up).astype(np.int64)
+        columns = np.rint(x).astype(np.int64)
+        return rows, columns
+
+    def render_batch(self, states, target_positions=None, out=None):
+        """
+        Renders a batch of states (batch x 6) to an array (batch x screen_height x screen_width x 3).
+        Without out a buffer is reused between the calls.
+        """
+        states = np.atleast_2d(states)
+        batch_size = states.shape[0]
+        if out is None:
+            if self._frames is None or self._frames.shape[0] != batch_size:
+                self._frames = np.empty((batch_size, self.screen_height, self.screen_width, 3), dtype=np.uint8)
+            out = self._frames
+
+        out[...] = self.background
+
+        cart_x = self.cart_x(states[:, POSITION_IDX])
+        top, left = self.cart_top_left
+        for i in range(batch_size):
+            self._paste(out[i], self.cart_sprite, self.cart_mask, top, left + cart_x[i])
+
+        rows, columns = self._pole_pixels(states[:, ANGLE_IDX], cart_x)
+        inside = (rows >= 0) & (rows < self.screen_height) & (columns >= 0) & (columns < self.screen_width)
+        batch_index = np.broadcast_to(np.arange(batch_size)[:, np.newaxis], rows.shape)
+        out[batch_index[inside], rows[inside], columns[inside]] = POLE_COLOR
+
+        radius = self.axle_mask.shape[0] // 2
+        axle_top = int(round(self.axle_row)) - radius
+        for i in range(batch_size):
+            self._paste(out[i], self.axle_sprite, self.axle_mask, axle_top, cart_x[i] - radius)
+
+        if target_positions is not None:
+            target_x = self.cart_x(np.broadcast_to(target_positions, (batch_size,)))
+            radius = self.target_mask.shape[0] // 2
+            for i in range(batch_size):
+                self._paste(out[i], self.target_sprite, self.target_mask, self.track_row - radius, target_x[i] - radius)
+
+        return out
+
+    def render(self, state, target_position=None):
+        """Renders a single state to an array (screen_height x screen_width x 3), reused between the calls"""
+        if self._frame is None:
+            self._frame = np.empty((1, self.screen_height, self.screen_width, 3), dtype=np.uint8)
+        return self.render_batch(state[np.newaxis, :], target_position, out=self._frame)[0]
@@ -0,0 +1,202 @@
+"""
+Batched version of the Brunton test.
+
+The standard Brunton test (SI_Toolkit.Testing.run_brunton_test) is made for looking at predictions with the GUI.
+Here instead every (start index, horizon) window of a test file is evaluated at once:
+for each predictor the initial states and the control input sequences of all windows are stacked into large batches
+and passed to the predictor in a few vectorized calls.
+The ground truth windows are created once per test file and shared between all predictors.
+The result is the prediction error as function of the horizon, given as numpy arrays which can be saved and compared.
+
+Neural predictors are evaluated window by window in the same way as during MPC,
+i.e. each window starts from the network's reset memory state. No warm-up on preceding data is done.
+"""
+
+import os
+
+import numpy as np
+
+from SI_Toolkit.Predictors.predictor_wrapper import PredictorWrapper
+
+from CartPole.load import load_csv_recording
+from CartPole.state_utilities import STATE_VARIABLES, CONTROL_INPUTS
+from others.globals_and_utils import load_config
+
+# Ground truth windows are cached across predictors (and across calls within one process)
+# key: (path to test file, test_max_horizon, decimation, test_start_idx, test_len)
+_ground_truth_cache = {}
+
+
+def get_ground_truth_windows(path_to_test_file, test_max_horizon, decimation=1, test_start_idx=0, test_len='max'):
+    """
+    Loads the test file and returns the data needed to evaluate all (start index, horizon) windows.
+
+    :returns: dict with
+        'states': (T, num_states) array of recorded states in order of STATE_VARIABLES,
+        'Q': (T, num_control_inputs) array of recorded control inputs,
+        'start_indices': indices (into 'states') of the initial states of all windows,
+        'dt': time step between consecutive rows after decimation
+    Ground truth for window i and horizon h is states[start_indices[i] + h].
+    No copy of the windows is made; see get_window_batch.
+    """
+    key = (os.path.abspath(path_to_test_file), test_max_horizon, decimation, test_start_idx, test_len)
+    if key in _ground_truth_cache:
+        return _ground_truth_cache[key]
+
+    dataset = load_csv_recording(path_to_test_file)
+    dataset = dataset.iloc[::decimation].reset_index(drop=True)
+
+    time = dataset['time'].to_numpy()
+    dt = float(np.mean(np.diff(time)))
+
+    states = dataset[list(STATE_VARIABLES)].to_numpy(dtype=np.float32)
+
+    control_columns = []
+    for control_input in CONTROL_INPUTS:
+        if control_input in dataset.columns:
+            control_columns.append(control_input)
+        elif control_input + '_applied' in dataset.columns:  # CartPole recordings save 'Q_applied'
+            control_columns.append(control_input + '_applied')
+        else:
+            raise KeyError('Control input {} not found in {}'.format(control_input, path_to_test_file))
+    Q = dataset[control_columns].to_numpy(dtype=np.float32)
+
+    number_of_windows = len(states) - test_max_horizon - test_start_idx
+    if test_len != 'max':
+        number_of_windows = min(number_of_windows, int(test_len))
+    if number_of_windows <= 0:
+        raise ValueError('Test file {} is too short for test_max_horizon={}'.format(path_to_test_file, test_max_horizon))
+
+    ground_truth = {
+        'states': states,
+        'Q': Q,
+        'start_indices': np.arange(test_start_idx, test_start_idx + number_of_windows),
+        'dt': dt,
+    }
+    _ground_truth_cache[key] = ground_truth
+
+    return ground_truth
+
+
+def get_window_batch(array, start_indices, length):
+    """
+    Returns array[start_indices[i] : start_indices[i] + length] for all i stacked along first axis,
+    shape (len(start_indices), length, features).
+    Works on a strided view, only the selected windows are copied.
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(array, length, axis=0)  # (T-length+1, features, length)
+    return np.swapaxes(windows[start_indices], 1, 2)
+
+
+def prediction_errors(predictions, ground_truth):
+    """
+    Difference between predictions and ground truth, (batch, horizon+1, num_states).
+    The angle error is wrapped into [-π, π].
+    """
+    errors = predictions - ground_truth
+    angle_idx = int(np.where(STATE_VARIABLES == 'angle')[0][0])
+    errors[..., angle_idx] = np.mod(errors[..., angle_idx] + np.pi, 2.0 * np.pi) - np.pi
+    return errors
+
+
+def error_statistics(absolute_errors, squared_errors_sum, number_of_windows):
+    """
+    Error-vs-horizon statistics from absolute errors of all windows.
+
+    :param absolute_errors: (number_of_windows, horizon+1, num_states)
+    :returns: dict of arrays, each with shape (horizon+1, num_states)
+    """
+    return {
+        'mean_absolute_error': np.mean(absolute_errors, axis=0),
+        'rmse': np.sqrt(squared_errors_sum / number_of_windows),
+        'median_absolute_error': np.median(absolute_errors, axis=0),
+        'p95_absolute_error': np.percentile(absolute_errors, 95, axis=0),
+        'max_absolute_error': np.max(absolute_errors, axis=0),
+    }
+
+
+def evaluate_predictor_batched(predictor_specification, ground_truth, test_max_horizon, batch_size):
+    """
+    Runs a single predictor over all windows of the test file in batches of batch_size.
+
+    The predictor is configured once with fixed batch size (compiled TF predictors do not retrace).
+    The last, possibly incomplete batch is padded by repeating the last window.
+    """
+    states = ground_truth['states']
+    Q = ground_truth['Q']
+    start_indices = ground_truth['start_indices']
+    number_of_windows = len(start_indices)
+    batch_size = min(batch_size, number_of_windows)
+
+    predictor = PredictorWrapper()
+    predictor.configure(batch_size=batch_size, horizon=test_max_horizon, dt=ground_truth['dt'],
+                        predictor_specification=predictor_specification)
+
+    absolute_errors = np.empty((number_of_windows, test_max_horizon + 1, states.shape[1]), dtype=np.float32)
+    squared_errors_sum = np.zeros((test_max_horizon + 1, states.shape[1]), dtype=np.float64)
+
+    for batch_start in range(0, number_of_windows, batch_size):
+        batch_end = min(batch_start + batch_size, number_of_windows)
+        batch_indices = start_indices[batch_start:batch_end]
+        number_in_batch = len(batch_indices)
+        if number_in_batch < batch_size:
+            batch_indices = np.pad(batch_indices, (0, batch_size - number_in_batch), mode='edge')
+
+        s0 = states[batch_indices]
+        Q_batch = get_window_batch(Q, batch_indices, test_max_horizon)
+
+        predictions = predictor.predict(s0, Q_batch)
+        predictions = np.asarray(predictions)[:number_in_batch, :test_max_horizon + 1, :]
+
+        ground_truth_batch = get_window_batch(states, batch_indices[:number_in_batch], test_max_horizon + 1)
+
+        errors = prediction_errors(predictions.astype(np.float32), ground_truth_batch)
+        absolute_errors[batch_start:batch_end] = np.abs(errors)
+        squared_errors_sum += np.sum(errors.astype(np.float64) ** 2, axis=0)
+
+    return error_statistics(absolute_errors, squared_errors_sum, number_of_windows)
+
+
+def run_brunton_test_batched(config_testing=None):
+    """
+    Evaluates all predictors from predictors_specifications_testing (config_testing.yml) on the test file.
+
+    :returns: dict predictor_specification -> dict of error-vs-horizon arrays (see error_statistics)
+    """
+    if config_testing is None:
+        config_testing = load_config(os.path.join("SI_Toolkit_ASF", "config_testing.yml"))
+
+    test_max_horizon = config_testing['test_max_horizon']
+    batch_size = config_testing['batched']['batch_size']
+
+    path_to_test_file = os.path.join(config_testing['path_to_testfile'], config_testing['test_file'])
+    ground_truth = get_ground_truth_windows(
+        path_to_test_file,
+        test_max_horizon=test_max_horizon,
+        decimation=config_testing['decimation'],
+        test_start_idx=config_testing['test_start_idx'],
+        test_len=config_testing['test_len'],
+    )
+
+    print('Batched Brunton test: {} windows, horizon {}'.format(len(ground_truth['start_indices']), test_max_horizon))
+
+    results = {}
+    for predictor_specification in config_testing['predictors_specifications_testing']:
+        print('Evaluating predictor {}'.format(predictor_specification))
+        results[predictor_specification] = evaluate_predictor_batched(
+            predictor_specification, ground_truth, test_max_horizon, batch_size)
+
+        mae = results[predictor_specification]['mean_absolute_error'][-1]
+        print('  Mean absolute error at horizon {}: '.format(test_max_horizon)
+              + ', '.join('{}: {:.4f}'.format(name, value) for name, value in zip(STATE_VARIABLES, mae)))
+
+    if config_testing['batched']['save_results']:
+        save_path = os.path.splitext(path_to_test_file)[0] + '_brunton_batched.npz'
+        arrays = {'state_variables': STATE_VARIABLES, 'horizon': np.arange(test_max_horizon + 1)}
+        for predictor_specification, statistics in results.items():
+            for statistic_name, statistic in statistics.items():
+                arrays[predictor_specification + '/' + statistic_name] = statistic
+        np.savez(save_path, **arrays)
+        print('Saved error-vs-horizon statistics to {}'.format(save_path))
+
+    return results
@@ -0,0 +1,187 @@
+"""
+Exports a network trained with SI_Toolkit (TensorFlow) to the .npz file of NumpyNetwork
+(see SI_Toolkit_ASF/numpy_inference/numpy_network.py), so that controllers and predictors can run it without TF.
+
+The weights are read directly from the checkpoint in the model folder, the names of inputs and outputs from the
+.txt file describing the network and the normalization from the normalization file (NI_*.csv) in the model folder.
+The exported network is checked against the Keras layers with the same weights on a random input sequence.
+
+Run from the CartPoleSimulation folder:
+    python -m SI_Toolkit_ASF.numpy_inference.export_network
+Settings are in SI_Toolkit_ASF/numpy_inference/config_export.yml.
+"""
+
+import glob
+import os
+from datetime import datetime
+
+import numpy as np
+
+from SI_Toolkit_ASF.numpy_inference.numpy_network import NumpyNetwork
+from others.globals_and_utils import load_config
+
+# SI_Toolkit builds the hidden Dense layers with tanh, the output layer is linear
+DENSE_HIDDEN_ACTIVATION = 'tanh'
+
+
+def read_net_info(path_to_models, net_name):
+    """Sections of the .txt file SI_Toolkit saves with the network (e.g. INPUTS, OUTPUTS, NORMALIZATION) as strings"""
+    with open(os.path.join(path_to_models, net_name, net_name + '.txt')) as f:
+        lines = [line.strip() for line in f]
+    net_info = {}
+    key = None
+    for line in lines:
+        if line.endswith(':') and line[:-1].replace(' ', '_').isupper():
+            key = line[:-1]
+            net_info[key] = ''
+        elif key is not None and line:
+            net_info[key] = (net_info[key] + '\n' + line).strip()
+    for key in ('INPUTS', 'OUTPUTS'):
+        net_info[key] = [name.strip() for name in net_info[key].split(',')]
+    return net_info
+
+
+def normalization_minmax_sym(normalization_csv, inputs, outputs):
+    """
+    Scales and offsets of the normalization of SI_Toolkit, mapping [min, max] of each feature to [-1, 1]:
+    normalized = 2 * (x - min) / (max - min) - 1
+    """
+    import pandas as pd
+    normalization_info = pd.read_csv(normalization_csv, index_col=0, comment='#')
+    minimum = {name: normalization_info.loc['min', name] for name in inputs + outputs}
+    maximum = {name: normalization_info.loc['max', name] for name in inputs + outputs}
+    input_scale = np.array([2.0 / (maximum[name] - minimum[name]) for name in inputs])
+    output_scale = np.array([(maximum[name] - minimum[name]) / 2.0 for name in outputs])
+    return {
+        'input_scale': input_scale,
+        'input_offset': np.array([-2.0 * minimum[name] / (maximum[name] - minimum[name]) - 1.0 for name in inputs]),
+        'output_scale': output_scale,
+        'output_offset': np.array([(maximum[name] + minimum[name]) / 2.0 for name in outputs]),
+    }
+
+
+def layers_from_checkpoint(checkpoint_path):
+    """
+    Layers of a Keras network saved as TF checkpoint: weights of 'layer_with_weights-i', the kind recognized
+    from the shapes (recurrent kernel of 3 x units columns for GRU, 4 x units for LSTM, none for Dense)
+    """
+    import tensorflow as tf
+    reader = tf.train.load_checkpoint(checkpoint_path)
+    names = reader.get_variable_to_shape_map()
+
+    def weight(i, name):
+        key = 'layer_with_weights-{}/{}/.ATTRIBUTES/VARIABLE_VALUE'.format(i, name)
+        return reader.get_tensor(key) if key in names else None
+
+    layers = []
+    i = 0
+    while weight(i, 'kernel') is not None or weight(i, 'cell/kernel') is not None:
+        if weight(i, 'cell/kernel') is not None:
+            recurrent_kernel = weight(i, 'cell/recurrent_kernel')
+            units = recurrent_kernel.shape[0]
+            kind = {3 * units: 'gru', 4 * units: 'lstm'}[recurrent_kernel.shape[1]]
+            layers.append({'kind': kind, 'kernel': weight(i, 'cell/kernel'), 'recurrent_kernel': recurrent_kernel,
+                           'bias': weight(i, 'cell/bias')})
+        else:
+            layers.append({'kind': 'dense', 'kernel': weight(i, 'kernel'), 'bias': weight(i, 'bias'),
+                           'activation': DENSE_HIDDEN_ACTIVATION})
+        i += 1
+    if not layers:
+        raise ValueError('No layers found in the checkpoint {}'.format(checkpoint_path))
+    if layers[-1]['kind'] == 'dense':
+        layers[-1]['activation'] = 'linear'
+    return layers
+
+
+def layers_from_keras_model(model):
+    """Layers of a Keras model built of Dense, GRU and LSTM layers (with the default activations of the cells)"""
+    layers = []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        config = layer.get_config()
+        if kind == 'InputLayer' or kind == 'Dropout':
+            continue
+        if kind == 'Dense':
+            kernel, bias = layer.get_weights()
+            layers.append({'kind': 'dense', 'kernel': kernel, 'bias': bias, 'activation': config['activation']})
+        elif kind in ('GRU', 'LSTM'):
+            if config['activation'] != 'tanh' or config['recurrent_activation'] != 'sigmoid' or not config['use_bias']:
+                raise ValueError('Only {} layers with tanh and sigmoid activations and bias are supported'.format(kind))
+            kernel, recurrent_kernel, bias = layer.get_weights()
+            layers.append({'kind': kind.lower(), 'kernel': kernel, 'recurrent_kernel': recurrent_kernel, 'bias': bias})
+        else:
+            raise ValueError("Layer '{}' of type {} is not supported".format(layer.name, kind))
+    return layers
+
+
+def keras_model_from_layers(layers, number_of_inputs):
+    """Keras model (returning sequences) computing the same as NumpyNetwork(layers), to check the export"""
+    import tensorflow as tf
+    model = tf.keras.Sequential([tf.keras.Input(shape=(None, number_of_inputs))])
+    for layer in layers:
+        if layer['kind'] == 'dense':
+            model.add(tf.keras.layers.Dense(layer['kernel'].shape[1], activation=layer['activation']))
+            model.layers[-1].set_weights([layer['kernel'], layer['bias']])
+        else:
+            units = layer['recurrent_kernel'].shape[0]
+            if layer['kind'] == 'gru':
+                model.add(tf.keras.layers.GRU(units, return_sequences=True, reset_after=np.ndim(layer['bias']) == 2))
+            else:
+                model.add(tf.keras.layers.LSTM(units, return_sequences=True))
+            model.layers[-1].set_weights([layer['kernel'], layer['recurrent_kernel'], layer['bias']])
+    return model
+
+
+def max_deviation_from_keras(network, model, batch_size=16, time_steps=50, seed=None):
+    """Largest absolute difference of the outputs of network and of the Keras model on random (normalized) inputs"""
+    rng = np.random.default_rng(seed)
+    sequence = rng.uniform(-1.0, 1.0, size=(batch_size, time_steps, len(network.inputs))).astype(np.float32)
+    normalization = network.normalization
+    network.normalization = None  # The Keras model works on normalized data
+    try:
+        network.reset(batch_size)
+        numpy_output = network(sequence)
+    finally:
+        network.normalization = normalization
+        network.reset(1)
+    keras_output = np.asarray(model(sequence))
+    return float(np.max(np.abs(numpy_output - keras_output)))
+
+
+def export_network(path_to_models, net_name, path=None):
+    """Exports the TF network net_name from the folder path_to_models, by default to <net_name>.npz next to it"""
+    folder = os.path.join(path_to_models, net_name)
+    net_info = read_net_info(path_to_models, net_name)
+    if not os.path.isfile(os.path.join(folder, 'ckpt.ckpt.index')):
+        raise ValueError('No TF checkpoint in {}, only networks trained with TF can be exported'.format(folder))
+    layers = layers_from_checkpoint(os.path.join(folder, 'ckpt.ckpt'))
+
+    normalization_files = sorted(glob.glob(os.path.join(folder, 'NI_*.csv')))
+    normalization_csv = normalization_files[0] if normalization_files else net_info['NORMALIZATION']
+    normalization = normalization_minmax_sym(normalization_csv, net_info['INPUTS'], net_info['OUTPUTS'])
+
+    network = NumpyNetwork(layers, net_info['INPUTS'], net_info['OUTPUTS'], normalization, metadata={
+        'net_name': net_name,
+        'normalization_file': os.path.basename(normalization_csv),
+        'exported': datetime.now().isoformat(),
+    })
+    if path is None:
+        path = os.path.join(folder, net_name + '.npz')
+    network.save(path)
+    return network, layers, path
+
+
+def run_export_network(config=None):
+    if config is None:
+        config = load_config(os.path.join("SI_Toolkit_ASF", "numpy_inference", "config_export.yml"))
+    network, layers, path = export_network(config["path_to_models"], config["net_name"], config["path"])
+    print('Exported {} to {}'.format(config["net_name"], path))
+    if config["check"]:
+        deviation = max_deviation_from_keras(network, keras_model_from_layers(layers, len(network.inputs)),
+                                             seed=config["seed"])
+        print('Largest deviation from Keras: {:.2e}'.format(deviation))
+    return network
+
+
+if __name__ == '__main__':
+    run_export_network()
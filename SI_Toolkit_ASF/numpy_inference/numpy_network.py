@@ -0,0 +1,196 @@
+"""
+Inference of networks trained with SI_Toolkit (Dense, GRU, LSTM layers) with NumPy and numba only.
+
+For a single sample, calling a Keras model costs far more than the few small matrix products of the network;
+here a time step of e.g. GRU-6IN-32H1-32H2-1OUT takes some microseconds and TensorFlow is never imported.
+The weights, the names of inputs and outputs and the normalization are exported from the trained model
+by SI_Toolkit_ASF/numpy_inference/export_network.py into a single .npz file.
+
+The network is evaluated one time step at a time (as the stateful networks with time series length 1
+used by the controllers and predictors), the states of the recurrent layers are kept between the steps
+for a batch of samples. All computations are in float32 as in TensorFlow.
+"""
+
+import json
+
+import numpy as np
+from numba import jit
+
+ACTIVATIONS = {'linear': 0, 'tanh': 1, 'sigmoid': 2, 'relu': 3}
+
+
+@jit(nopython=True, cache=True)
+def _sigmoid(x):
+    return np.float32(1.0) / (np.float32(1.0) + np.exp(-x))
+
+
+@jit(nopython=True, cache=True)
+def _activation(x, activation):
+    if activation == 1:
+        return np.tanh(x)
+    if activation == 2:
+        return _sigmoid(x)
+    if activation == 3:
+        return np.maximum(x, np.float32(0.0))
+    return x
+
+
+@jit(nopython=True, cache=True)
+def dense_step(x, kernel, bias, activation):
+    return _activation(np.dot(x, kernel) + bias, activation)
+
+
+@jit(nopython=True, cache=True)
+def gru_step(x, h, kernel, recurrent_kernel, bias, recurrent_bias):
+    """Keras GRU cell (gates in the order update, reset, candidate), reset_after=True; h (batch x units) is overwritten"""
+    units = h.shape[1]
+    x_gates = np.dot(x, kernel) + bias
+    h_gates = np.dot(h, recurrent_kernel) + recurrent_bias
+    z = _sigmoid(x_gates[:, :units] + h_gates[:, :units])
+    r = _sigmoid(x_gates[:, units:2 * units] + h_gates[:, units:2 * units])
+    candidate = np.tanh(x_gates[:, 2 * units:] + r * h_gates[:, 2 * units:])
+    h[:] = z * h + (np.float32(1.0) - z) * candidate
+    return h
+
+
+@jit(nopython=True, cache=True)
+def gru_step_reset_before(x, h, kernel, recurrent_kernel_gates, recurrent_kernel_candidate, bias):
+    """As gru_step for reset_after=False (reset gate applied to h before the recurrent kernel)"""
+    units = h.shape[1]
+    x_gates = np.dot(x, kernel) + bias
+    h_gates = np.dot(h, recurrent_kernel_gates)
+    z = _sigmoid(x_gates[:, :units] + h_gates[:, :units])
+    r = _sigmoid(x_gates[:, units:2 * units] + h_gates[:, units:])
+    candidate = np.tanh(x_gates[:, 2 * units:] + np.dot(r * h, recurrent_kernel_candidate))
+    h[:] = z * h + (np.float32(1.0) - z) * candidate
+    return h
+
+
+@jit(nopython=True, cache=True)
+def lstm_step(x, h, c, kernel, recurrent_kernel, bias):
+    """Keras LSTM cell (gates in the order input, forget, cell, output); h and c (batch x units) are overwritten"""
+    units = h.shape[1]
+    gates = np.dot(x, kernel) + np.dot(h, recurrent_kernel) + bias
+    i = _sigmoid(gates[:, :units])
+    f = _sigmoid(gates[:, units:2 * units])
+    o = _sigmoid(gates[:, 3 * units:])
+    c[:] = f * c + i * np.tanh(gates[:, 2 * units:3 * units])
+    h[:] = o * np.tanh(c)
+    return h
+
+
+class NumpyNetwork:
+    """
+    layers: list of dicts with kind ('dense', 'gru', 'lstm') and the weights as float32 arrays in the Keras layout
+    (kernel, recurrent_kernel, bias; for GRU with reset_after bias of shape 2 x 3*units);
+    dense layers have an activation (one of ACTIVATIONS).
+    normalization: dict of arrays input_scale, input_offset, output_scale, output_offset, applied as
+    normalized input = input_scale * input + input_offset, output = output_scale * network output + output_offset;
+    None if the network works on not normalized data.
+    """
+
+    def __init__(self, layers, inputs, outputs, normalization=None, metadata=None, batch_size=1):
+        self.layers = []
+        for layer in layers:
+            layer = dict(layer)
+            if layer['kind'] not in ('dense', 'gru', 'lstm'):
+                raise ValueError("Layer of kind '{}' is not supported".format(layer['kind']))
+            for weight in ('kernel', 'recurrent_kernel', 'bias'):
+                if weight in layer:
+                    layer[weight] = np.ascontiguousarray(layer[weight], dtype=np.float32)
+            if layer['kind'] == 'gru':
+                layer['reset_after'] = layer['bias'].ndim == 2
+                bias = layer['bias'].reshape(-1, layer['kernel'].shape[1])
+                layer['input_bias'] = np.ascontiguousarray(bias[0])
+                if layer['reset_after']:
+                    layer['recurrent_bias'] = np.ascontiguousarray(bias[1])
+                else:
+                    units = layer['recurrent_kernel'].shape[0]
+                    layer['recurrent_kernel_gates'] = np.ascontiguousarray(layer['recurrent_kernel'][:, :2 * units])
+                    layer['recurrent_kernel_candidate'] = np.ascontiguousarray(layer['recurrent_kernel'][:, 2 * units:])
+            if layer['kind'] == 'dense':
+                layer['activation_code'] = ACTIVATIONS[layer.get('activation', 'linear')]
+            self.layers.append(layer)
+
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.normalization = None if normalization is None else \
+            {key: np.asarray(value, dtype=np.float32) for key, value in normalization.items()}
+        self.metadata = metadata or {}
+        self.reset(batch_size)
+
+    @property
+    def recurrent(self):
+        return any(layer['kind'] != 'dense' for layer in self.layers)
+
+    def reset(self, batch_size=None):
+        """Sets the states of the recurrent layers to zero, optionally for a new batch size"""
+        if batch_size is not None:
+            self.batch_size = batch_size
+        self.states = []
+        for layer in self.layers:
+            units = layer['recurrent_kernel'].shape[0] if layer['kind'] != 'dense' else 0
+            if layer['kind'] == 'gru':
+                self.states.append((np.zeros((self.batch_size, units), dtype=np.float32),))
+            elif layer['kind'] == 'lstm':
+                self.states.append((np.zeros((self.batch_size, units), dtype=np.float32),
+                                    np.zeros((self.batch_size, units), dtype=np.float32)))
+            else:
+                self.states.append(())
+
+    def step(self, x):
+        """
+        One time step for inputs x (batch_size x len(inputs)), returns the outputs (batch_size x len(outputs)).
+        x is normalized and the outputs denormalized if the network has normalization.
+        """
+        x = np.asarray(x, dtype=np.float32)
+        if self.normalization is not None:
+            x = self.normalization['input_scale'] * x + self.normalization['input_offset']
+        x = np.ascontiguousarray(x)
+        for layer, state in zip(self.layers, self.states):
+            if layer['kind'] == 'dense':
+                x = dense_step(x, layer['kernel'], layer['bias'], layer['activation_code'])
+            elif layer['kind'] == 'gru' and layer['reset_after']:
+                x = gru_step(x, state[0], layer['kernel'], layer['recurrent_kernel'],
+                             layer['input_bias'], layer['recurrent_bias'])
+            elif layer['kind'] == 'gru':
+                x = gru_step_reset_before(x, state[0], layer['kernel'], layer['recurrent_kernel_gates'],
+                                          layer['recurrent_kernel_candidate'], layer['input_bias'])
+            else:
+                x = lstm_step(x, state[0], state[1], layer['kernel'], layer['recurrent_kernel'], layer['bias'])
+        if self.normalization is not None:
+            x = self.normalization['output_scale'] * x + self.normalization['output_offset']
+        return x
+
+    def __call__(self, sequence):
+        """Outputs for the sequence of inputs (batch x time x len(inputs)), starting from the current states"""
+        sequence = np.asarray(sequence, dtype=np.float32)
+        if sequence.shape[0] != self.batch_size:
+            self.reset(sequence.shape[0])
+        return np.stack([self.step(sequence[:, t]).copy() for t in range(sequence.shape[1])], axis=1)
+
+    def save(self, path):
+        arrays = {}
+        specification = []
+        for i, layer in enumerate(self.layers):
+            specification.append({'kind': layer['kind'], 'activation': layer.get('activation', 'linear')})
+            for weight in ('kernel', 'recurrent_kernel', 'bias'):
+                if weight in layer:
+                    arrays['{}/{}'.format(i, weight)] = layer[weight]
+        if self.normalization is not None:
+            arrays.update({'normalization/' + key: value for key, value in self.normalization.items()})
+        np.savez(path, layers=json.dumps(specification), inputs=json.dumps(self.inputs),
+                 outputs=json.dumps(self.outputs), metadata=json.dumps(self.metadata), **arrays)
+
+    @classmethod
+    def load(cls, path, batch_size=1):
+        with np.load(path) as data:
+            layers = json.loads(str(data['layers']))
+            for i, layer in enumerate(layers):
+                for weight in ('kernel', 'recurrent_kernel', 'bias'):
+                    key = '{}/{}'.format(i, weight)
+                    if key in data:
+                        layer[weight] = data[key]
+            normalization = {key.split('/', 1)[1]: data[key] for key in data.files if key.startswith('normalization/')}
+            return cls(layers, json.loads(str(data['inputs'])), json.loads(str(data['outputs'])),
+                       normalization or None, json.loads(str(data['metadata'])), batch_size)
@@ -5,7 +5,7 @@ from CartPole.cartpole_model_tf import Q2u
 from CartPole.state_utilities import STATE_INDICES, STATE_VARIABLES, CONTROL_INPUTS, CONTROL_INDICES, create_cartpole_state
 from CartPole.state_utilities import ANGLE_IDX, ANGLED_IDX, POSITION_IDX, POSITIOND_IDX, ANGLE_COS_IDX, ANGLE_SIN_IDX
 
-from CartPole.cartpole_tf import cartpole_fine_integration_tf, Q2u_tf
+from CartPole.cartpole_tf import _cartpole_fine_integration_tf, cartpole_fine_integration_tf, Q2u_tf
 from CartPole.cartpole_model import L
 
 from SI_Toolkit.Functions.TF.Compile import CompileTF, CompileAdaptive
@@ -24,16 +24,24 @@ class next_state_predictor_ODE_tf():
                  intermediate_steps,
                  batch_size=1,
                  variable_parameters=None,
-                 disable_individual_compilation=False):
+                 disable_individual_compilation=False,
+                 unroll_horizon=False):
         self.intermediate_steps = tf.convert_to_tensor(intermediate_steps, dtype=tf.int32)
         self.t_step = tf.convert_to_tensor(dt / float(self.intermediate_steps), dtype=tf.float32)
 
         self.variable_parameters = variable_parameters
 
+        # Only for predict_horizon:
+        # True - the loop over horizon is unrolled at tracing (larger graph, retraced for every horizon length),
+        # False - the horizon is integrated with tf.while_loop
+        self.unroll_horizon = unroll_horizon
+
         if disable_individual_compilation:
             self.step = self._step
+            self._predict_horizon_compiled = self._predict_horizon
         else:
             self.step = CompileTF(self._step)
+            self._predict_horizon_compiled = CompileTF(self._predict_horizon)
 
     def _step(self, s, Q):
 
@@ -53,6 +61,62 @@ class next_state_predictor_ODE_tf():
 
         return s_next
 
+    def predict_horizon(self, s, Q):
+        """
+        Integrates the whole horizon in a single compiled call, instead of calling step once per horizon step.
+
+        :param s: initial states, [batch_size, num_states]
+        :param Q: control inputs, [batch_size, horizon, 1]
+        :returns: predicted states including initial state, [batch_size, horizon+1, num_states]
+        """
+        if self.variable_parameters is not None and hasattr(self.variable_parameters, 'L'):
+            pole_half_length = self.variable_parameters.L
+        else:
+            pole_half_length = L
+        if not isinstance(pole_half_length, tf.Variable):
+            pole_half_length = tf.convert_to_tensor(pole_half_length, dtype=tf.float32)
+
+        return self._predict_horizon_compiled(s, Q, pole_half_length)
+
+    def _predict_horizon(self, s, Q, pole_half_length):
+
+        u = Q2u_tf(Q[..., 0])  # [batch_size, horizon]
+
+        angle, angleD = s[..., ANGLE_IDX], s[..., ANGLED_IDX]
+        angle_cos, angle_sin = s[..., ANGLE_COS_IDX], s[..., ANGLE_SIN_IDX]
+        position, positionD = s[..., POSITION_IDX], s[..., POSITIOND_IDX]
+
+        if self.unroll_horizon:
+            outputs = [s]
+            for i in range(Q.shape[1]):
+                (
+                    angle, angleD, position, positionD, angle_cos, angle_sin
+                ) = _cartpole_fine_integration_tf(angle, angleD, angle_cos, angle_sin, position, positionD,
+                                                  u[:, i], self.t_step, self.intermediate_steps, L=pole_half_length)
+                outputs.append(tf.stack([angle, angleD, angle_cos, angle_sin, position, positionD], axis=1))
+            return tf.stack(outputs, axis=1)
+
+        horizon = tf.shape(Q)[1]
+        outputs = tf.TensorArray(tf.float32, size=horizon + 1, dynamic_size=False)
+        outputs = outputs.write(0, s)
+
+        def body(i, angle, angleD, position, positionD, angle_cos, angle_sin, outputs):
+            (
+                angle, angleD, position, positionD, angle_cos, angle_sin
+            ) = _cartpole_fine_integration_tf(angle, angleD, angle_cos, angle_sin, position, positionD,
+                                              u[:, i], self.t_step, self.intermediate_steps, L=pole_half_length)
+            outputs = outputs.write(i + 1, tf.stack([angle, angleD, angle_cos, angle_sin, position, positionD], axis=1))
+            return i + 1, angle, angleD, position, positionD, angle_cos, angle_sin, outputs
+
+        loop_vars = tf.while_loop(
+            lambda i, *_: i < horizon,
+            body,
+            (tf.constant(0), angle, angleD, position, positionD, angle_cos, angle_sin, outputs),
+        )
+        outputs = loop_vars[-1]
+
+        return tf.transpose(outputs.stack(), perm=[1, 0, 2])
+
 
 class predictor_output_augmentation_tf:
     def __init__(self, net_info, lib, disable_individual_compilation=False, differential_network=False):
@@ -0,0 +1,36 @@
+import torch
+
+from CartPole.state_utilities import STATE_INDICES, STATE_VARIABLES, CONTROL_INPUTS
+
+from CartPole.cartpole_torch import Q2u, L, cartpole_fine_integration_torch
+
+
+class next_state_predictor_ODE_torch():
+
+    def __init__(self,
+                 dt: float,
+                 intermediate_steps: int,
+                 batch_size: int,
+                 variable_parameters=None,
+                 **kwargs):
+
+        self.variable_parameters = variable_parameters
+
+        self.intermediate_steps = intermediate_steps
+        self.t_step = float(dt / float(self.intermediate_steps))
+
+    def step(self, s, Q):
+
+        assert Q.shape[0] == s.shape[0]
+        assert Q.ndim == 2
+        assert s.ndim == 2
+
+        if self.variable_parameters is not None and hasattr(self.variable_parameters, 'L'):
+            pole_half_length = torch.as_tensor(self.variable_parameters.L)
+        else:
+            pole_half_length = L
+
+        Q = torch.squeeze(Q, dim=1)  # Removes features dimension, specific for cartpole as it has only one control input
+        u = Q2u(Q)
+        s_next = cartpole_fine_integration_torch(s, u, self.t_step, self.intermediate_steps, L=pole_half_length)
+        return s_next
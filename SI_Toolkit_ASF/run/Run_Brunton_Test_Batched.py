@@ -0,0 +1,3 @@
+from SI_Toolkit_ASF.brunton_test_batched import run_brunton_test_batched
+
+run_brunton_test_batched()
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+pytest.importorskip("Control_Toolkit")
+
+from CartPole.state_utilities import ANGLE_IDX
+from others.autotuning.autotune import (CMAES, ClosedLoopEvaluation, autotune, evaluate_population,
+                                        random_episodes, swing_up_time)
+
+PID_NAMES = ['P_angle', 'I_angle', 'D_angle', 'P_position', 'I_position', 'D_position']
+PID_GAINS = np.array([[18.0, 38.0, 4.0, 22.0, 1.0, 12.0], [1.0, 0.1, 0.1, 1.0, 0.1, 0.1]])
+INIT_LIMITS = {'angle': [0.0, 10.0], 'angleD': 10.0, 'position': 0.3, 'positionD': 0.01}
+
+
+def _evaluation(controller='pid', episodes=8, steps=50):
+    initial_states, target_positions = random_episodes(episodes, INIT_LIMITS, 0.2, np.random.default_rng(0))
+    return ClosedLoopEvaluation(controller, initial_states, target_positions, steps, 0.002, 10,
+                                {'mean_abs_angle': 1.0, 'mean_abs_position_error': 0.5})
+
+
+def test_cma_es_minimizes_shifted_ellipsoid():
+    optimum = np.array([1.0, -2.0, 0.5])
+    search = CMAES(np.zeros(3), 1.0, rng=0)
+    for _ in range(150):
+        xs = search.ask()
+        search.tell(xs, np.sum(np.array([1.0, 10.0, 100.0]) * (xs - optimum) ** 2, axis=1))
+    np.testing.assert_allclose(search.mean, optimum, atol=1e-3)
+
+
+def test_evaluation_deterministic_and_per_candidate():
+    evaluation = _evaluation()
+    scores = evaluate_population(evaluation, PID_NAMES, PID_GAINS)
+    assert scores[0] < scores[1]  # Working gains beat weak ones
+    # Each candidate scores the same alone as in a population
+    np.testing.assert_allclose(evaluate_population(evaluation, PID_NAMES, PID_GAINS[1:]), scores[1:], rtol=1e-6)
+    np.testing.assert_array_equal(evaluate_population(evaluation, PID_NAMES, PID_GAINS), scores)
+
+
+def test_swing_up_time():
+    states = np.zeros((5, 3, 6))
+    states[:, 0, ANGLE_IDX] = [3.0, 1.0, 0.0, 0.0, 0.0]
+    states[:, 1, ANGLE_IDX] = 3.0
+    np.testing.assert_allclose(swing_up_time(states, 0.0, 0.1), [0.2, 0.5, 0.0])
+
+
+def test_autotune_improves_lqr_with_fixed_seed():
+    pytest.importorskip("sympy")
+    evaluation = _evaluation('lqr')
+    names = ['Q_position', 'Q_positionD', 'Q_angle', 'Q_angleD', 'R']
+    kwargs = dict(lower=[0.01] * 5, upper=[1000.0] * 5, initial=[0.1, 0.1, 0.1, 0.1, 100.0],
+                  iterations=3, population_size=6, seed=3, verbose=False)
+    best_parameters, best_score, (parameters, scores) = autotune(evaluation, names, **kwargs)
+    initial_score = evaluate_population(evaluation, names, np.array([kwargs['initial']]))[0]
+    assert best_score <= initial_score and best_score == scores.min() and parameters.shape == (18, 5)
+    assert autotune(evaluation, names, **kwargs)[1] == best_score
+
+
+def test_bayesian_optimization_finds_minimum_region():
+    pytest.importorskip("sklearn")
+    from others.autotuning.autotune import BayesianOptimization
+
+    search = BayesianOptimization((np.zeros(2), np.ones(2)), rng=0, initial_points=[np.array([0.9, 0.9])])
+    for _ in range(8):
+        xs = search.ask(3)
+        assert xs.shape == (3, 2) and np.all((xs >= 0.0) & (xs <= 1.0))
+        search.tell(xs, np.sum((xs - 0.3) ** 2, axis=1))
+    np.testing.assert_array_equal(search.xs[0], [0.9, 0.9])
+    assert search.scores.min() < 0.01
@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+pytest.importorskip("sympy")
+pytest.importorskip("Control_Toolkit")
+
+from CartPole.state_utilities import ANGLE_IDX, ANGLED_IDX, POSITION_IDX, POSITIOND_IDX, STATE_VARIABLES
+from Control_Toolkit_ASF.Controllers.controller_lqr import controller_lqr
+from Control_Toolkit_ASF.Controllers.controller_pid import BatchedPID, controller_pid
+
+N = 16
+
+
+def _controller(controller_class, config_controller, **variable_parameters):
+    """Controller without the template constructor, parameters set directly"""
+    controller = controller_class.__new__(controller_class)
+    controller.config_controller = config_controller
+    controller.variable_parameters = SimpleNamespace(**variable_parameters)
+    controller.update_attributes = lambda updated_attributes: None
+    controller.action_low, controller.action_high = -1.0, 1.0
+    controller.configure()
+    return controller
+
+
+def _states(seed=0):
+    rng = np.random.default_rng(seed)
+    s = np.zeros((N, len(STATE_VARIABLES)))
+    s[:, POSITION_IDX] = rng.uniform(-0.1, 0.1, N)
+    s[:, POSITIOND_IDX] = rng.uniform(-0.2, 0.2, N)
+    s[:, ANGLE_IDX] = rng.uniform(-np.pi, np.pi, N)
+    s[:, ANGLED_IDX] = rng.uniform(-1.0, 1.0, N)
+    return s
+
+
+@pytest.mark.parametrize("gain_schedule", [None, {"enabled": True, "L_range": [0.1, 0.4], "L_points": 9}])
+def test_lqr_batch_equals_single(gain_schedule):
+    config = {"seed": 1, "Q": [10.0, 1.0, 1.0, 1.0], "R": 10.0, "gain_schedule": gain_schedule}
+    lqr = _controller(controller_lqr, config, target_position=0.0, L=0.2, target_equilibrium=1.0)
+    lqr.p_Q = 0.0
+    s = _states()
+    target_positions = np.linspace(-0.05, 0.05, N)
+    L = np.linspace(0.1, 0.4, N)
+    target_equilibria = np.where(np.arange(N) % 2, 1.0, -1.0)
+
+    Q_batch = lqr.step_batch(s, target_positions, L, target_equilibria)
+    assert Q_batch.shape == (N,) and Q_batch.dtype == np.float32
+    for i in range(N):
+        lqr.variable_parameters = SimpleNamespace(
+            target_position=target_positions[i], L=L[i], target_equilibrium=target_equilibria[i])
+        np.testing.assert_allclose(Q_batch[i], lqr.step(s[i]), rtol=1e-5, atol=1e-6)
+
+
+def test_pid_batch_equals_single_over_time():
+    config = {"P_angle": 18.0, "I_angle": 38.0, "D_angle": 4.0, "P_position": 22.0, "I_position": 1.0,
+              "D_position": 12.0}
+    batched = _controller(controller_pid, config, target_position=0.0)
+    singles = [_controller(controller_pid, config, target_position=0.0) for _ in range(N)]
+    target_positions = np.linspace(-0.05, 0.05, N)
+    for i, single in enumerate(singles):
+        single.variable_parameters.target_position = target_positions[i]
+
+    for k in range(20):
+        s = _states(seed=k) * 0.1
+        time = 0.02 * k
+        Q_batch = batched.step_batch(s, target_positions, time)
+        Q_single = [single.step(s[i], time) for i, single in enumerate(singles)]
+        np.testing.assert_allclose(Q_batch, Q_single, rtol=1e-10, atol=1e-12)
+
+
+def test_pid_reset_rows_and_gains_per_row():
+    KP = np.linspace(1.0, 2.0, N)
+    pid = BatchedPID(N, KP, 1.0, 1.0, KP, 1.0, 1.0)
+    s = _states() * 0.1
+    pid.step(s, 0.0, 0.0)
+    pid.step(s * 2.0, 0.0, 0.02)
+    rows = np.arange(N) < 4
+    pid.reset(rows)
+    assert np.all(pid.angle_error_integral[rows] == 0.0) and np.all(np.isnan(pid.angle_error_previous[rows]))
+    assert np.all(pid.angle_error_integral[~rows] != 0.0) and not np.any(np.isnan(pid.angle_error_previous[~rows]))
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("gymnasium")
+
+from CartPole.state_utilities import ANGLE_COS_IDX, ANGLE_IDX
+from GymlikeCartPole.CartPoleEnv_LTC import CartPoleEnv_LTC
+from run_data_generator import random_experiment_setter
+
+
+@pytest.fixture
+def env(monkeypatch):
+    calls = []
+
+    def set(self, CartPoleInstance):
+        calls.append(CartPoleInstance)
+        return CartPoleInstance
+
+    # Full set up of a random experiment, counted; it would load the controller
+    monkeypatch.setattr(random_experiment_setter, 'set', set)
+    env = CartPoleEnv_LTC()
+    env.full_setups = calls
+    return env
+
+
+def test_reset_sets_up_experiment_only_once(env):
+    assert len(env.full_setups) == 1
+    for _ in range(5):
+        env.reset()
+    assert len(env.full_setups) == 1
+    env.reset(options={'full_reset': True})
+    assert len(env.full_setups) == 2
+
+
+def test_reset_seeding(env):
+    state, _ = env.reset(seed=11)
+    state = np.copy(state)
+    assert env.CartPoleInstance.time == 0.0
+    np.testing.assert_allclose(state[ANGLE_COS_IDX], np.cos(state[ANGLE_IDX]), rtol=1e-6)
+    np.testing.assert_array_equal(env.CartPoleInstance.LatencyAdderInstance.latency_buffer[-1], state)
+
+    other_state, _ = env.reset()
+    assert not np.array_equal(state, other_state)
+    same_state, _ = env.reset(seed=11)
+    np.testing.assert_array_equal(state, same_state)
+
+
+def test_sample_initial_states_vectorized():
+    RES = random_experiment_setter()
+    initial_states, target_positions = RES.sample_initial_states(1000, rng=np.random.default_rng(0))
+    assert initial_states.shape == (1000, 6) and target_positions.shape == (1000,)
+    angle_limits = np.deg2rad(RES.angle_init_limits)
+    assert np.all((np.abs(initial_states[:, ANGLE_IDX]) >= angle_limits[0] - 1e-6)
+                  & (np.abs(initial_states[:, ANGLE_IDX]) <= angle_limits[1] + 1e-6))
+    assert np.any(initial_states[:, ANGLE_IDX] > 0) and np.any(initial_states[:, ANGLE_IDX] < 0)
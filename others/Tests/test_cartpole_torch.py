@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from CartPole.cartpole_numba import cartpole_fine_integration_s_numba, cartpole_ode_numba
+from CartPole.cartpole_torch import (_cartpole_fine_integration_torch, cartpole_fine_integration_torch,
+                                     cartpole_ode, Q2u)
+from CartPole.cartpole_torch import L as L_torch, TrackHalfLength as TrackHalfLength_torch
+from CartPole.cartpole_torch import k, m_cart, m_pole, g, J_fric, M_fric
+from CartPole.state_utilities import ANGLE_IDX, ANGLED_IDX, ANGLE_COS_IDX, ANGLE_SIN_IDX, POSITION_IDX, POSITIOND_IDX
+from others.p_globals import L, TrackHalfLength, u_max
+
+batch_size = 1000
+t_step = np.float32(0.002)
+rng = np.random.default_rng(1873)
+
+
+def random_states(batch_size):
+    # Carts close to the track ends and moving towards them, so that the edge bounce is exercised
+    s = np.zeros((batch_size, 6), dtype=np.float32)
+    s[:, ANGLE_IDX] = rng.uniform(-np.pi, np.pi, batch_size)
+    s[:, ANGLED_IDX] = rng.uniform(-1.0, 1.0, batch_size)
+    s[:, ANGLE_COS_IDX] = np.cos(s[:, ANGLE_IDX])
+    s[:, ANGLE_SIN_IDX] = np.sin(s[:, ANGLE_IDX])
+    s[:, POSITION_IDX] = rng.uniform(0.9, 1.0, batch_size) * TrackHalfLength * rng.choice([-1.0, 1.0], batch_size)
+    s[:, POSITIOND_IDX] = np.sign(s[:, POSITION_IDX]) * rng.uniform(0.5, 1.0, batch_size)
+    return s
+
+
+def test_ode_torch_vs_numba():
+    s = random_states(batch_size)
+    u = rng.uniform(-u_max, u_max, batch_size).astype(np.float32)
+
+    angleDD_numba, positionDD_numba = cartpole_ode_numba(s, u, L=float(L))
+    angleDD_torch, positionDD_torch = cartpole_ode(torch.from_numpy(s), torch.from_numpy(u))
+
+    np.testing.assert_allclose(angleDD_torch.numpy(), angleDD_numba, rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(positionDD_torch.numpy(), positionDD_numba, rtol=1e-4, atol=1e-4)
+
+
+def test_fine_integration_torch_vs_numba():
+    s = random_states(batch_size)
+    Q = np.sign(s[:, POSITION_IDX]).astype(np.float32)  # Drive carts against the track ends
+
+    s_numba = np.copy(s)
+    s_torch = torch.from_numpy(s)
+    u_torch = Q2u(torch.from_numpy(Q))
+    for _ in range(5):
+        s_numba = cartpole_fine_integration_s_numba(s_numba, (u_max * Q).astype(np.float32), t_step, 10, L=float(L))
+        s_torch = cartpole_fine_integration_torch(s_torch, u_torch, t_step, 10)
+
+    assert np.all(np.abs(s_numba[:, POSITION_IDX]) <= 1.05 * TrackHalfLength)
+    np.testing.assert_allclose(s_torch.numpy(), s_numba, rtol=1e-3, atol=1e-3)
+
+
+def test_fine_integration_torchscript():
+    s = torch.from_numpy(random_states(batch_size))
+    u = Q2u(torch.from_numpy(rng.uniform(-1.0, 1.0, batch_size).astype(np.float32)))
+
+    args = (
+        s[:, ANGLE_IDX], s[:, ANGLED_IDX], s[:, ANGLE_COS_IDX], s[:, ANGLE_SIN_IDX], s[:, POSITION_IDX], s[:, POSITIOND_IDX],
+        u, float(t_step), 10, k, m_cart, m_pole, g, J_fric, M_fric, L_torch, TrackHalfLength_torch,
+    )
+
+    scripted = torch.jit.script(_cartpole_fine_integration_torch)
+    for result_scripted, result_eager in zip(scripted(*args), _cartpole_fine_integration_torch(*args)):
+        torch.testing.assert_close(result_scripted, result_eager)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("gymnasium")
+
+from CartPole.cartpole_model import Q2u
+from CartPole.cartpole_numba import cartpole_fine_integration_s_numba
+from CartPole.state_utilities import ANGLE_IDX
+from GymlikeCartPole.CartPoleVectorEnv import CartPoleVectorEnv
+
+
+def test_vector_env_matches_single_state_dynamics():
+    env = CartPoleVectorEnv(num_envs=8)
+    observations, _ = env.reset(seed=3)
+    actions = np.linspace(-1.0, 1.0, 8, dtype=np.float32)[:, np.newaxis]
+
+    expected = np.stack([
+        cartpole_fine_integration_s_numba(observations[i], Q2u(actions[i]), env.dt_simulation, env.intermediate_steps)[0]
+        for i in range(8)
+    ])
+    observations, rewards, terminated, truncated, _ = env.step(actions)
+
+    np.testing.assert_allclose(observations, expected, rtol=1e-6, atol=1e-6)
+    assert observations.shape == (8, 6) and rewards.shape == (8,)
+    assert env.observation_space.contains(observations)
+
+
+def test_vector_env_seeding():
+    env = CartPoleVectorEnv(num_envs=4)
+    first, _ = env.reset(seed=7)
+    second, _ = env.reset(seed=7)
+    np.testing.assert_array_equal(first, second)
+
+
+def test_vector_env_autoreset():
+    env = CartPoleVectorEnv(num_envs=2)
+    env.reset(seed=0)
+    # Pole of first env beyond the threshold
+    env.states[0, ANGLE_IDX] = 1.0
+
+    _, rewards, terminated, truncated, _ = env.step(np.zeros((2, 1), dtype=np.float32))
+    assert terminated.tolist() == [True, False] and not truncated.any()
+    assert rewards[0] == 1.0
+
+    # Next step resets the first env: zero reward, not terminated, new initial state within limits
+    observations, rewards, terminated, _, _ = env.step(np.zeros((2, 1), dtype=np.float32))
+    assert rewards[0] == 0.0 and not terminated[0]
+    assert abs(observations[0, ANGLE_IDX]) <= np.deg2rad(env.init_limits[2][1])
+    assert env.steps[0] == 0
+
+    # Truncation at the end of episode, with the final reward
+    env.steps[1] = env.max_episode_steps - 1
+    env.states[1] = env.states[0]
+    _, rewards, terminated, truncated, _ = env.step(np.zeros((2, 1), dtype=np.float32))
+    assert truncated[1] and not terminated[1] and rewards[1] == 10.0
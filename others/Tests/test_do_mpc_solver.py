@@ -0,0 +1,51 @@
+import os
+import warnings
+
+import numpy as np
+import pytest
+
+casadi = pytest.importorskip("casadi")
+
+from Control_Toolkit_ASF.Controllers.do_mpc_solver import (IPOPT_SILENT, WarmStartedSolver, choose_linear_solver,
+                                                           compile_nlp_solver, linear_solver_available)
+
+
+def _nlp_solver(options=IPOPT_SILENT):
+    x, p = casadi.SX.sym('x', 3), casadi.SX.sym('p')
+    nlp = {'x': x, 'p': p, 'f': casadi.sumsqr(x - p) + x[0] * x[1], 'g': casadi.sum1(x)}
+    return casadi.nlpsol('S', 'ipopt', nlp, options)
+
+
+def _solve(solver, p):
+    return solver(x0=np.zeros(3), p=p, lbx=-1.0, ubx=1.0, lbg=-0.5, ubg=0.5)
+
+
+def test_linear_solver_fallback():
+    assert linear_solver_available('mumps')
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        assert choose_linear_solver('not_a_linear_solver') == 'mumps'
+    assert len(caught) == 1
+
+
+def test_warm_started_solver_same_solution_and_statistics():
+    reference = _nlp_solver()
+    solver = WarmStartedSolver(_nlp_solver(), dual=True)
+    for p in np.linspace(0.0, 1.0, 5):
+        np.testing.assert_allclose(_solve(solver, p)['x'], _solve(reference, p)['x'], atol=1e-6)
+    statistics = solver.statistics()
+    assert statistics['solves'] == 5 and statistics['success_rate'] == 1.0
+    assert 0.0 < statistics['solve_time_median'] <= statistics['solve_time_max']
+    solver.reset()
+    assert solver.lam_x is None and not solver.previous_solution
+
+
+def test_compiled_solver_cached(tmp_path):
+    if not any(os.access(os.path.join(path, 'gcc'), os.X_OK) for path in os.environ['PATH'].split(os.pathsep)):
+        pytest.skip('gcc not found')
+    compiled = compile_nlp_solver(_nlp_solver(), IPOPT_SILENT, str(tmp_path))
+    library, = os.listdir(tmp_path)
+    modified = os.path.getmtime(os.path.join(tmp_path, library))
+    np.testing.assert_allclose(_solve(compiled, 0.3)['x'], _solve(_nlp_solver(), 0.3)['x'], atol=1e-8)
+    compile_nlp_solver(_nlp_solver(), IPOPT_SILENT, str(tmp_path))
+    assert os.listdir(tmp_path) == [library] and os.path.getmtime(os.path.join(tmp_path, library)) == modified
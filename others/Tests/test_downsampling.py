@@ -0,0 +1,29 @@
+import numpy as np
+
+from CartPole.downsampling import MinMaxPyramid
+
+
+def test_short_range_is_not_downsampled():
+    x = np.arange(100.0)
+    pyramid = MinMaxPyramid(x, np.sin(x))
+    qx, qy = pyramid.query(10.0, 20.0, max_points=50)
+    np.testing.assert_array_equal(qx, x[9:22])  # One point beyond each end of the visible range
+    np.testing.assert_array_equal(qy, np.sin(x[9:22]))
+
+
+def test_min_max_preserved_within_max_points():
+    rng = np.random.default_rng(0)
+    x = np.arange(180_001) * 0.02
+    y = rng.normal(size=x.size)
+    y[123_457] = 50.0  # A single spike must survive any zoom level
+    pyramid = MinMaxPyramid(x, y)
+
+    for x_min, x_max in [(-np.inf, np.inf), (1000.0, 3000.0), (2460.0, 2480.0)]:
+        qx, qy = pyramid.query(x_min, x_max, max_points=1000)
+        assert len(qx) <= 1000 + 4
+        assert np.all(np.diff(qx) >= 0)
+        visible = (x >= x_min) & (x <= x_max)
+        assert qy.max() >= y[visible].max() and qy.min() <= y[visible].min()
+        assert qx[0] <= max(x_min, x[0]) and qx[-1] >= min(x_max, x[-1])
+        # Points are samples of the series
+        np.testing.assert_array_equal(qy, y[np.searchsorted(x, qx)])
@@ -0,0 +1,401 @@
+"""
+Cross-backend equivalence and throughput benchmark of the CartPole dynamics.
+
+Backends: NumPy, numba, TensorFlow and PyTorch (the last one only if installed).
+Measured: ODE, fine integration (intermediate_steps Euler steps with edge bounce) and predictor rollouts over a horizon,
+for a matrix of batch sizes, horizons and intermediate steps.
+Every backend is checked against the numba implementation (which is the one used by the simulator).
+
+pytest runs only the equivalence check on a small matrix.
+Run the file directly for the benchmark; the results are written as JSON and CSV so that they can be compared between commits:
+    python -m others.Tests.test_dynamics_backends --output_dir ./Experiment_Recordings/Benchmarks
+"""
+
+import argparse
+import csv
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import timeit
+
+import numpy as np
+
+from CartPole.cartpole_model import _cartpole_ode, cartpole_integration, Q2u
+from CartPole.cartpole_numba import cartpole_fine_integration_s_numba, cartpole_ode_numba
+from CartPole.recording_metadata import get_git_revision
+from CartPole.state_utilities import (ANGLE_COS_IDX, ANGLE_IDX, ANGLE_SIN_IDX,
+                                      ANGLED_IDX, POSITION_IDX, POSITIOND_IDX)
+from others.p_globals import L, TrackHalfLength
+
+dt = 0.02
+
+BATCH_SIZES = [1, 64, 1024, 4096]
+HORIZONS = [10, 50]
+INTERMEDIATE_STEPS = [1, 10]
+
+# Tolerances of the comparison with numba.
+# Rollouts are compared with a looser tolerance, float32 rounding differences grow along the horizon.
+TOLERANCES = {
+    'ode': 1e-4,
+    'fine_integration': 1e-3,
+    'rollout': 1e-2,
+}
+
+
+# region NumPy backend
+
+def edge_bounce_numpy(angle, angle_cos, angleD, position, positionD, t_step, L=L):
+    """Vectorized version of edge_bounce from cartpole_model.py"""
+    bounce = (position >= TrackHalfLength) | (-position >= TrackHalfLength)
+    angleD = np.where(bounce, angleD - 2 * (positionD * angle_cos) / L, angleD)
+    angle = np.where(bounce, angle + angleD * t_step, angle)
+    positionD = np.where(bounce, -positionD, positionD)
+    position = np.where(bounce, position + positionD * t_step, position)
+    return angle, angleD, position, positionD
+
+
+def cartpole_fine_integration_s_numpy(s, u, t_step, intermediate_steps, L=L):
+    angle, angleD = s[..., ANGLE_IDX], s[..., ANGLED_IDX]
+    angle_cos, angle_sin = s[..., ANGLE_COS_IDX], s[..., ANGLE_SIN_IDX]
+    position, positionD = s[..., POSITION_IDX], s[..., POSITIOND_IDX]
+
+    for _ in range(intermediate_steps):
+        angleDD, positionDD = _cartpole_ode(angle_cos, angle_sin, angleD, positionD, u, L=L)
+        angle, angleD, position, positionD = cartpole_integration(angle, angleD, angleDD, position, positionD,
+                                                                  positionDD, t_step)
+        angle_cos = np.cos(angle)
+        angle, angleD, position, positionD = edge_bounce_numpy(angle, angle_cos, angleD, position, positionD,
+                                                               t_step, L)
+        angle = np.arctan2(np.sin(angle), np.cos(angle))
+        angle_cos = np.cos(angle)
+        angle_sin = np.sin(angle)
+
+    s_next = np.empty_like(s)
+    s_next[..., ANGLE_IDX], s_next[..., ANGLED_IDX] = angle, angleD
+    s_next[..., ANGLE_COS_IDX], s_next[..., ANGLE_SIN_IDX] = angle_cos, angle_sin
+    s_next[..., POSITION_IDX], s_next[..., POSITIOND_IDX] = position, positionD
+    return s_next
+
+
+def rollout_numpy_like(fine_integration, s, Q, t_step, intermediate_steps):
+    """Horizon loop as done by the numpy ODE predictor: s [batch, 6], Q [batch, horizon] -> [batch, horizon+1, 6]"""
+    output = np.empty((s.shape[0], Q.shape[1] + 1, s.shape[1]), dtype=np.float32)
+    output[:, 0, :] = s
+    for i in range(Q.shape[1]):
+        s = fine_integration(s, Q2u(Q[:, i]), t_step, intermediate_steps, L=L)
+        output[:, i + 1, :] = s
+    return output
+
+# endregion
+
+
+class Backend:
+    """
+    Common interface of a backend for the benchmark.
+    Inputs and outputs of all functions are numpy arrays; to_backend/to_numpy are not part of the measured time.
+    """
+    name = None
+
+    def to_backend(self, x):
+        return x
+
+    def to_numpy(self, x):
+        return np.asarray(x)
+
+    def ode(self, s, u):
+        raise NotImplementedError
+
+    def fine_integration(self, s, u, t_step, intermediate_steps):
+        raise NotImplementedError
+
+    def rollout(self, s, Q, t_step, intermediate_steps):
+        raise NotImplementedError
+
+    def block(self, x):
+        """Waits for the result to be computed, for backends which execute asynchronously"""
+        return x
+
+
+class NumpyBackend(Backend):
+    name = 'numpy'
+
+    def ode(self, s, u):
+        angleDD, positionDD = _cartpole_ode(s[..., ANGLE_COS_IDX], s[..., ANGLE_SIN_IDX], s[..., ANGLED_IDX],
+                                            s[..., POSITIOND_IDX], u, L=L)
+        return np.stack([angleDD, positionDD], axis=-1)
+
+    def fine_integration(self, s, u, t_step, intermediate_steps):
+        return cartpole_fine_integration_s_numpy(s, u, t_step, intermediate_steps)
+
+    def rollout(self, s, Q, t_step, intermediate_steps):
+        return rollout_numpy_like(cartpole_fine_integration_s_numpy, s, Q, t_step, intermediate_steps)
+
+
+class NumbaBackend(Backend):
+    name = 'numba'
+
+    def ode(self, s, u):
+        return np.stack(cartpole_ode_numba(s, u, L=L), axis=-1)
+
+    def fine_integration(self, s, u, t_step, intermediate_steps):
+        return cartpole_fine_integration_s_numba(s, u, t_step, intermediate_steps, L=L)
+
+    def rollout(self, s, Q, t_step, intermediate_steps):
+        return rollout_numpy_like(cartpole_fine_integration_s_numba, s, Q, t_step, intermediate_steps)
+
+
+class TFBackend(Backend):
+    name = 'tf'
+
+    def __init__(self):
+        import tensorflow as tf
+        from SI_Toolkit.Functions.TF.Compile import CompileTF
+        from CartPole.cartpole_tf import cartpole_fine_integration_tf, cartpole_ode
+        from SI_Toolkit_ASF.predictors_customization_tf import next_state_predictor_ODE_tf
+
+        self.tf = tf
+        self._ode = CompileTF(lambda s, u: tf.stack(cartpole_ode(s, u), axis=-1))
+        self._fine_integration = CompileTF(cartpole_fine_integration_tf)
+        self._predictor_factory = next_state_predictor_ODE_tf
+        self._predictors = {}
+
+    def to_backend(self, x):
+        return self.tf.convert_to_tensor(x)
+
+    def to_numpy(self, x):
+        return x.numpy()
+
+    def ode(self, s, u):
+        return self._ode(s, u)
+
+    def fine_integration(self, s, u, t_step, intermediate_steps):
+        return self._fine_integration(s, u, self.tf.constant(t_step), self.tf.constant(intermediate_steps))
+
+    def rollout(self, s, Q, t_step, intermediate_steps):
+        # One compiled call for the whole horizon, as in the ODE_TF predictor
+        key = (t_step, intermediate_steps)
+        if key not in self._predictors:
+            self._predictors[key] = self._predictor_factory(t_step * intermediate_steps, intermediate_steps)
+        return self._predictors[key].predict_horizon(s, Q[..., self.tf.newaxis])
+
+
+class TorchBackend(Backend):
+    name = 'torch'
+
+    def __init__(self):
+        import torch
+        from CartPole import cartpole_torch
+
+        self.torch = torch
+        self.cartpole_torch = cartpole_torch
+        self._fine_integration = torch.jit.script(cartpole_torch._cartpole_fine_integration_torch)
+
+    def to_backend(self, x):
+        return self.torch.from_numpy(np.ascontiguousarray(x))
+
+    def to_numpy(self, x):
+        return x.numpy()
+
+    def ode(self, s, u):
+        return self.torch.stack(self.cartpole_torch.cartpole_ode(s, u), dim=-1)
+
+    def fine_integration(self, s, u, t_step, intermediate_steps):
+        c = self.cartpole_torch
+        result = self._fine_integration(
+            s[..., ANGLE_IDX], s[..., ANGLED_IDX], s[..., ANGLE_COS_IDX], s[..., ANGLE_SIN_IDX],
+            s[..., POSITION_IDX], s[..., POSITIOND_IDX],
+            u, float(t_step), int(intermediate_steps),
+            c.k, c.m_cart, c.m_pole, c.g, c.J_fric, c.M_fric, c.L, c.TrackHalfLength,
+        )
+        angle, angleD, position, positionD, angle_cos, angle_sin = result
+        return self.torch.stack([angle, angleD, angle_cos, angle_sin, position, positionD], dim=-1)
+
+    def rollout(self, s, Q, t_step, intermediate_steps):
+        u = self.cartpole_torch.Q2u(Q)
+        outputs = [s]
+        for i in range(Q.shape[1]):
+            s = self.fine_integration(s, u[:, i], t_step, intermediate_steps)
+            outputs.append(s)
+        return self.torch.stack(outputs, dim=1)
+
+
+def available_backends():
+    backends = [NumpyBackend(), NumbaBackend()]
+    if importlib.util.find_spec('tensorflow') is not None:
+        backends.append(TFBackend())
+    if importlib.util.find_spec('torch') is not None:
+        backends.append(TorchBackend())
+    return backends
+
+
+def random_inputs(batch_size, horizon, seed=0):
+    """Random states (some of them at the track ends, so that the edge bounce is exercised) and control inputs"""
+    rng = np.random.default_rng(seed)
+    s = np.zeros((batch_size, 6), dtype=np.float32)
+    s[:, ANGLE_IDX] = rng.uniform(-np.pi, np.pi, batch_size)
+    s[:, ANGLED_IDX] = rng.uniform(-2.0, 2.0, batch_size)
+    s[:, ANGLE_COS_IDX] = np.cos(s[:, ANGLE_IDX])
+    s[:, ANGLE_SIN_IDX] = np.sin(s[:, ANGLE_IDX])
+    s[:, POSITION_IDX] = rng.uniform(-1.0, 1.0, batch_size) * TrackHalfLength
+    s[:, POSITIOND_IDX] = rng.uniform(-1.0, 1.0, batch_size)
+    Q = rng.uniform(-1.0, 1.0, (batch_size, horizon)).astype(np.float32)
+    return s, Q
+
+
+def max_deviation(result, reference):
+    """Maximal absolute difference, angle difference wrapped to [-π, π]"""
+    difference = np.abs(np.asarray(result, dtype=np.float64) - reference)
+    if reference.shape[-1] == 6:
+        angle_difference = difference[..., ANGLE_IDX]
+        difference[..., ANGLE_IDX] = np.minimum(angle_difference, 2.0 * np.pi - angle_difference)
+    return float(np.max(difference))
+
+
+def benchmark_cases(batch_sizes, horizons, intermediate_steps_list):
+    """
+    All (function, batch size, horizon, intermediate steps) combinations.
+    The ODE does not depend on horizon and intermediate steps, the fine integration does not depend on horizon -
+    these are measured once per batch size / intermediate steps (with horizon and intermediate_steps None).
+    """
+    cases = []
+    for batch_size in batch_sizes:
+        cases.append(('ode', batch_size, None, None))
+        for intermediate_steps in intermediate_steps_list:
+            cases.append(('fine_integration', batch_size, None, intermediate_steps))
+            for horizon in horizons:
+                cases.append(('rollout', batch_size, horizon, intermediate_steps))
+    return cases
+
+
+def run_case(backend, function, batch_size, horizon, intermediate_steps, measure_time=True, repeat=10):
+    """
+    Runs a single case on a backend.
+
+    :returns: (output as numpy array, best time of single call in seconds or None)
+    """
+    s, Q = random_inputs(batch_size, horizon or 1)
+    t_step = np.float32(dt / float(intermediate_steps)) if intermediate_steps else None
+
+    if function == 'ode':
+        args = (backend.to_backend(s), backend.to_backend(Q2u(Q[:, 0])))
+        f = lambda: backend.ode(*args)
+    elif function == 'fine_integration':
+        args = (backend.to_backend(s), backend.to_backend(Q2u(Q[:, 0])), t_step, intermediate_steps)
+        f = lambda: backend.fine_integration(*args)
+    elif function == 'rollout':
+        args = (backend.to_backend(s), backend.to_backend(Q), t_step, intermediate_steps)
+        f = lambda: backend.rollout(*args)
+    else:
+        raise ValueError('Unknown function {}'.format(function))
+
+    output = backend.to_numpy(f())  # Also compiles/traces
+    best_time = None
+    if measure_time:
+        best_time = min(timeit.Timer(lambda: backend.to_numpy(f())).repeat(repeat, 1))
+    return output, best_time
+
+
+def run_benchmark(backends=None, batch_sizes=BATCH_SIZES, horizons=HORIZONS,
+                  intermediate_steps_list=INTERMEDIATE_STEPS, measure_time=True, repeat=10):
+    """
+    Runs all cases on all backends and compares the outputs with numba.
+
+    :returns: list of dicts, one per (backend, case)
+    """
+    if backends is None:
+        backends = available_backends()
+
+    results = []
+    for function, batch_size, horizon, intermediate_steps in benchmark_cases(batch_sizes, horizons, intermediate_steps_list):
+        reference, _ = run_case(NumbaBackend(), function, batch_size, horizon, intermediate_steps, measure_time=False)
+        for backend in backends:
+            output, best_time = run_case(backend, function, batch_size, horizon, intermediate_steps,
+                                         measure_time=measure_time, repeat=repeat)
+            deviation = max_deviation(output, reference)
+            state_updates = batch_size * (horizon or 1) * (intermediate_steps or 1)
+            results.append({
+                'function': function,
+                'backend': backend.name,
+                'batch_size': batch_size,
+                'horizon': horizon,
+                'intermediate_steps': intermediate_steps,
+                'time_ms': best_time * 1.0e3 if best_time is not None else None,
+                'state_updates_per_s': state_updates / best_time if best_time else None,
+                'max_deviation_from_numba': deviation,
+                'tolerance': TOLERANCES[function],
+                'equivalent': deviation <= TOLERANCES[function],
+            })
+    return results
+
+
+def get_metadata():
+    versions = {'numpy': np.__version__}
+    for module_name in ['numba', 'tensorflow', 'torch']:
+        if importlib.util.find_spec(module_name) is not None:
+            versions[module_name] = importlib.import_module(module_name).__version__
+
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_revision': get_git_revision(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'python': platform.python_version(),
+        'versions': versions,
+        'dt': dt,
+    }
+
+
+def save_results(results, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    file_name = 'dynamics_backends_' + datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+
+    path_json = os.path.join(output_dir, file_name + '.json')
+    with open(path_json, 'w') as f:
+        json.dump({'metadata': get_metadata(), 'results': results}, f, indent=2)
+
+    path_csv = os.path.join(output_dir, file_name + '.csv')
+    with open(path_csv, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+    return path_json, path_csv
+
+
+def test_dynamics_backends_equivalence():
+    results = run_benchmark(batch_sizes=[1, 100], horizons=[5], intermediate_steps_list=[1, 10], measure_time=False)
+    not_equivalent = [r for r in results if not r['equivalent']]
+    assert not not_equivalent, not_equivalent
+
+
+# benchmark, which is activated if script is run directly and not as module
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Equivalence and throughput of CartPole dynamics backends.')
+    parser.add_argument('--output_dir', default=os.path.join('Experiment_Recordings', 'Benchmarks'))
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=BATCH_SIZES)
+    parser.add_argument('--horizons', type=int, nargs='+', default=HORIZONS)
+    parser.add_argument('--intermediate_steps', type=int, nargs='+', default=INTERMEDIATE_STEPS)
+    parser.add_argument('--repeat', type=int, default=10, help='Best of repeat calls is reported.')
+    args = parser.parse_args()
+
+    results = run_benchmark(batch_sizes=args.batch_sizes, horizons=args.horizons,
+                            intermediate_steps_list=args.intermediate_steps, repeat=args.repeat)
+
+    print()
+    print('----------------------------------------------------------------------------------')
+    print('{:>16} {:>8} {:>8} {:>8} {:>8} {:>12} {:>16} {:>12}'.format(
+        'function', 'backend', 'batch', 'horizon', 'steps', 'time [ms]', 'updates/s', 'max dev'))
+    for r in results:
+        print('{:>16} {:>8} {:>8} {:>8} {:>8} {:>12.3f} {:>16.3e} {:>12.2e}{}'.format(
+            r['function'], r['backend'], r['batch_size'], str(r['horizon'] or '-'), str(r['intermediate_steps'] or '-'),
+            r['time_ms'], r['state_updates_per_s'], r['max_deviation_from_numba'],
+            '' if r['equivalent'] else '  NOT EQUIVALENT'))
+    print('----------------------------------------------------------------------------------')
+
+    path_json, path_csv = save_results(results, args.output_dir)
+    print('Results saved to {} and {}'.format(path_json, path_csv))
+
+    if not all(r['equivalent'] for r in results):
+        raise SystemExit('Some backends are not equivalent to numba within tolerance.')
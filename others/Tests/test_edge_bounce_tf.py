@@ -0,0 +1,52 @@
+import numpy as np
+import tensorflow as tf
+
+from CartPole.cartpole_numba import cartpole_fine_integration_s_numba, edge_bounce_numba
+from CartPole.cartpole_tf import cartpole_fine_integration_tf, edge_bounce_wrapper
+from CartPole.state_utilities import ANGLE_IDX, ANGLED_IDX, POSITION_IDX, POSITIOND_IDX
+from others.p_globals import L, TrackHalfLength, u_max
+
+batch_size = 1000
+t_step = np.float32(0.002)
+rng = np.random.default_rng(1873)
+
+
+def test_edge_bounce_tf_vs_numba():
+    # Half of the cart positions are beyond the track ends
+    angle = rng.uniform(-np.pi, np.pi, batch_size).astype(np.float32)
+    angle_cos = np.cos(angle)
+    angleD = rng.uniform(-10.0, 10.0, batch_size).astype(np.float32)
+    position = rng.uniform(-2.0 * TrackHalfLength, 2.0 * TrackHalfLength, batch_size).astype(np.float32)
+    positionD = rng.uniform(-2.0, 2.0, batch_size).astype(np.float32)
+
+    expected = np.array([
+        edge_bounce_numba(angle[i], angle_cos[i], angleD[i], position[i], positionD[i], t_step, float(L))
+        for i in range(batch_size)
+    ], dtype=np.float32).T
+
+    result = edge_bounce_wrapper(
+        tf.convert_to_tensor(angle), tf.convert_to_tensor(angle_cos), tf.convert_to_tensor(angleD),
+        tf.convert_to_tensor(position), tf.convert_to_tensor(positionD), t_step, tf.convert_to_tensor(L),
+    )
+    result = np.array([x.numpy() for x in result])
+
+    np.testing.assert_allclose(result, expected, rtol=1e-5, atol=1e-5)
+
+
+def test_fine_integration_with_edge_bounce_tf_vs_numba():
+    # Carts driven against the track ends
+    s = np.zeros((batch_size, 6), dtype=np.float32)
+    s[:, ANGLE_IDX] = rng.uniform(-0.5, 0.5, batch_size)
+    s[:, ANGLED_IDX] = rng.uniform(-1.0, 1.0, batch_size)
+    s[:, POSITION_IDX] = rng.uniform(0.9, 1.0, batch_size) * TrackHalfLength * rng.choice([-1.0, 1.0], batch_size)
+    s[:, POSITIOND_IDX] = np.sign(s[:, POSITION_IDX]) * rng.uniform(0.5, 1.0, batch_size)
+    u = (u_max * np.sign(s[:, POSITION_IDX])).astype(np.float32)
+
+    s_numba = np.copy(s)
+    s_tf = tf.convert_to_tensor(s)
+    for _ in range(5):
+        s_numba = cartpole_fine_integration_s_numba(s_numba, u, t_step, 10, L=float(L))
+        s_tf = cartpole_fine_integration_tf(s_tf, tf.convert_to_tensor(u), t_step, 10)
+
+    assert np.all(np.abs(s_numba[:, POSITION_IDX]) <= 1.05 * TrackHalfLength)
+    np.testing.assert_allclose(s_tf.numpy(), s_numba, rtol=1e-3, atol=1e-3)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from CartPole.state_utilities import create_cartpole_state
+from Control_Toolkit_ASF.Controllers.explicit_mpc_table import ExplicitMPCTable
+
+AXES = [{'name': 'position_error', 'low': -0.4, 'high': 0.4, 'points': 5},
+        {'name': 'angle', 'periodic': True, 'points': 8},
+        {'name': 'Q_previous', 'low': -1.0, 'high': 1.0, 'points': 3}]
+
+
+def _table(function):
+    table = ExplicitMPCTable(AXES)
+    table.values = function(table.grid_points()).reshape(tuple(table.sizes))
+    return table
+
+
+def test_multilinear_exact_and_clipped():
+    table = _table(lambda points: 2.0 * points[:, 0] - points[:, 2] + 3.0 * points[:, 0] * points[:, 2])
+    rng = np.random.default_rng(0)
+    points = np.stack([rng.uniform(-0.4, 0.4, 50), rng.uniform(-np.pi, np.pi, 50), rng.uniform(-1.0, 1.0, 50)], axis=-1)
+    expected = 2.0 * points[:, 0] - points[:, 2] + 3.0 * points[:, 0] * points[:, 2]
+    np.testing.assert_allclose(table.batch(points), expected, atol=1e-12)
+    np.testing.assert_allclose([table(point) for point in points], expected, atol=1e-12)
+    assert table([1.0, 0.0, 0.0]) == pytest.approx(table([0.4, 0.0, 0.0]))
+
+
+def test_periodic_axis_wraps():
+    table = _table(lambda points: np.cos(points[:, 1]))
+    # Between the last grid point (3/4 pi) and the first (-pi = pi)
+    angle = 0.9 * np.pi
+    expected = np.interp(angle, [0.75 * np.pi, np.pi], [np.cos(0.75 * np.pi), -1.0])
+    assert table([0.0, angle, 0.0]) == pytest.approx(expected)
+    assert table([0.0, angle - 2.0 * np.pi, 0.0]) == pytest.approx(expected)
+
+
+def test_features_and_save_load(tmp_path):
+    table = _table(lambda points: points.sum(axis=1))
+    table.metadata = {'dt': 0.02}
+    s = create_cartpole_state({'position': 0.1, 'positionD': 0.5, 'angle': 0.3})
+    np.testing.assert_allclose(table.features(s, target_position=0.15, Q_previous=0.2), [-0.05, 0.3, 0.2])
+    states = np.stack([s, s])
+    assert table.features(states, 0.0, 0.0).shape == (2, 3)
+
+    path = str(tmp_path / 'table.npz')
+    table.save(path)
+    loaded = ExplicitMPCTable.load(path)
+    np.testing.assert_array_equal(loaded.values, table.values)
+    assert loaded.names == table.names and loaded.metadata == {'dt': 0.02}
+    assert loaded([0.1, 1.0, -0.5]) == table([0.1, 1.0, -0.5])
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from CartPole.state_utilities import ANGLE_IDX, POSITION_IDX, create_cartpole_state
+from GymlikeCartPole.reward import FINAL_REWARD, STEP_REWARD, reward, termination
+
+computation_library = pytest.importorskip("SI_Toolkit.computation_library")
+
+X_THRESHOLD = 0.2
+THETA_THRESHOLD = 0.2
+
+
+def _trajectories(batch_size, horizon):
+    return np.tile(create_cartpole_state(), (batch_size, horizon, 1))
+
+
+def test_termination_any_batch_shape():
+    states = _trajectories(2, 3)
+    states[0, 1, POSITION_IDX] = -0.3
+    states[1, 2, ANGLE_IDX] = 0.25
+    terminated = termination(states, X_THRESHOLD, THETA_THRESHOLD)
+    np.testing.assert_array_equal(terminated, [[False, True, False], [False, False, True]])
+    assert not termination(states[0, 0], X_THRESHOLD, THETA_THRESHOLD)
+
+
+def test_reward_of_trajectories():
+    states = _trajectories(3, 4)
+    states[1, 1, ANGLE_IDX] = -0.3  # Falls at the second step, then 'recovers' - no more reward
+    states[2, 3, POSITION_IDX] = 0.3  # Leaves the track at the final time - no final reward
+    times = np.arange(4, dtype=np.float32)
+
+    rewards = reward(computation_library.NumpyLibrary, states, times, 3.0, X_THRESHOLD, THETA_THRESHOLD)
+
+    s, f = STEP_REWARD, FINAL_REWARD
+    np.testing.assert_array_equal(rewards, [[s, s, s, f], [s, s, 0, 0], [s, s, s, s]])
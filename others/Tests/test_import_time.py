@@ -0,0 +1,69 @@
+"""
+Checks that a headless simulation does not import the heavy optional packages
+(TF, matplotlib, pandas, scipy.interpolate, tqdm, gitpython) and benchmarks import times.
+
+Each import is done in a fresh interpreter, so that modules already loaded by pytest or other tests do not matter.
+Modules loaded by Control_Toolkit are not under control of this repository and are excluded from the check.
+
+Run as a script to print import times:
+    python others/Tests/test_import_time.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ['tensorflow', 'matplotlib', 'pandas', 'scipy.interpolate', 'tqdm', 'git', 'torch']
+
+REPOSITORY_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+_NEWLY_IMPORTED_SCRIPT = """
+import json, sys
+import Control_Toolkit.Controllers, Control_Toolkit.others.environment, Control_Toolkit.others.globals_and_utils
+before = set(sys.modules)
+import {module}
+print(json.dumps(sorted(set(sys.modules) - before)))
+"""
+
+_IMPORT_TIME_SCRIPT = """
+from timeit import default_timer
+start = default_timer()
+import {module}
+print(default_timer() - start)
+"""
+
+
+def _run(script):
+    result = subprocess.run([sys.executable, '-c', script], cwd=REPOSITORY_ROOT,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def newly_imported_modules(module):
+    """Modules loaded by importing module in a fresh interpreter, on top of the ones loaded by Control_Toolkit"""
+    return json.loads(_run(_NEWLY_IMPORTED_SCRIPT.format(module=module)))
+
+
+def heavy_modules_imported(module):
+    modules = newly_imported_modules(module)
+    return [heavy for heavy in HEAVY_MODULES if heavy in modules]
+
+
+def import_time(module, repetitions=5):
+    """Minimum over repetitions of the time of importing module in a fresh interpreter, in seconds"""
+    return min(float(_run(_IMPORT_TIME_SCRIPT.format(module=module))) for _ in range(repetitions))
+
+
+def test_headless_import_of_cartpole():
+    assert heavy_modules_imported('CartPole') == []
+
+
+def test_headless_import_of_utilities():
+    for module in ['others.globals_and_utils', 'others.p_globals', 'CartPole.cartpole_numba', 'run_data_generator']:
+        assert heavy_modules_imported(module) == [], module
+
+
+if __name__ == '__main__':
+    for module in ['others.globals_and_utils', 'CartPole.cartpole_numba', 'CartPole', 'run_data_generator']:
+        print('{:>28}: {:7.3f} s, heavy modules: {}'.format(module, import_time(module), heavy_modules_imported(module)))
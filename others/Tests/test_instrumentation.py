@@ -0,0 +1,73 @@
+import json
+
+import numpy as np
+
+from CartPole.instrumentation import ControllerLatencyTracker, Instrumentation, StreamingHistogram
+
+
+def test_streaming_histogram_percentiles():
+    rng = np.random.default_rng(1873)
+    durations = rng.lognormal(mean=np.log(50.0e-6), sigma=0.5, size=100000)
+
+    histogram = StreamingHistogram()
+    for duration in durations:
+        histogram.add(duration)
+
+    assert histogram.count == len(durations)
+    assert histogram.max == durations.max()
+    for q in [50, 90, 99]:
+        # Bin width is about 5%
+        np.testing.assert_allclose(histogram.percentile(q), np.percentile(durations, q), rtol=0.05)
+
+
+def test_instrumentation_export(tmp_path):
+    class Simulation:
+        def step(self):
+            return sum(range(100))
+
+    simulation = Simulation()
+    instrumentation = Instrumentation(enabled=True, max_trace_events=10)
+    instrumentation.instrument_methods(simulation, {'step': 'simulation_step'})
+    for _ in range(20):
+        simulation.step()
+    instrumentation.count('steps', 20)
+
+    assert instrumentation.summary()['simulation_step']['count'] == 20
+
+    instrumentation.export_json(tmp_path / 'summary.json')
+    with open(tmp_path / 'summary.json') as f:
+        summary = json.load(f)
+    assert summary['stages']['simulation_step']['count'] == 20
+    assert summary['counters'] == {'steps': 20}
+
+    instrumentation.export_chrome_trace(tmp_path / 'trace.json')
+    with open(tmp_path / 'trace.json') as f:
+        trace = json.load(f)
+    assert len(trace['traceEvents']) == 10  # Limited by max_trace_events
+    assert all(event['ph'] == 'X' and event['dur'] >= 0.0 for event in trace['traceEvents'])
+
+
+def test_instrumentation_disabled_does_not_wrap():
+    class Simulation:
+        def step(self):
+            pass
+
+    simulation = Simulation()
+    Instrumentation(enabled=False).instrument_methods(simulation, {'step': 'simulation_step'})
+    assert 'step' not in vars(simulation)
+
+
+def test_controller_latency_tracker():
+    tracker = ControllerLatencyTracker('test_controller', deadline=0.02, number_of_spikes=3)
+    latencies = [0.5, 0.001, 0.002, 0.025, 0.001, 0.03, 0.001]  # First call with compilation
+    for step, latency in enumerate(latencies):
+        tracker.add(latency, simulation_time=0.02 * step)
+
+    assert tracker.deadline_misses == 3
+    assert [spike['latency'] for spike in tracker.worst_spikes()] == [0.5, 0.03, 0.025]
+    assert tracker.worst_spikes()[0]['step'] == 0
+    assert tracker.summary()['count'] == len(latencies)
+    assert '>dt: 3/7' in tracker.short_report()
+
+    tracker.reset('other_controller', deadline=0.01)
+    assert tracker.summary()['count'] == 0 and tracker.worst_spikes() == []
@@ -0,0 +1,40 @@
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("PyQt6")  # Imported by the GUI package
+
+from GUI.loop_timer import RingBuffer, loop_timer
+
+
+def test_ring_buffer():
+    buffer = RingBuffer(3)
+    assert buffer.mean() == 0.0
+    for value in [1.0, 2.0, 3.0, 4.0]:
+        buffer.append(value)
+    assert buffer.last == 4.0
+    assert buffer.mean() == pytest.approx(3.0) and buffer.std() == pytest.approx(np.std([2.0, 3.0, 4.0]))
+
+
+def test_no_drift():
+    dt = 0.002
+    looper = loop_timer(dt_target=dt)
+    rng = np.random.default_rng(0)
+    looper.start_loop()
+    start = looper.last_iteration_start_time
+    for _ in range(200):
+        time.sleep(rng.uniform(0.0, 0.5 * dt))  # Computations of the iteration
+        looper.sleep_leftover_time()
+    # Deadlines are absolute: neither the computations nor the sleep overshoot accumulate
+    assert looper.last_iteration_start_time - start == pytest.approx(200 * dt, abs=dt)
+
+
+def test_restarts_schedule_after_overrun():
+    looper = loop_timer(rate_hz=1000.0)
+    looper.start_loop()
+    time.sleep(0.02)
+    looper.sleep_leftover_time()
+    looper.sleep_leftover_time()
+    # Waits a full period after the overrun, not catching up with the missed iterations
+    assert looper.circ_buffer_dt_real.last == pytest.approx(0.001, abs=0.0005)
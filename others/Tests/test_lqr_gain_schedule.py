@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+pytest.importorskip("sympy")
+pytest.importorskip("Control_Toolkit")
+
+from Control_Toolkit_ASF.Controllers.controller_lqr import LQRGainSchedule, lqr_gain
+
+Q = np.diag([10.0, 1.0, 1.0, 1.0])
+R = 10.0
+
+
+def test_gains_at_grid_points_match_direct_solution():
+    schedule = LQRGainSchedule(Q, R, [0.1, 0.4], 7)
+    for L_value in schedule.L_grid[[0, 3, 6]]:
+        np.testing.assert_allclose(schedule.gain(L_value, 1.0), lqr_gain(Q, R, L=L_value)[0][0], rtol=1e-9)
+        np.testing.assert_allclose(schedule.gain(L_value, -1.0),
+                                   lqr_gain(Q, R, L=L_value, equilibrium_angle=np.pi)[0][0], rtol=1e-9)
+
+
+def test_interpolated_gain_close_to_direct_solution_and_clipped():
+    schedule = LQRGainSchedule(Q, R, [0.1, 0.4], 31)
+    L_value = 0.2345
+    np.testing.assert_allclose(schedule.gain(L_value), lqr_gain(Q, R, L=L_value)[0][0], rtol=1e-2)
+    np.testing.assert_array_equal(schedule.gain(1.0), schedule.gain(0.4))
+    np.testing.assert_array_equal(schedule.gain(0.0), schedule.gain(0.1))
+
+
+def test_cache_reused_and_keyed_by_parameters(tmp_path):
+    first = LQRGainSchedule(Q, R, [0.1, 0.4], 5, cache_folder=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 1
+    np.save(os.path.join(tmp_path, os.listdir(tmp_path)[0]), first.gains * 2.0)
+    second = LQRGainSchedule(Q, R, [0.1, 0.4], 5, cache_folder=str(tmp_path))
+    np.testing.assert_array_equal(second.gains, first.gains * 2.0)
+    LQRGainSchedule(Q, 2.0 * R, [0.1, 0.4], 5, cache_folder=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 2
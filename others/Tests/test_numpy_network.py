@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from CartPole.state_utilities import create_cartpole_state
+from SI_Toolkit_ASF.numpy_inference.numpy_network import NumpyNetwork
+
+REPOSITORY_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+PATH_TO_MODELS = os.path.join(REPOSITORY_ROOT, 'Control_Toolkit_ASF', 'Controllers', 'models_for_neural_imitator_tf')
+NET_NAME = 'GRU-6IN-32H1-32H2-1OUT-4'
+
+
+def test_matches_keras_layers():
+    tf = pytest.importorskip('tensorflow')
+    from SI_Toolkit_ASF.numpy_inference.export_network import layers_from_keras_model
+
+    tf.keras.utils.set_random_seed(0)
+    model = tf.keras.Sequential([
+        tf.keras.Input(shape=(None, 4)),
+        tf.keras.layers.Dense(8, activation='tanh'),
+        tf.keras.layers.GRU(16, return_sequences=True),
+        tf.keras.layers.GRU(12, return_sequences=True, reset_after=False),
+        tf.keras.layers.LSTM(10, return_sequences=True),
+        tf.keras.layers.Dense(3),
+    ])
+    for layer in model.layers:  # Biases are zero after initialization
+        layer.set_weights([weight + 0.1 * np.random.default_rng(1).standard_normal(weight.shape).astype(np.float32)
+                           for weight in layer.get_weights()])
+    sequence = np.random.default_rng(2).uniform(-1.0, 1.0, size=(5, 20, 4)).astype(np.float32)
+
+    network = NumpyNetwork(layers_from_keras_model(model), ['a', 'b', 'c', 'd'], ['x', 'y', 'z'])
+    np.testing.assert_allclose(network(sequence), np.asarray(model(sequence)), atol=1e-5)
+
+
+def test_export_of_trained_network(tmp_path):
+    pytest.importorskip('tensorflow')
+    from SI_Toolkit_ASF.numpy_inference.export_network import (export_network, keras_model_from_layers,
+                                                                max_deviation_from_keras)
+
+    path = str(tmp_path / 'network.npz')
+    network, layers, _ = export_network(PATH_TO_MODELS, NET_NAME, path)
+    assert [layer['kind'] for layer in layers] == ['gru', 'gru', 'dense']
+    assert network.outputs == ['Q']
+    assert max_deviation_from_keras(network, keras_model_from_layers(layers, len(network.inputs)), seed=0) < 1e-5
+
+    # Normalization to [-1, 1] of the inputs: angle_cos has min -1 and max 1, position min -0.198 and max 0.198
+    loaded = NumpyNetwork.load(path)
+    x = np.array([[0.0, 1.0, 0.0, 0.198, 0.0, 0.0]], dtype=np.float32)
+    np.testing.assert_allclose(loaded.normalization['input_scale'] * x + loaded.normalization['input_offset'],
+                               [[0.0, 1.0, 0.0, 1.0, 0.0, 0.0]], atol=1e-6)
+    np.testing.assert_array_equal(loaded.step(x), network.step(x))
+
+
+def test_runtime_does_not_import_tensorflow():
+    script = ("import json, sys\n"
+              "import SI_Toolkit_ASF.numpy_inference.numpy_network\n"
+              "print(json.dumps('tensorflow' in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', script], cwd=REPOSITORY_ROOT, capture_output=True, text=True,
+                            check=True)
+    assert json.loads(result.stdout.strip().splitlines()[-1]) is False
+
+
+def test_controller(tmp_path):
+    from Control_Toolkit_ASF.Controllers.controller_neural_imitator_numpy import controller_neural_imitator_numpy
+
+    # Network with the inputs of the imitator: the output is the weighted sum of the normalized inputs
+    inputs = ['angleD', 'angle_cos', 'angle_sin', 'position', 'positionD', 'target_position']
+    weights = np.array([[0.1], [0.0], [-0.5], [0.3], [0.2], [-0.3]], dtype=np.float32)
+    normalization = {'input_scale': np.full(6, 2.0), 'input_offset': np.zeros(6),
+                     'output_scale': np.ones(1), 'output_offset': np.zeros(1)}
+    os.makedirs(str(tmp_path / 'net'))
+    NumpyNetwork([{'kind': 'dense', 'kernel': weights, 'bias': np.zeros(1)}], inputs, ['Q'],
+                 normalization).save(str(tmp_path / 'net' / 'net.npz'))
+
+    controller = controller_neural_imitator_numpy.__new__(controller_neural_imitator_numpy)
+    controller.config_controller = {'PATH_TO_MODELS': str(tmp_path), 'net_name': 'net'}
+    controller.variable_parameters = SimpleNamespace(target_position=0.1)
+    controller.update_attributes = lambda updated_attributes: None
+    controller.action_low, controller.action_high = np.array([-1.0]), np.array([1.0])
+    controller.configure()
+
+    s = create_cartpole_state({'angle': 0.2, 'angleD': 1.0, 'position': 0.05, 'positionD': -0.1})
+    expected = 2.0 * (0.1 * 1.0 - 0.5 * np.sin(0.2) + 0.3 * 0.05 + 0.2 * -0.1 - 0.3 * 0.1)
+    assert controller.step(s) == pytest.approx(expected, abs=1e-6)
+    controller.variable_parameters.target_position = -5.0
+    assert controller.step(s) == 1.0  # Clipped to the action limits
@@ -0,0 +1,60 @@
+import os
+os.environ["CUDA_VISIBLE_DEVICES"] = "-1"  # Benchmark on CPU
+
+import numpy as np
+import tensorflow as tf
+
+from SI_Toolkit.Functions.TF.Compile import CompileTF
+from SI_Toolkit_ASF.predictors_customization_tf import next_state_predictor_ODE_tf
+
+dt = 0.02
+intermediate_steps = 10
+
+
+def predict_step_by_step(predictor, s, Q):
+    """Horizon loop as done by predictor_ODE_tf: step called once per horizon step"""
+    outputs = [s]
+    for i in range(Q.shape[1]):
+        s = predictor.step(s, Q[:, i:i + 1, :][:, 0, :])
+        outputs.append(s)
+    return tf.stack(outputs, axis=1)
+
+
+# speed test, which is activated if script is run directly and not as module
+if __name__ == '__main__':
+    import timeit
+
+    horizons = [10, 35, 50]
+    batch_sizes = [1, 500, 3500]
+
+    print()
+    print('----------------------------------------------------------------------------------')
+    print('Latency per MPPI step (whole horizon for all rollouts) on CPU, ms')
+    print('{:>8} {:>8} {:>16} {:>16} {:>16}'.format('horizon', 'batch', 'step-by-step', 'while_loop', 'unrolled'))
+
+    for horizon in horizons:
+        for batch_size in batch_sizes:
+            s = tf.random.uniform((batch_size, 6), -0.1, 0.1)
+            Q = tf.random.uniform((batch_size, horizon, 1), -1.0, 1.0)
+
+            predictor = next_state_predictor_ODE_tf(dt, intermediate_steps, batch_size)
+            predictor_unrolled = next_state_predictor_ODE_tf(dt, intermediate_steps, batch_size, unroll_horizon=True)
+            step_by_step = CompileTF(lambda s, Q: predict_step_by_step(predictor, s, Q))
+
+            candidates = [
+                lambda: step_by_step(s, Q),
+                lambda: predictor.predict_horizon(s, Q),
+                lambda: predictor_unrolled.predict_horizon(s, Q),
+            ]
+
+            timings = []
+            for f in candidates:
+                f()  # Tracing and XLA compilation
+                timings.append(min(timeit.Timer(lambda: f().numpy()).repeat(20, 1)) * 1.0e3)
+
+            np.testing.assert_allclose(candidates[1]().numpy(), candidates[0]().numpy(), rtol=1e-4, atol=1e-4)
+
+            print('{:>8} {:>8} {:>16.3f} {:>16.3f} {:>16.3f}'.format(horizon, batch_size, *timings))
+
+    print('----------------------------------------------------------------------------------')
+    print()
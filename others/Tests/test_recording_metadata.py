@@ -0,0 +1,49 @@
+import csv
+import io
+
+from CartPole import recording_metadata
+from CartPole.recording_metadata import GIT_REVISION_ENVIRONMENT_VARIABLE, get_git_revision, recording_header
+from others.p_globals import P_GLOBALS
+
+
+def test_git_revision_environment_override(monkeypatch):
+    monkeypatch.setenv(GIT_REVISION_ENVIRONMENT_VARIABLE, 'abc123')
+    get_git_revision.cache_clear()
+    try:
+        assert get_git_revision() == 'abc123'
+        monkeypatch.setenv(GIT_REVISION_ENVIRONMENT_VARIABLE, 'def456')
+        assert get_git_revision() == 'abc123'  # Resolved once per process
+    finally:
+        get_git_revision.cache_clear()
+
+
+def test_recording_header_format(monkeypatch):
+    monkeypatch.setenv(GIT_REVISION_ENVIRONMENT_VARIABLE, 'abc123')
+    get_git_revision.cache_clear()
+    recording_metadata._static_header.cache_clear()
+    try:
+        header = recording_header(10.0, 0.002, 0.02, 0.02, 'mpc', 'rpgd-tf')
+        header_again = recording_header(20.0, 0.002, 0.02, 0.02, 'mpc', 'rpgd-tf')
+        assert recording_metadata._static_header.cache_info().hits == 1
+    finally:
+        get_git_revision.cache_clear()
+        recording_metadata._static_header.cache_clear()
+
+    # Rows as written by save_history_csv row by row
+    expected = io.StringIO(newline='')
+    writer = csv.writer(expected)
+    writer.writerow(['# Done with git-revision: abc123'])
+    writer.writerow(['#'])
+    writer.writerow(['# Length of experiment: 10.0 s'])
+    for row in ['#', '# Time intervals dt:', '# Simulation: 0.002 s', '# Controller update: 0.02 s', '# Saving: 0.02 s',
+                '#', '# Controller: mpc', '# MPC Optimizer: rpgd-tf', '#', '# Parameters:']:
+        writer.writerow([row])
+    for k in P_GLOBALS.__dict__:
+        writer.writerow(['# ' + k + ': ' + str(getattr(P_GLOBALS, k))])
+    writer.writerow(['#'])
+    writer.writerow(['# Data:'])
+
+    first_line, rest = header.split('\r\n', 1)
+    assert first_line.startswith('# This is CartPole simulation from ')
+    assert rest == expected.getvalue()
+    assert '# Length of experiment: 20.0 s' in header_again
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pandas")
+
+from CartPole.replay import ReplayPlayer, ReplayRecording, CACHE_FOLDER_NAME
+
+
+@pytest.fixture
+def recording_path(tmp_path):
+    path = tmp_path / 'recording.csv'
+    time = np.arange(0.0, 1.0, 0.01)
+    with open(path, 'w') as f:
+        f.write('# Controller: lqr\n')
+        f.write('time,angle,position,controller\n')
+        for i, t in enumerate(time):
+            f.write('{:.2f},{},{},lqr\n'.format(t, 0.001 * i, -0.002 * i))
+    return path
+
+
+@pytest.mark.parametrize('memmap', [False, True])
+def test_columns_and_dt(recording_path, memmap):
+    recording = ReplayRecording.from_csv(str(recording_path), memmap=memmap)
+    assert len(recording) == 100 and 'controller' not in recording
+    np.testing.assert_allclose(recording['angle'][10], 0.01, rtol=1e-6)
+    np.testing.assert_allclose(recording.dt, 0.01, rtol=1e-4)
+    assert isinstance(recording['time'], np.memmap) == memmap
+    if memmap:
+        # Second load from the cache
+        assert (recording_path.parent / CACHE_FOLDER_NAME).is_dir()
+        np.testing.assert_array_equal(ReplayRecording.from_csv(str(recording_path), memmap=True)['position'],
+                                      recording['position'])
+
+
+def test_seek_and_playback(recording_path):
+    player = ReplayPlayer(ReplayRecording.from_csv(str(recording_path), memmap=False), min_frame_period=0.001)
+
+    player.seek_time(0.5)
+    assert player.index == 50
+    player.scrub(1.0)
+    assert player.finished
+    player.seek(0)
+
+    # Real time: one row per frame
+    assert player.frame_period(1.0) == pytest.approx(0.01)
+    player.advance(player.frame_period(1.0), 1.0)
+    assert player.index == 1
+
+    # Speed-up 100: the frame is limited by min_frame_period and rows are skipped
+    assert player.frame_period(100.0) == pytest.approx(0.001)
+    player.advance(0.001, 100.0)
+    assert player.index == 11
+
+    # Too slow to keep pace: still at least one row
+    player.advance(0.0, 1.0)
+    assert player.index == 12
+
+    for _ in range(200):
+        if player.finished:
+            break
+        player.advance(0.0, np.inf)
+    assert player.index == 99
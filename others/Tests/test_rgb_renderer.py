@@ -0,0 +1,41 @@
+import numpy as np
+
+from CartPole.state_utilities import ANGLE_IDX, POSITION_IDX, create_cartpole_state
+from GymlikeCartPole.rgb_renderer import POLE_COLOR, TARGET_COLOR, CartPoleRGBRenderer
+from others.p_globals import TrackHalfLength
+
+
+def _pixels_of_color(frame, color):
+    return np.all(frame == color, axis=-1)
+
+
+def test_upright_pole_above_cart():
+    renderer = CartPoleRGBRenderer(x_threshold=0.9 * float(TrackHalfLength), screen_width=600, screen_height=400)
+    state = create_cartpole_state()
+    frame = renderer.render(state, target_position=0.05)
+    assert frame.shape == (400, 600, 3) and frame.dtype == np.uint8
+
+    rows, columns = np.nonzero(_pixels_of_color(frame, POLE_COLOR))
+    assert np.all(rows < renderer.track_row)  # Pole above the track
+    assert abs(columns.mean() - 300) < 1.0  # Centered on the cart in the middle of the screen
+
+    _, target_columns = np.nonzero(_pixels_of_color(frame, TARGET_COLOR))
+    assert abs(target_columns.mean() - renderer.cart_x(0.05)) < 1.0
+
+
+def test_batch_equals_single_and_clipping():
+    renderer = CartPoleRGBRenderer(x_threshold=0.9 * float(TrackHalfLength), screen_width=300, screen_height=200)
+    states = np.tile(create_cartpole_state(), (3, 1))
+    states[:, ANGLE_IDX] = [0.3, -2.0, np.pi]
+    states[:, POSITION_IDX] = [0.0, -0.1, float(TrackHalfLength) * 1.5]  # Last one partially out of the screen
+    target_positions = np.array([0.0, 0.1, -0.1], dtype=np.float32)
+
+    frames = np.copy(renderer.render_batch(states, target_positions))
+    for i in range(3):
+        np.testing.assert_array_equal(frames[i], renderer.render(states[i], target_positions[i]))
+
+    # Pole pointing down (angle -2) and up-left (angle 0.3, counterclockwise)
+    rows, columns = np.nonzero(_pixels_of_color(frames[1], POLE_COLOR))
+    assert rows.max() > renderer.track_row
+    rows, columns = np.nonzero(_pixels_of_color(frames[0], POLE_COLOR))
+    assert columns.mean() < renderer.cart_x(0.0)
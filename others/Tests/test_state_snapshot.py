@@ -0,0 +1,39 @@
+import threading
+
+import numpy as np
+
+from CartPole.state_snapshot import StateSnapshot
+
+
+def test_read_returns_latest_published():
+    snapshot = StateSnapshot()
+    s = np.arange(6, dtype=np.float32)
+    snapshot.publish(s, 0.5, 0.4, 1.0)
+    s[:] = -1.0  # The snapshot is a copy
+    read_s, Q, L, time = snapshot.read()
+    np.testing.assert_array_equal(read_s, np.arange(6))
+    assert (Q, L, time) == (0.5, 0.4, 1.0)
+
+
+def test_reader_never_sees_torn_snapshot():
+    snapshot = StateSnapshot()
+    stop = threading.Event()
+
+    def write():
+        k = 0
+        while not stop.is_set():
+            k += 1
+            snapshot.publish(np.full(6, k), k, k, k)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        last_time = 0
+        for _ in range(20000):
+            s, Q, L, time = snapshot.read()
+            assert np.all(s == time) and Q == time and L == time
+            assert time >= last_time
+            last_time = time
+    finally:
+        stop.set()
+        writer.join()
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+
+from others.sysid_least_squares.sysid_batched import (MultiStepEulerResiduals, cartpole_ode_with_derivatives,
+                                                      multi_start_least_squares, sample_initial_parameters)
+
+P_TRUE = np.array([0.087, 0.23, 0.1975, 6.34, 0.00025, 1.2])
+
+
+def f_cartpole(x, u, p):
+    """Reference: single state loop version of the sysid scripts"""
+    m, M, L, M_fric, J_fric, u_scale = p
+    g, k = 9.81, 4.0 / 3.0
+    ca, sa = np.cos(-x[2]), np.sin(-x[2])
+    positionD, angleD = x[1], x[3]
+    A = m * (ca ** 2) - (k + 1) * (M + m)
+    positionDD = (m * g * sa * ca - ((J_fric * (-angleD) * ca) / L)
+                  - (k + 1) * (m * L * (angleD ** 2) * sa - M_fric * positionD + u * u_scale)) / A
+    angleDD = -((g * sa - positionDD * ca - (J_fric * (-angleD)) / (m * L)) / ((k + 1) * L))
+    return np.array([x[1], positionDD, x[3], angleDD])
+
+
+def _recording(p, length=300, dt=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    time = np.arange(length) * dt
+    u = np.sin(time * 3.0) + 0.3 * rng.normal(size=length)
+    states = np.zeros((length, 4))
+    states[0] = [0.0, 0.0, 3.0, 0.0]  # Hanging pole
+    for i in range(length - 1):
+        states[i + 1] = states[i] + dt * f_cartpole(states[i], u[i], p)
+    return time, states, u
+
+
+def test_ode_and_derivatives():
+    rng = np.random.default_rng(1)
+    x = rng.normal(size=(5, 4))
+    u = rng.normal(size=5)
+    f, f_x, f_p = cartpole_ode_with_derivatives(x, u, P_TRUE)
+    np.testing.assert_allclose(f, [f_cartpole(x[i], u[i], P_TRUE) for i in range(5)], rtol=1e-10)
+
+    eps = 1e-7
+    for j in range(4):
+        dx = np.zeros(4)
+        dx[j] = eps
+        numerical = (cartpole_ode_with_derivatives(x + dx, u, P_TRUE)[0] - cartpole_ode_with_derivatives(x - dx, u, P_TRUE)[0]) / (2 * eps)
+        np.testing.assert_allclose(f_x[:, :, j], numerical, rtol=1e-5, atol=1e-6)
+    for j in range(6):
+        dp = np.zeros(6)
+        dp[j] = eps * P_TRUE[j]
+        numerical = (cartpole_ode_with_derivatives(x, u, P_TRUE + dp)[0] - cartpole_ode_with_derivatives(x, u, P_TRUE - dp)[0]) / (2 * dp[j])
+        np.testing.assert_allclose(f_p[:, :, j], numerical, rtol=1e-5, atol=1e-6)
+
+
+def test_jacobian_matches_finite_differences():
+    time, states, u = _recording(P_TRUE)
+    problem = MultiStepEulerResiduals(time, states, u, steps=10, weights=(100.0, 1.0, 1.0, 1.0))
+    p = P_TRUE * 1.1
+    jacobian = problem.jacobian(p)
+    for j in range(6):
+        dp = np.zeros(6)
+        dp[j] = 1e-6 * p[j]
+        numerical = (problem.residuals(p + dp) - problem.residuals(p - dp)) / (2 * dp[j])
+        np.testing.assert_allclose(jacobian[:, j], numerical, rtol=1e-4, atol=1e-4)
+
+
+def test_multi_start_recovers_parameters():
+    time, states, u = _recording(P_TRUE)
+    problem = MultiStepEulerResiduals(time, states, u, steps=20, input_offset=0)
+    bounds = ([0.001] * 6, [1e5] * 6)
+    p_0s = sample_initial_parameters(P_TRUE, 4, bounds=bounds, spread=1.5, rng=0)
+    results = multi_start_least_squares(problem, p_0s, processes=2, bounds=bounds)
+    assert results[0].cost <= results[-1].cost
+    assert results[0].cost < 1e-12
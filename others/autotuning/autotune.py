@@ -0,0 +1,380 @@
+"""
+Automatic tuning of controller gains by closed-loop simulation.
+
+Each candidate set of gains is scored by simulating the same episodes (initial states and targets drawn once from
+the seed) with it and averaging a weighted sum of metrics over them. A whole population of candidates is simulated
+together as one batch of cartpoles (candidates x episodes) with the batched step of the controller,
+optionally split between processes. The candidates are searched on a log scale with CMA-ES or Bayesian optimization.
+
+Run from the CartPoleSimulation folder:
+    python -m others.autotuning.autotune
+Settings are in others/autotuning/config_autotuning.yml.
+"""
+
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import yaml
+
+from CartPole.cartpole_model import Q2u
+from CartPole.cartpole_numba import cartpole_fine_integration_s_numba
+from CartPole.state_utilities import (ANGLE_COS_IDX, ANGLE_IDX, ANGLE_SIN_IDX, ANGLED_IDX, POSITION_IDX,
+                                      POSITIOND_IDX, STATE_VARIABLES)
+from others.globals_and_utils import load_config
+from others.p_globals import TrackHalfLength
+
+FAILURE_SCORE = 1.0e3  # Score of candidates whose simulation diverged or whose gains could not be computed
+
+
+# Metrics: value for each simulated cartpole from states (steps + 1 x N x 6), lower is better
+
+def mean_abs_angle(states, target_positions, dt):
+    return np.mean(np.abs(states[..., ANGLE_IDX]), axis=0)
+
+
+def mean_abs_position_error(states, target_positions, dt):
+    return np.mean(np.abs(states[..., POSITION_IDX] - target_positions), axis=0)
+
+
+def swing_up_time(states, target_positions, dt, swing_up_angle=np.deg2rad(10.0)):
+    """Time after which the pole stays within swing_up_angle of up, the episode length if it is not up at the end"""
+    outside = np.abs(states[..., ANGLE_IDX]) > swing_up_angle
+    last_outside = np.where(outside.any(axis=0), len(outside) - 1 - np.argmax(outside[::-1], axis=0), -1)
+    return (last_outside + 1) * dt
+
+
+METRICS = {
+    'mean_abs_angle': mean_abs_angle,
+    'mean_abs_position_error': mean_abs_position_error,
+    'swing_up_time': swing_up_time,
+}
+
+
+# Batched control of all simulated cartpoles, one candidate per block of number_of_episodes rows
+
+def pid_control(parameters, number_of_episodes, target_positions):
+    from Control_Toolkit_ASF.Controllers.controller_pid import BatchedPID
+
+    gains = {name: np.repeat(values, number_of_episodes) for name, values in parameters.items()}
+    pid = BatchedPID(len(target_positions),
+                     gains['P_position'], gains['I_position'], gains['D_position'],
+                     gains['P_angle'], gains['I_angle'], gains['D_angle'])
+    return lambda s, time: pid.step(s, target_positions, time)
+
+
+def lqr_control(parameters, number_of_episodes, target_positions):
+    from Control_Toolkit_ASF.Controllers.controller_lqr import lqr_gain
+
+    K = []
+    for i in range(len(parameters['R'])):
+        Q = np.diag([parameters[name][i] for name in ('Q_position', 'Q_positionD', 'Q_angle', 'Q_angleD')])
+        try:
+            K.append(lqr_gain(Q, parameters['R'][i])[0][0])
+        except (ValueError, np.linalg.LinAlgError):
+            K.append(np.full(4, np.nan))  # Scored as failure
+    K = np.repeat(np.array(K), number_of_episodes, axis=0)
+
+    def control(s, time):
+        state = np.stack(
+            [s[:, POSITION_IDX] - target_positions, s[:, POSITIOND_IDX], s[:, ANGLE_IDX], s[:, ANGLED_IDX]], axis=-1)
+        return -np.sum(K * state, axis=-1)
+
+    return control
+
+
+CONTROLLERS = {
+    'pid': pid_control,
+    'lqr': lqr_control,
+}
+
+
+def initial_parameters(controller, config_controllers):
+    """Current gains of the controller in config_controllers.yml, named as in config_autotuning.yml"""
+    config = config_controllers[controller]
+    if controller == 'lqr':
+        return dict(zip(('Q_position', 'Q_positionD', 'Q_angle', 'Q_angleD'), config['Q']), R=config['R'])
+    return {name: config[name] for name in ('P_angle', 'I_angle', 'D_angle', 'P_position', 'I_position', 'D_position')}
+
+
+def random_episodes(number_of_episodes, init_limits, target_position_limit, rng):
+    """Initial states (number_of_episodes x 6) and constant target positions drawn uniformly within the limits"""
+    states = np.zeros((number_of_episodes, len(STATE_VARIABLES)), dtype=np.float32)
+    side = np.where(rng.uniform(size=number_of_episodes) > 0.5, 1.0, -1.0)
+    states[:, ANGLE_IDX] = side * np.deg2rad(rng.uniform(*init_limits['angle'], size=number_of_episodes))
+    states[:, ANGLED_IDX] = np.deg2rad(rng.uniform(-1.0, 1.0, size=number_of_episodes) * init_limits['angleD'])
+    states[:, POSITION_IDX] = rng.uniform(-1.0, 1.0, size=number_of_episodes) * TrackHalfLength * init_limits['position']
+    states[:, POSITIOND_IDX] = rng.uniform(-1.0, 1.0, size=number_of_episodes) * TrackHalfLength * init_limits['positionD']
+    states[:, ANGLE_COS_IDX] = np.cos(states[:, ANGLE_IDX])
+    states[:, ANGLE_SIN_IDX] = np.sin(states[:, ANGLE_IDX])
+    target_positions = rng.uniform(-1.0, 1.0, size=number_of_episodes) * TrackHalfLength * target_position_limit
+    return states, target_positions.astype(np.float32)
+
+
+def simulate(control, initial_states, steps, dt_simulation, intermediate_steps):
+    """Closed-loop trajectories (steps + 1 x N x 6) of N cartpoles, control(s, time) returning N inputs Q"""
+    states = np.empty((steps + 1,) + initial_states.shape, dtype=np.float32)
+    states[0] = initial_states
+    dt = dt_simulation * intermediate_steps
+    for i in range(steps):
+        Q = np.clip(control(states[i], i * dt), -1.0, 1.0).astype(np.float32)
+        states[i + 1] = cartpole_fine_integration_s_numba(states[i], Q2u(Q), dt_simulation, intermediate_steps)
+    return states
+
+
+class ClosedLoopEvaluation:
+    """
+    Scores of candidate parameters (dict name: array of candidates), all simulated in one batch on the same episodes.
+    Picklable, so that parts of a population can be evaluated in other processes.
+    """
+
+    def __init__(self, controller, initial_states, target_positions, steps, dt_simulation, intermediate_steps,
+                 metric_weights, swing_up_angle=np.deg2rad(10.0)):
+        self.controller = controller
+        self.initial_states = initial_states
+        self.target_positions = target_positions
+        self.steps = steps
+        self.dt_simulation = dt_simulation
+        self.intermediate_steps = intermediate_steps
+        self.metric_weights = {name: weight for name, weight in metric_weights.items() if weight}
+        self.swing_up_angle = swing_up_angle
+
+    def __call__(self, parameters):
+        number_of_candidates = len(next(iter(parameters.values())))
+        number_of_episodes = len(self.initial_states)
+        target_positions = np.tile(self.target_positions, number_of_candidates)
+        control = CONTROLLERS[self.controller](parameters, number_of_episodes, target_positions)
+
+        with np.errstate(invalid='ignore', over='ignore'):
+            states = simulate(control, np.tile(self.initial_states, (number_of_candidates, 1)), self.steps,
+                              self.dt_simulation, self.intermediate_steps)
+
+        dt = self.dt_simulation * self.intermediate_steps
+        scores = np.zeros(number_of_candidates)
+        for name, weight in self.metric_weights.items():
+            metric = METRICS[name]
+            if name == 'swing_up_time':
+                metric = partial(metric, swing_up_angle=self.swing_up_angle)
+            values = metric(states, target_positions, dt).reshape(number_of_candidates, number_of_episodes)
+            scores += weight * values.mean(axis=1)
+        diverged = ~np.isfinite(states).all(axis=(0, 2)).reshape(number_of_candidates, number_of_episodes).all(axis=1)
+        return np.where(diverged | ~np.isfinite(scores), FAILURE_SCORE, scores)
+
+
+class CMAES:
+    """
+    Covariance matrix adaptation evolution strategy, (mu/mu_w, lambda) with the default settings of
+    Hansen, The CMA Evolution Strategy: A Tutorial (2016).
+    Points outside the bounds are evaluated at the closest point within them
+    and their score penalized by their squared distance to it.
+    """
+
+    def __init__(self, x0, sigma0, population_size=None, rng=None, bounds=None):
+        self.rng = np.random.default_rng(rng)
+        self.mean = np.array(x0, dtype=np.float64)
+        self.sigma = float(sigma0)
+        self.bounds = bounds
+        n = len(self.mean)
+        self.population_size = population_size or 4 + int(3 * np.log(n))
+        self.mu = self.population_size // 2
+
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mu_eff = 1.0 / np.sum(self.weights ** 2)
+
+        self.c_c = (4.0 + self.mu_eff / n) / (n + 4.0 + 2.0 * self.mu_eff / n)
+        self.c_sigma = (self.mu_eff + 2.0) / (n + self.mu_eff + 5.0)
+        self.c_1 = 2.0 / ((n + 1.3) ** 2 + self.mu_eff)
+        self.c_mu = min(1.0 - self.c_1, 2.0 * (self.mu_eff - 2.0 + 1.0 / self.mu_eff) / ((n + 2.0) ** 2 + self.mu_eff))
+        self.d_sigma = 1.0 + 2.0 * max(0.0, np.sqrt((self.mu_eff - 1.0) / (n + 1.0)) - 1.0) + self.c_sigma
+        self.chi_n = np.sqrt(n) * (1.0 - 1.0 / (4.0 * n) + 1.0 / (21.0 * n ** 2))
+
+        self.p_c = np.zeros(n)
+        self.p_sigma = np.zeros(n)
+        self.C = np.eye(n)
+        self.generation = 0
+        self._eigen()
+
+    def _eigen(self):
+        self.C = (self.C + self.C.T) / 2.0
+        eigenvalues, self.B = np.linalg.eigh(self.C)
+        self.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+    def ask(self, number=None):
+        z = self.rng.standard_normal((number or self.population_size, len(self.mean)))
+        return self.mean + self.sigma * (z * self.D) @ self.B.T
+
+    def tell(self, xs, scores):
+        xs, scores = np.asarray(xs), np.asarray(scores, dtype=np.float64)
+        if self.bounds is not None:
+            scores = scores + np.sum((xs - np.clip(xs, *self.bounds)) ** 2, axis=1)
+        n = len(self.mean)
+        y = (xs[np.argsort(scores)[:self.mu]] - self.mean) / self.sigma
+        y_w = self.weights @ y
+        self.mean = self.mean + self.sigma * y_w
+
+        C_inverse_sqrt = self.B @ np.diag(1.0 / self.D) @ self.B.T
+        self.p_sigma = ((1.0 - self.c_sigma) * self.p_sigma
+                        + np.sqrt(self.c_sigma * (2.0 - self.c_sigma) * self.mu_eff) * C_inverse_sqrt @ y_w)
+        self.generation += 1
+        h_sigma = (np.linalg.norm(self.p_sigma) / np.sqrt(1.0 - (1.0 - self.c_sigma) ** (2 * self.generation))
+                   < (1.4 + 2.0 / (n + 1.0)) * self.chi_n)
+        self.p_c = (1.0 - self.c_c) * self.p_c + h_sigma * np.sqrt(self.c_c * (2.0 - self.c_c) * self.mu_eff) * y_w
+
+        rank_mu = (self.weights[:, np.newaxis] * y).T @ y
+        self.C = ((1.0 - self.c_1 - self.c_mu) * self.C
+                  + self.c_1 * (np.outer(self.p_c, self.p_c) + (1.0 - h_sigma) * self.c_c * (2.0 - self.c_c) * self.C)
+                  + self.c_mu * rank_mu)
+        self.sigma *= np.exp(self.c_sigma / self.d_sigma * (np.linalg.norm(self.p_sigma) / self.chi_n - 1.0))
+        self._eigen()
+
+
+class BayesianOptimization:
+    """
+    Gaussian process (Matern 5/2) surrogate of the score within the bounds, new points where the expected improvement
+    is maximal among random samples. Several points per ask are chosen one after the other,
+    assuming for the points already chosen the best score so far ("constant liar").
+    The first points are the initial ones, then random ones till there are twice as many scores as dimensions.
+    """
+
+    def __init__(self, bounds, rng=None, initial_points=(), number_of_samples=2000):
+        self.rng = np.random.default_rng(rng)
+        self.lower, self.upper = (np.asarray(bound, dtype=np.float64) for bound in bounds)
+        self.initial_points = [np.asarray(point, dtype=np.float64) for point in initial_points]
+        self.number_of_samples = number_of_samples
+        self.xs = np.empty((0, len(self.lower)))
+        self.scores = np.empty(0)
+
+    def _normalize(self, xs):
+        return (xs - self.lower) / (self.upper - self.lower)
+
+    def ask(self, number):
+        from scipy.stats import norm
+        from sklearn.exceptions import ConvergenceWarning
+        from sklearn.gaussian_process import GaussianProcessRegressor
+        from sklearn.gaussian_process.kernels import ConstantKernel, Matern, WhiteKernel
+
+        n = len(self.lower)
+        points = self.initial_points[:number]
+        self.initial_points = self.initial_points[number:]
+        if len(self.scores) + len(points) < 2 * n:
+            random_points = self.rng.uniform(self.lower, self.upper, size=(number - len(points), n))
+            return np.array(points + list(random_points))
+
+        xs, scores = self._normalize(self.xs), self.scores
+        for _ in range(number - len(points)):
+            gp = GaussianProcessRegressor(ConstantKernel() * Matern(length_scale=np.full(n, 0.3), nu=2.5) + WhiteKernel(),
+                                          normalize_y=True, random_state=int(self.rng.integers(2 ** 31)))
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', ConvergenceWarning)  # Hyperparameters at their bounds are fine here
+                gp.fit(xs, scores)
+            samples = self.rng.uniform(size=(self.number_of_samples, n))
+            mean, std = gp.predict(samples, return_std=True)
+            improvement = scores.min() - mean
+            z = improvement / np.maximum(std, 1e-12)
+            expected_improvement = improvement * norm.cdf(z) + std * norm.pdf(z)
+            best = samples[np.argmax(expected_improvement)]
+            points.append(self.lower + best * (self.upper - self.lower))
+            xs, scores = np.vstack((xs, best)), np.append(scores, scores.min())
+        return np.array(points)
+
+    def tell(self, xs, scores):
+        self.xs = np.vstack((self.xs, xs))
+        self.scores = np.append(self.scores, scores)
+
+
+def evaluate_population(evaluation, names, parameters, executor=None, processes=1):
+    """Scores of parameters (candidates x len(names)), split between the processes of the executor if given"""
+    if executor is None:
+        return evaluation(dict(zip(names, parameters.T)))
+    chunks = np.array_split(parameters, processes)
+    chunks = [dict(zip(names, chunk.T)) for chunk in chunks if len(chunk)]
+    return np.concatenate(list(executor.map(evaluation, chunks)))
+
+
+def autotune(evaluation, names, lower, upper, initial, optimizer='cma_es', iterations=40, population_size=16,
+             sigma0=0.5, processes=1, seed=None, verbose=True):
+    """
+    Searches the parameters (names, bounds lower and upper, initial values) minimizing the score of the evaluation,
+    on a log scale. Returns the best parameters as a dict, their score and the history (parameters, scores).
+    """
+    rng = np.random.default_rng(seed)
+    bounds = np.log(np.asarray(lower, dtype=np.float64)), np.log(np.asarray(upper, dtype=np.float64))
+    x0 = np.clip(np.log(np.asarray(initial, dtype=np.float64)), *bounds)
+    if optimizer == 'cma_es':
+        search = CMAES(x0, sigma0, population_size, rng, bounds=bounds)
+    elif optimizer == 'bayesian':
+        search = BayesianOptimization(bounds, rng, initial_points=[x0])
+    else:
+        raise ValueError("Unknown optimizer '{}', use 'cma_es' or 'bayesian'".format(optimizer))
+
+    history_parameters, history_scores = [], []
+    executor = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+    try:
+        for iteration in range(iterations):
+            xs = search.ask(population_size)
+            parameters = np.exp(np.clip(xs, *bounds))
+            scores = evaluate_population(evaluation, names, parameters, executor, processes)
+            search.tell(xs, scores)
+            history_parameters.append(parameters)
+            history_scores.append(scores)
+            if verbose:
+                print('Iteration {}/{}: best score {:.5f} in population, {:.5f} so far'
+                      .format(iteration + 1, iterations, scores.min(), np.min(np.concatenate(history_scores))))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    history_parameters, history_scores = np.concatenate(history_parameters), np.concatenate(history_scores)
+    best = np.argmin(history_scores)
+    best_parameters = {name: float(value) for name, value in zip(names, history_parameters[best])}
+    return best_parameters, float(history_scores[best]), (history_parameters, history_scores)
+
+
+def run_autotuning(config=None):
+    if config is None:
+        config = load_config(os.path.join("others", "autotuning", "config_autotuning.yml"))
+    config_dt = load_config("config_data_gen.yml")["dt"]
+    config_controllers = load_config(os.path.join("Control_Toolkit_ASF", "config_controllers.yml"))
+
+    controller = config["controller"]
+    if controller not in CONTROLLERS:
+        raise ValueError("Autotuning is implemented for {}, not for '{}'".format(list(CONTROLLERS), controller))
+
+    rng = np.random.default_rng(config["seed"])
+    initial_states, target_positions = random_episodes(
+        config["episodes"], config["init_limits"], config["target_position_limit"], rng)
+    dt_simulation = config_dt["simulation"]
+    intermediate_steps = int(round(config_dt["control"] / config_dt["simulation"]))
+    steps = int(round(config["length_of_episode"] / (dt_simulation * intermediate_steps)))
+    evaluation = ClosedLoopEvaluation(controller, initial_states, target_positions, steps, dt_simulation,
+                                      intermediate_steps, config["metric"], np.deg2rad(config["swing_up_angle"]))
+
+    parameter_bounds = config["parameters"][controller]
+    names = list(parameter_bounds)
+    initial = initial_parameters(controller, config_controllers)
+    initial_score = evaluate_population(evaluation, names, np.array([[initial[name] for name in names]]))[0]
+    print('Score of the gains in config_controllers.yml: {:.5f}'.format(initial_score))
+
+    best_parameters, best_score, _ = autotune(
+        evaluation, names,
+        lower=[parameter_bounds[name][0] for name in names], upper=[parameter_bounds[name][1] for name in names],
+        initial=[initial[name] for name in names], optimizer=config["optimizer"], iterations=config["iterations"],
+        population_size=config["population_size"], sigma0=config["sigma0"], processes=config["processes"],
+        seed=rng)
+
+    result = {'controller': controller, 'score': best_score, 'initial_score': float(initial_score),
+              'parameters': best_parameters}
+    print('Best score {:.5f} with parameters:'.format(best_score))
+    print(yaml.dump(best_parameters, sort_keys=False))
+    if config["output_file"]:
+        with open(config["output_file"], 'w') as f:
+            yaml.dump(result, f, sort_keys=False)
+        print('Saved to {}'.format(config["output_file"]))
+    return result
+
+
+if __name__ == '__main__':
+    run_autotuning()
@@ -0,0 +1,153 @@
+"""
+Builds the lookup table of controller_do_mpc_explicit: solves controller_do_mpc at all grid points
+(in parallel processes) and reports the error of the interpolated table against do-mpc solved at random points.
+
+Run from the CartPoleSimulation folder:
+    python -m others.explicit_mpc.build_explicit_mpc
+Settings are in others/explicit_mpc/config_explicit_mpc.yml, do-mpc is configured as in config_controllers.yml.
+The report is saved next to the table (.yml).
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from timeit import default_timer as timer
+
+import numpy as np
+import yaml
+
+from CartPole.state_utilities import create_cartpole_state
+from Control_Toolkit_ASF.Controllers.explicit_mpc_table import ExplicitMPCTable
+from others.globals_and_utils import load_config
+
+_controller = None  # do-mpc of this process, set up once
+
+
+def offline_controller(dt, max_iter=None):
+    global _controller
+    if _controller is None:
+        from Control_Toolkit_ASF.Controllers.controller_do_mpc import controller_do_mpc
+        _controller = controller_do_mpc(
+            dt=dt,
+            environment_name="CartPole",
+            initial_environment_attributes={"target_position": 0.0, "target_equilibrium": 1.0, "L": 0.0},
+            control_limits=(np.array([-1.0]), np.array([1.0])),
+        )
+        # Bounds the time spent at points where IPOPT does not converge from the cold start (e.g. cart pole horizontal)
+        _controller.config_controller['max_iter'] = max_iter
+        _controller.configure()
+    return _controller
+
+
+def solve_do_mpc(points, names, dt, max_iter=None):
+    """
+    First action of do-mpc at each point (number of points x len(names)), each solved from scratch,
+    and whether IPOPT converged there
+    """
+    controller = offline_controller(dt, max_iter)
+    actions = np.empty(len(points))
+    successes = np.empty(len(points), dtype=bool)
+    for n, point in enumerate(points):
+        features = dict(zip(names, point))
+        state = {'position': features.get('position_error', 0.0), 'positionD': features.get('positionD', 0.0),
+                 'angle': features.get('angle', 0.0), 'angleD': features.get('angleD', 0.0)}
+        s = create_cartpole_state(dict(state))
+
+        # Initial guess at the state of the point and no memory of the previous solution, independent of the order
+        for name, value in state.items():
+            controller.x0['s.' + name] = value
+        controller.mpc.x0 = controller.x0
+        controller.mpc.u0['Q'] = features.get('Q_previous', 0.0)  # Input penalized by the change from it
+        controller.mpc.set_initial_guess()
+        controller.solver.reset()
+
+        actions[n] = controller.step(s, updated_attributes={'target_position': 0.0})
+        successes[n] = controller.solver.successes[-1]
+    return actions, successes
+
+
+def solve_do_mpc_parallel(points, names, dt, processes=None, max_iter=None):
+    processes = processes or os.cpu_count()
+    chunks = np.array_split(points, min(len(points), 16 * processes))
+    actions, successes = [], []
+    start = timer()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for chunk_actions, chunk_successes in executor.map(solve_do_mpc, chunks, [names] * len(chunks),
+                                                           [dt] * len(chunks), [max_iter] * len(chunks)):
+            actions.append(chunk_actions)
+            successes.append(chunk_successes)
+            print('\rSolved do-mpc at {}/{} points, {:.0f} s'.format(
+                sum(map(len, actions)), len(points), timer() - start), end='', flush=True)
+    print()
+    return np.concatenate(actions), np.concatenate(successes)
+
+
+def build_table(axes, dt, processes=None, config_do_mpc=None, max_iter=None):
+    """
+    Table of do-mpc at the grid points of axes. Where IPOPT did not converge the last iterate is kept,
+    the fraction of such points is in metadata['failed_fraction'].
+    """
+    table = ExplicitMPCTable(axes, metadata={'dt': dt, 'do-mpc': config_do_mpc, 'max_iter': max_iter,
+                                             'created': datetime.now().isoformat()})
+    values, successes = solve_do_mpc_parallel(table.grid_points(), table.names, dt, processes, max_iter)
+    table.values = values.reshape(tuple(table.sizes))
+    table.metadata['failed_fraction'] = float(1.0 - successes.mean())
+    if not successes.all():
+        print('do-mpc did not converge at {} of {} grid points'.format(np.sum(~successes), len(successes)))
+    return table
+
+
+def approximation_error_report(table, dt, samples=1000, seed=None, processes=None, max_iter=None):
+    """Error of the table against do-mpc at random points within the axes, and time per action of both"""
+    rng = np.random.default_rng(seed)
+    upper = table.lower + table.step * np.where(table.periodic, table.sizes, table.sizes - 1)
+    points = rng.uniform(table.lower, upper, size=(samples, len(table.names)))
+
+    online, successes = solve_do_mpc_parallel(points, table.names, dt, processes, max_iter)
+    approximation = table.batch(points)
+    # Points where do-mpc itself failed are no reference for the table
+    error = np.abs(approximation - online)[successes]
+
+    table(points[0])  # Compilation not timed
+    start = timer()
+    for point in points:
+        table(point)
+    table_time = (timer() - start) / samples
+    start = timer()
+    solve_do_mpc(points[:20], table.names, dt, max_iter)
+    online_time = (timer() - start) / 20
+
+    return {
+        'samples': samples,
+        'do_mpc_failed_samples': int(np.sum(~successes)),
+        'mean_abs_error': float(error.mean()),
+        'rmse': float(np.sqrt(np.mean(error ** 2))),
+        'p95_abs_error': float(np.percentile(error, 95)),
+        'max_abs_error': float(error.max()),
+        'opposite_sign_fraction': float(np.mean((np.sign(approximation) != np.sign(online))[successes])),
+        'table_time_us': table_time * 1e6,
+        'do_mpc_time_ms': online_time * 1e3,
+    }
+
+
+def run_build_explicit_mpc(config=None):
+    if config is None:
+        config = load_config(os.path.join("others", "explicit_mpc", "config_explicit_mpc.yml"))
+    dt = load_config("config_data_gen.yml")["dt"]["control"]
+    config_do_mpc = load_config(os.path.join("Control_Toolkit_ASF", "config_controllers.yml"))["do-mpc"]
+
+    table = build_table(config["axes"], dt, config["processes"], config_do_mpc, config["max_iter"])
+    os.makedirs(os.path.dirname(os.path.abspath(config["table_path"])), exist_ok=True)
+    table.save(config["table_path"])
+    print('Saved explicit MPC table ({} points) to {}'.format(table.values.size, config["table_path"]))
+
+    report = approximation_error_report(table, dt, config["error_report"]["samples"], config["error_report"]["seed"],
+                                        config["processes"], config["max_iter"])
+    print(yaml.dump(report, sort_keys=False))
+    with open(os.path.splitext(config["table_path"])[0] + '_report.yml', 'w') as f:
+        yaml.dump(report, f, sort_keys=False)
+    return table, report
+
+
+if __name__ == '__main__':
+    run_build_explicit_mpc()
@@ -17,9 +17,7 @@ import atexit
 import os
 
 import numpy as np
-import tensorflow as tf
 from engineering_notation import EngNumber as eng  # only from pip
-from matplotlib import pyplot as plt
 from numpy.random import SFC64, Generator
 
 if os.name == 'nt':
@@ -200,6 +198,7 @@ def create_rng(id: str, seed: str, use_tf: bool=False):
         seed = int((datetime.now() - datetime(1970, 1, 1)).total_seconds() * 1000.0)  # Fully random
     
     if use_tf:
+        import tensorflow as tf  # Imported only when needed - numpy-only users do not load TF
         return tf.random.Generator.from_seed(seed=seed)
     else:
         return Generator(SFC64(seed=seed))
@@ -304,6 +303,7 @@ def print_timing_info():
                 log.error(f'could not save numpy file {timers[k].numpy_file}; caught {e}')
 
         if timers[k].show_hist:
+            from matplotlib import pyplot as plt
 
             def plot_loghist(x, bins):
                 hist, bins = np.histogram(x, bins=bins) # histogram x linearly
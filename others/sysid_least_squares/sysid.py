@@ -8,6 +8,8 @@ from scipy.integrate import solve_ivp
 from scipy.interpolate import interp1d
 from scipy.optimize import least_squares
 
+from sysid_batched import MultiStepEulerResiduals
+
 def read_data(file):
     data = []
     with open(file, newline='') as csvfile:
@@ -120,45 +122,15 @@ def solve_cartpole_auto_ic(y, p, start_idx=0):
 
 # Save off parameters for plotting evolution
 p_saved = []
-def cartpole_residuals_multi_step(y, p, start_idx=0, end_idx=-1, steps=25):
-    p_saved.append(p)
-    residuals = []
-    if end_idx == -1:
-        end_idx = len(y)
+def cartpole_multi_step_problem(y, start_idx=0, end_idx=-1, steps=25):
+    """Residuals of all segments integrated as one batch, with analytic Jacobian (see sysid_batched.py)"""
+    states = y[:, [n_to_c['position'], n_to_c['positionD'], n_to_c['angle'], n_to_c['angleD']]]
+    return MultiStepEulerResiduals(y[:, n_to_c['time']], states, y[:, n_to_c['u']], start_idx, end_idx,
+                                   steps=steps, stride=steps, weights=(100.0, 1.0, 1.0, 1.0),
+                                   parameters_history=p_saved)
 
-    for i in range(start_idx, end_idx-1-steps, steps):
-        x_0 = [y[i, n_to_c['position']],
-               y[i, n_to_c['positionD']],
-               y[i, n_to_c['angle']],
-               y[i, n_to_c['angleD']]]
-        #print('start_point') 
-        for j in range(0, steps):
-            u = y[i+j, n_to_c['u']]
-            dx_dt = f_cartpole(x_0, u, p)
-            
-            dt = y[i+j+1, n_to_c['time']] - y[i+j, n_to_c['time']]
-            x_1_obsv = [y[i+j+1, n_to_c['position']],
-                        y[i+j+1, n_to_c['positionD']],
-                        y[i+j+1, n_to_c['angle']],
-                        y[i+j+1, n_to_c['angleD']]]
-            x_1_pred = x_0 + dt * dx_dt
-            wrap_angle_rad_inplace(x_1_pred[2:3])
-            residual = x_1_pred - x_1_obsv
-            residual[0] *= 100.0
-            residual[2] = angle_distance(x_1_pred[2], x_1_obsv[2])
-            #dca = np.cos(x_1_pred[2]) - np.cos(x_1_obsv[2])
-            #dsa = np.sin(x_1_pred[2]) - np.sin(x_1_obsv[2])
-            #print('hi')
-            #print(dx_dt)
-            #print(x_1_pred)
-            residuals.extend(residual)
-            #residuals.append(residual[0])
-            #residuals.extend([dca, dsa])
-            x_0 = x_1_pred
-
-    residuals = np.array(residuals)
-
-    return residuals
+def cartpole_residuals_multi_step(y, p, start_idx=0, end_idx=-1, steps=25):
+    return cartpole_multi_step_problem(y, start_idx, end_idx, steps).residuals(p)
 
 def cartpole_euler(y, p, start_idx=0, end_idx=-1):
     x = []
@@ -315,7 +287,8 @@ p_0 = [m_1_0, m_2_0, l_0, k_1_0, k_2_0, u_scale_0]
 bounds = ([0.001, 0.001, 0.001, 0.0, 0.0, 0.001], [1E5, 1E5, 1E5, 1E5, 1E5, 1E5])
 
 #res = least_squares(lambda p: cartpole_residuals_one_step(y, p), p_0, bounds=bounds, verbose=2)
-res = least_squares(lambda p: cartpole_residuals_multi_step(y, p, file_start_index, file_end_index), p_0, bounds=bounds, verbose=2)
+problem = cartpole_multi_step_problem(y, file_start_index, file_end_index)
+res = least_squares(problem.residuals, p_0, jac=problem.jacobian, bounds=bounds, verbose=2)
 print('Results')
 print(res.x)
 
@@ -0,0 +1,183 @@
+"""
+Batched multi-step residuals with analytic Jacobian for the least squares system identification scripts.
+
+All segments of a recording are integrated at once (explicit Euler, as in cartpole_residuals_multi_step),
+together with the sensitivities of the predicted states to the parameters, dS/dt = df/dx S + df/dp.
+The Jacobian of the residuals is then exact and scipy.optimize.least_squares needs no finite differences.
+
+Parameters p are [m_pole, m_cart, L, M_fric, J_fric(, u_scale)], as in f_cartpole of the scripts.
+States are [position, positionD, angle, angleD].
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.optimize import least_squares
+
+POSITION, POSITIOND, ANGLE, ANGLED = range(4)
+
+
+def wrap_angle_rad(angle):
+    return np.mod(angle + np.pi, 2 * np.pi) - np.pi
+
+
+def cartpole_ode_with_derivatives(x, u, p, k=4.0 / 3.0, g=9.81):
+    """
+    Right hand side of the cartpole ODE for a batch of states x (N x 4), inputs u (N) and parameters p,
+    with its derivatives with respect to the states (N x 4 x 4) and the parameters (N x 4 x len(p)).
+
+    Same equations as _cartpole_ode in CartPole/cartpole_model.py (with force u * u_scale);
+    u_scale is 1 if p has only 5 elements.
+    """
+    m, M, L, M_fric, J_fric = p[:5]
+    u_scale = p[5] if len(p) > 5 else 1.0
+    K = k + 1.0
+
+    positionD, angle, angleD = x[:, POSITIOND], x[:, ANGLE], x[:, ANGLED]
+    ca, sa = np.cos(angle), np.sin(angle)
+    force = u * u_scale
+
+    A = K * (M + m) - m * ca ** 2
+    N = m * g * sa * ca - J_fric * angleD * ca / L + K * (-m * L * angleD ** 2 * sa - M_fric * positionD + force)
+    positionDD = N / A
+    B = g * sa + positionDD * ca - J_fric * angleD / (m * L)
+    angleDD = B / (K * L)
+
+    f = np.stack((positionD, positionDD, angleD, angleDD), axis=-1)
+
+    # Derivatives with respect to the state
+    dpositionDD_dangle = (m * g * (ca ** 2 - sa ** 2) + J_fric * angleD * sa / L - K * m * L * angleD ** 2 * ca
+                          - positionDD * 2.0 * m * ca * sa) / A
+    dpositionDD_dangleD = (-J_fric * ca / L - 2.0 * K * m * L * angleD * sa) / A
+    dpositionDD_dpositionD = -K * M_fric / A
+
+    f_x = np.zeros(x.shape + (4,))
+    f_x[:, POSITION, POSITIOND] = 1.0
+    f_x[:, ANGLE, ANGLED] = 1.0
+    f_x[:, POSITIOND, POSITIOND] = dpositionDD_dpositionD
+    f_x[:, POSITIOND, ANGLE] = dpositionDD_dangle
+    f_x[:, POSITIOND, ANGLED] = dpositionDD_dangleD
+    f_x[:, ANGLED, POSITIOND] = dpositionDD_dpositionD * ca / (K * L)
+    f_x[:, ANGLED, ANGLE] = (g * ca + dpositionDD_dangle * ca - positionDD * sa) / (K * L)
+    f_x[:, ANGLED, ANGLED] = (dpositionDD_dangleD * ca - J_fric / (m * L)) / (K * L)
+
+    # Derivatives with respect to the parameters
+    dA_dp = [K - ca ** 2, K, 0.0, 0.0, 0.0, 0.0]
+    dN_dp = [
+        g * sa * ca - K * L * angleD ** 2 * sa,
+        0.0,
+        J_fric * angleD * ca / L ** 2 - K * m * angleD ** 2 * sa,
+        -K * positionD,
+        -angleD * ca / L,
+        K * u,
+    ]
+    dB_extra_dp = [J_fric * angleD / (m ** 2 * L), 0.0, J_fric * angleD / (m * L ** 2), 0.0, -angleD / (m * L), 0.0]
+
+    f_p = np.zeros(x.shape + (len(p),))
+    for i in range(len(p)):
+        dpositionDD_dp = (dN_dp[i] - positionDD * dA_dp[i]) / A
+        f_p[:, POSITIOND, i] = dpositionDD_dp
+        f_p[:, ANGLED, i] = (dpositionDD_dp * ca + dB_extra_dp[i]) / (K * L)
+    f_p[:, ANGLED, 2] -= B / (K * L ** 2)
+
+    return f, f_x, f_p
+
+
+class MultiStepEulerResiduals:
+    """
+    Residuals of predicting `steps` steps ahead with explicit Euler from each of the segments starting
+    at start_idx, start_idx + stride, ... of a recording, with their Jacobian with respect to the parameters.
+
+    Step j (1..steps) of a segment starting at row i predicts row i + j with the input of row i + j - 1 + input_offset.
+    Residuals are ordered segment, step, component (of `components`), weighted by `weights`.
+    Residuals and Jacobian are computed together and cached for the last parameters,
+    as least_squares asks for them one after the other.
+    """
+
+    def __init__(self, time, states, u, start_idx=0, end_idx=-1, steps=20, stride=None, input_offset=0,
+                 weights=(1.0, 1.0, 1.0, 1.0), components=(POSITION, POSITIOND, ANGLE, ANGLED),
+                 parameters_history=None):
+        if end_idx == -1:
+            end_idx = len(time)
+        if stride is None:
+            stride = steps + 1
+        starts = np.arange(start_idx, end_idx - steps, stride)
+        rows = starts[:, np.newaxis] + np.arange(steps + 1)  # segments x (steps + 1)
+
+        time, states, u = np.asarray(time, dtype=np.float64), np.asarray(states, dtype=np.float64), np.asarray(u, dtype=np.float64)
+        self.steps = steps
+        self.x_0 = states[starts]
+        self.x_observed = states[rows[:, 1:]]
+        self.dt = time[rows[:, 1:]] - time[rows[:, :-1]]
+        self.u = u[rows[:, :-1] + input_offset]
+        self.weights = np.asarray(weights, dtype=np.float64)[list(components)]
+        self.components = list(components)
+        self.parameters_history = parameters_history
+
+        self._cached_p = None
+        self._cached = None
+
+    def predict(self, p, with_sensitivities=False):
+        """States predicted for all segments (segments x (steps + 1) x 4), the initial ones included"""
+        p = np.asarray(p, dtype=np.float64)
+        number_of_segments = len(self.x_0)
+        x = np.empty((number_of_segments, self.steps + 1, 4))
+        x[:, 0] = self.x_0
+        S = np.zeros((number_of_segments, self.steps + 1, 4, len(p)))
+        for j in range(self.steps):
+            f, f_x, f_p = cartpole_ode_with_derivatives(x[:, j], self.u[:, j], p)
+            dt = self.dt[:, j, np.newaxis]
+            x[:, j + 1] = x[:, j] + dt * f
+            x[:, j + 1, ANGLE] = wrap_angle_rad(x[:, j + 1, ANGLE])
+            if with_sensitivities:
+                S[:, j + 1] = S[:, j] + dt[..., np.newaxis] * (f_x @ S[:, j] + f_p)
+        if with_sensitivities:
+            return x, S
+        return x
+
+    def _evaluate(self, p):
+        p = np.asarray(p, dtype=np.float64)
+        if self._cached_p is None or not np.array_equal(p, self._cached_p):
+            if self.parameters_history is not None:
+                self.parameters_history.append(p)
+            x, S = self.predict(p, with_sensitivities=True)
+            error = x[:, 1:] - self.x_observed
+            error[..., ANGLE] = wrap_angle_rad(error[..., ANGLE])
+            residuals = (error[..., self.components] * self.weights).ravel()
+            jacobian = (S[:, 1:, self.components] * self.weights[:, np.newaxis]).reshape(-1, len(p))
+            self._cached_p, self._cached = p.copy(), (residuals, jacobian)
+        return self._cached
+
+    def residuals(self, p):
+        return self._evaluate(p)[0]
+
+    def jacobian(self, p):
+        return self._evaluate(p)[1]
+
+
+def sample_initial_parameters(p_0, number, bounds=(-np.inf, np.inf), spread=10.0, rng=None):
+    """
+    p_0 and number - 1 parameter vectors sampled log-uniformly between p_0 / spread and p_0 * spread
+    (for each element, keeping its sign), clipped to the bounds, as starting points of multi-start fits.
+    """
+    rng = np.random.default_rng(rng)
+    p_0 = np.asarray(p_0, dtype=np.float64)
+    factors = np.exp(rng.uniform(-np.log(spread), np.log(spread), size=(number - 1, len(p_0))))
+    p_0s = np.concatenate((p_0[np.newaxis], p_0 * factors))
+    lower, upper = np.broadcast_to(bounds[0], p_0.shape), np.broadcast_to(bounds[1], p_0.shape)
+    # Strictly inside, least_squares rejects starting points on the bounds
+    return np.clip(p_0s, np.nextafter(lower, np.inf), np.nextafter(upper, -np.inf))
+
+
+def _fit(problem, p_0, least_squares_kwargs):
+    return least_squares(problem.residuals, p_0, jac=problem.jacobian, **least_squares_kwargs)
+
+
+def multi_start_least_squares(problem: MultiStepEulerResiduals, p_0s, processes=None, **least_squares_kwargs):
+    """
+    Fits the parameters from each of the starting points p_0s in parallel processes.
+    Returns the results sorted by cost, the best first.
+    """
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = list(executor.map(_fit, [problem] * len(p_0s), p_0s, [least_squares_kwargs] * len(p_0s)))
+    return sorted(results, key=lambda result: result.cost)
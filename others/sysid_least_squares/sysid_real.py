@@ -8,6 +8,8 @@ from scipy.integrate import solve_ivp
 from scipy.interpolate import interp1d
 from scipy.optimize import least_squares
 
+from sysid_batched import MultiStepEulerResiduals, multi_start_least_squares, sample_initial_parameters
+
 def read_data(file):
     data = []
     with open(file, newline='') as csvfile:
@@ -158,54 +160,20 @@ def solve_cartpole_auto_ic(y, p, start_idx=0, end_idx=-1):
 
 # Save off parameters for plotting evolution
 p_saved = []
+def cartpole_multi_step_problem(y, start_idx=0, end_idx=-1, steps=20):
+    """Residuals (of angle and angleD) of all segments integrated as one batch, with analytic Jacobian"""
+    states = y[:, [n_to_c['position'], n_to_c['positionD'], n_to_c['angle'], n_to_c['angleD']]]
+    return MultiStepEulerResiduals(y[:, n_to_c['time']], states, y[:, n_to_c['Q']], start_idx, end_idx,
+                                   steps=steps, input_offset=1, components=(2, 3), parameters_history=p_saved)
+
 # Calculate residuals for one step using all initial condition pairs
 def cartpole_residuals_multi_step(y, p, start_idx=0, end_idx=-1, steps=20, return_plot=False):
-    p_saved.append(p)
-    residuals = []
-    if end_idx == -1:
-        end_idx = len(y)
-
-    if return_plot:
-        plot_vars = []
-
-    for i in range(start_idx, end_idx-steps, steps+1):
-        x_0 = [y[i, n_to_c['position']],
-               y[i, n_to_c['positionD']],
-               y[i, n_to_c['angle']],
-               y[i, n_to_c['angleD']]]
-        if return_plot:
-            plot_vars.append(x_0)
-
-        #print('start_point') 
-        for j in range(1, steps+1):
-            u = y[i+j, n_to_c['Q']]
-            dx_dt = f_cartpole(x_0, u, p)
-            
-            dt = y[i+j, n_to_c['time']] - y[i+j-1, n_to_c['time']]
-            x_1_obsv = [y[i+j, n_to_c['position']],
-                        y[i+j, n_to_c['positionD']],
-                        y[i+j, n_to_c['angle']],
-                        y[i+j, n_to_c['angleD']]]
-            x_1_pred = x_0 + dt * dx_dt
-            wrap_angle_rad_inplace(x_1_pred[2:3])
-
-            if return_plot:
-                plot_vars.append(x_1_pred)
-
-            residual = x_1_pred - x_1_obsv
-            residual[0] *= 1
-            residual[2] = angle_distance(x_1_pred[2], x_1_obsv[2])
-            #print('hi')
-            #print(dx_dt)
-            #print(x_1_pred)
-            residuals.extend(residual[[2,3]])
-            #residuals.append(residual[0])
-            x_0 = x_1_pred
-
+    problem = cartpole_multi_step_problem(y, start_idx, end_idx, steps)
+    residuals = problem.residuals(p)
     if not return_plot:
-        return np.array(residuals)
+        return residuals
     else:
-        return np.array(residuals), np.array(plot_vars)
+        return residuals, problem.predict(p).reshape(-1, 4)
 
 # Plot the results with an animation or as a final figure
 def plot_progression(save=False):
@@ -409,74 +377,81 @@ def plot_final_multistep(p):
     plt.show()
 
 
-# files
-#file = 'save.csv'
-#file_start_index = 95
-#file_animate = False # solve_ivp gets stuck animating this parameter progression
-
-#file = 'save2.csv'
-#file_start_index = 0
-#file_animate = True
-
-#file = 'cartpole-2021-07-05-20-37-17.csv'
-file = 'pole_swinging_left_cartpole-2021-07-05-20-51-00.csv'
-file_start_index = 600
-file_end_index = 1000
-file_animate = True
-
-file = 'cartpole-2021-07-13-18-04-41.csv'
-file_start_index = 5000
-file_end_index = 6000
-file_animate = True
-
-#file = 'cartpole-2021-07-13-17-59-28.csv'
-#file_start_index = 1000
-#file_end_index = 1500
-#file_animate = False
-
-y, n_to_c = read_data(file)
-
-#print(y[678:700, n_to_c['angle']])
-#wrap_angle_rad_inplace(y[:, n_to_c['angle']])
-#print(y[678:700, n_to_c['angle']])
-
-filt_data(y)
-
-# Solve the problem
-m_1_0 = 1.0
-m_2_0 = 1.0
-l_0   = 1.0
-k_1_0 = 0.001
-k_2_0 = 0.001
-u_scale_0 = 2.0
-p_0 = [m_1_0, m_2_0, l_0, k_1_0, k_2_0, u_scale_0]
-bounds = ([0.001, 0.001, 0.001, 0.001, 0.001, 0.001], [1E5, 1E5, 1E5, 1E5, 1E5, 1E5])
-
-res = least_squares(lambda p: cartpole_residuals_multi_step(y, p, file_start_index, file_end_index, steps=15), p_0, bounds=bounds, verbose=2, loss='soft_l1', f_scale=0.1)
-
-for i in range(20, 100, 10):
-    print('steps: {}'.format(i))
-    res = least_squares(lambda p: cartpole_residuals_multi_step(y, p, file_start_index, file_end_index, steps=i), res.x, bounds=bounds, verbose=2, loss='soft_l1', f_scale=0.1)
-
-print('Results')
-print(res.x)
-
-# True parameters for comparison
-print('True')
-#p_true = [0.087, 0.23, 0.1975, 6.34, 0.00025]
-p_true = [0.087, 0.23, 0.1975, 10000.0, 0.00025, 1.0]
-
-print(p_true)
-print('Percent error')
-print(100 * (res.x / p_true - 1))
-
-if file_animate:
-    #plot_progression()
-    plot_progression_multistep()
-    #plot_progression(save=True)
-
-#plot_final(res.x)
-plot_final(res.x)
-#res.x[4] *= 1000
-#plot_final(res.x)
-#plot_final(p_true)
+# Guarded, as the processes of the multi-start fit import this module
+if __name__ == '__main__':
+    # files
+    #file = 'save.csv'
+    #file_start_index = 95
+    #file_animate = False # solve_ivp gets stuck animating this parameter progression
+
+    #file = 'save2.csv'
+    #file_start_index = 0
+    #file_animate = True
+
+    #file = 'cartpole-2021-07-05-20-37-17.csv'
+    file = 'pole_swinging_left_cartpole-2021-07-05-20-51-00.csv'
+    file_start_index = 600
+    file_end_index = 1000
+    file_animate = True
+
+    file = 'cartpole-2021-07-13-18-04-41.csv'
+    file_start_index = 5000
+    file_end_index = 6000
+    file_animate = True
+    file_multi_starts = 8
+
+    #file = 'cartpole-2021-07-13-17-59-28.csv'
+    #file_start_index = 1000
+    #file_end_index = 1500
+    #file_animate = False
+
+    y, n_to_c = read_data(file)
+
+    #print(y[678:700, n_to_c['angle']])
+    #wrap_angle_rad_inplace(y[:, n_to_c['angle']])
+    #print(y[678:700, n_to_c['angle']])
+
+    filt_data(y)
+
+    # Solve the problem
+    m_1_0 = 1.0
+    m_2_0 = 1.0
+    l_0   = 1.0
+    k_1_0 = 0.001
+    k_2_0 = 0.001
+    u_scale_0 = 2.0
+    p_0 = [m_1_0, m_2_0, l_0, k_1_0, k_2_0, u_scale_0]
+    bounds = ([0.001, 0.001, 0.001, 0.001, 0.001, 0.001], [1E5, 1E5, 1E5, 1E5, 1E5, 1E5])
+
+    # Fit from several starting points in parallel processes, then refine the best one with growing horizon
+    problem = cartpole_multi_step_problem(y, file_start_index, file_end_index, steps=15)
+    p_0s = sample_initial_parameters(p_0, file_multi_starts, bounds=bounds, rng=0)
+    res = multi_start_least_squares(problem, p_0s, bounds=bounds, loss='soft_l1', f_scale=0.1)[0]
+
+    for i in range(20, 100, 10):
+        print('steps: {}'.format(i))
+        problem = cartpole_multi_step_problem(y, file_start_index, file_end_index, steps=i)
+        res = least_squares(problem.residuals, res.x, jac=problem.jacobian, bounds=bounds, verbose=2, loss='soft_l1', f_scale=0.1)
+
+    print('Results')
+    print(res.x)
+
+    # True parameters for comparison
+    print('True')
+    #p_true = [0.087, 0.23, 0.1975, 6.34, 0.00025]
+    p_true = [0.087, 0.23, 0.1975, 10000.0, 0.00025, 1.0]
+
+    print(p_true)
+    print('Percent error')
+    print(100 * (res.x / p_true - 1))
+
+    if file_animate:
+        #plot_progression()
+        plot_progression_multistep()
+        #plot_progression(save=True)
+
+    #plot_final(res.x)
+    plot_final(res.x)
+    #res.x[4] *= 1000
+    #plot_final(res.x)
+    #plot_final(p_true)
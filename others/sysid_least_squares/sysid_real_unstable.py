@@ -10,6 +10,8 @@ from scipy.optimize import least_squares
 
 from numba import jit
 
+from sysid_batched import MultiStepEulerResiduals, multi_start_least_squares, sample_initial_parameters
+
 def read_data(file):
     data = []
     with open(file, newline='') as csvfile:
@@ -193,42 +195,19 @@ def solve_cartpole_reinit(y, p, start_idx=0, end_idx=-1, steps=20):
 
 # Save off parameters for plotting evolution
 p_saved = []
-@jit(nopython=True)
-def cartpole_residuals_multi_step_numba(y, p, start_idx=0, end_idx=-1, steps=20):
-    #p_saved.append(p)
-    residuals = []
-    if end_idx == -1:
-        end_idx = len(y)
-
-    for i in range(start_idx, end_idx-steps, int((steps+1)/1)):
-        x_0 = np.array([y[i, position_idx],
-                        y[i, positionD_idx],
-                        y[i, angle_idx],
-                        y[i, angleD_idx]])
-
-        #print('start_point') 
-        for j in range(1, steps+1):
-            u = y[i+j, Q_idx]
-            dx_dt = f_cartpole(x_0, u, p)
-            
-            dt = y[i+j, time_idx] - y[i+j-1, time_idx]
-            x_1_obsv = np.array([y[i+j, position_idx],
-                                 y[i+j, positionD_idx],
-                                 y[i+j, angle_idx],
-                                 y[i+j, angleD_idx]])
-            x_1_pred = x_0 + dt * dx_dt
-            wrap_angle_rad_inplace(x_1_pred[2:3])
-
-            residual = x_1_pred - x_1_obsv
-            residual[2] = angle_distance(x_1_pred[2], x_1_obsv[2])
-            # These are written this way so individual residuals can be commented out
-            residuals.append(file_residual_weight[0]*residual[0])
-            residuals.append(file_residual_weight[1]*residual[1])
-            residuals.append(file_residual_weight[2]*residual[2])
-            residuals.append(file_residual_weight[3]*residual[3])
-            x_0 = x_1_pred
-
-    return np.array(residuals)
+def cartpole_multi_step_problem(y, start_idx=0, end_idx=-1, steps=20):
+    """Weighted residuals of all segments integrated as one batch, with analytic Jacobian (see sysid_batched.py)"""
+    states = y[:, [position_idx, positionD_idx, angle_idx, angleD_idx]]
+    return MultiStepEulerResiduals(y[:, time_idx], states, y[:, Q_idx], start_idx, end_idx, steps=steps,
+                                   input_offset=1, weights=file_residual_weight, parameters_history=p_saved)
+
+def cartpole_residuals_multi_step(y, p, start_idx=0, end_idx=-1, steps=20, return_plot=False):
+    problem = cartpole_multi_step_problem(y, start_idx, end_idx, steps)
+    residuals = problem.residuals(p)
+    if not return_plot:
+        return residuals
+    else:
+        return residuals, problem.predict(p).reshape(-1, 4)
 
 # Plot the results with an animation or as a final figure
 def plot_progression(save=False):
@@ -500,69 +479,73 @@ def plot_final_multistep(p):
     plt.show()
 
 
-# files
-file = 'cartpole-2021-07-13-17-59-28.csv'
-file_start_index = 0
-file_end_index = 1000 + 50
-file_end_plot_index = 2000
-# file_end_plot_index = 4316
-file_plot_steps = 100
-file_animate = False
-file_residual_weight = np.array([0.1, 5.0, 20.0, 0.01])
-
-y, n_to_c = read_data(file)
-
-position_idx = n_to_c['position']
-positionD_idx = n_to_c['positionD']
-angle_idx = n_to_c['angle']
-angleD_idx = n_to_c['angleD']
-time_idx = n_to_c['time']
-Q_idx = n_to_c['Q']
-
-filt_data(y)
-
-# Solve the problem
-m_1_0 = 1.0
-m_2_0 = 1.0
-l_0   = 1.0
-k_1_0 = 1.0
-k_2_0 = 1.0
-u_scale_0 = 1.0
-p_0 = [m_1_0, m_2_0, l_0, k_1_0, k_2_0]
-#p_0 =
-bounds = ([1E-5]*5, [np.inf]*5)
-bounds = ([-1]*5, [1]*5)
-
-jac = '3-point'
-method = 'trf'
-loss = 'soft_l1'
-f_scale = 1.5
-
-res = least_squares(lambda p: cartpole_residuals_multi_step_numba(y, p, file_start_index, file_end_index, steps=2),
-                    p_0, jac=jac, method=method, verbose=1, loss=loss, f_scale=f_scale)
-print(res.x)
-
-for i in range(3, 115, 1):
-    print('steps: {}'.format(i))
-    res = least_squares(lambda p: cartpole_residuals_multi_step_numba(y, p, file_start_index, file_end_index, steps=i),
-                        res.x, jac=jac, method=method, verbose=1, loss=loss, f_scale=f_scale)
+# Guarded, as the processes of the multi-start fit import this module
+if __name__ == '__main__':
+    # files
+    file = 'cartpole-2021-07-13-17-59-28.csv'
+    file_start_index = 0
+    file_end_index = 1000 + 50
+    file_end_plot_index = 2000
+    # file_end_plot_index = 4316
+    file_plot_steps = 100
+    file_animate = False
+    file_residual_weight = np.array([0.1, 5.0, 20.0, 0.01])
+    file_multi_starts = 8
+
+    y, n_to_c = read_data(file)
+
+    position_idx = n_to_c['position']
+    positionD_idx = n_to_c['positionD']
+    angle_idx = n_to_c['angle']
+    angleD_idx = n_to_c['angleD']
+    time_idx = n_to_c['time']
+    Q_idx = n_to_c['Q']
+
+    filt_data(y)
+
+    # Solve the problem
+    m_1_0 = 1.0
+    m_2_0 = 1.0
+    l_0   = 1.0
+    k_1_0 = 1.0
+    k_2_0 = 1.0
+    u_scale_0 = 1.0
+    p_0 = [m_1_0, m_2_0, l_0, k_1_0, k_2_0]
+    #p_0 =
+    bounds = ([1E-5]*5, [np.inf]*5)
+    bounds = ([-1]*5, [1]*5)
+
+    method = 'trf'
+    loss = 'soft_l1'
+    f_scale = 1.5
+
+    # Fit from several starting points in parallel processes, then refine the best one with growing horizon
+    problem = cartpole_multi_step_problem(y, file_start_index, file_end_index, steps=2)
+    p_0s = sample_initial_parameters(p_0, file_multi_starts, rng=0)
+    res = multi_start_least_squares(problem, p_0s, method=method, loss=loss, f_scale=f_scale)[0]
     print(res.x)
 
-print('Results')
-print(res.x)
+    for i in range(3, 115, 1):
+        print('steps: {}'.format(i))
+        problem = cartpole_multi_step_problem(y, file_start_index, file_end_index, steps=i)
+        res = least_squares(problem.residuals, res.x, jac=problem.jacobian, method=method, verbose=1, loss=loss, f_scale=f_scale)
+        print(res.x)
+
+    print('Results')
+    print(res.x)
 
 
-if file_animate:
-    #plot_progression()
-    plot_progression_multistep()
-    #plot_progression(save=True)
+    if file_animate:
+        #plot_progression()
+        plot_progression_multistep()
+        #plot_progression(save=True)
 
-#plot_final(res.x)
+    #plot_final(res.x)
 
-#params = [-0.621, 0.597, 0.117, 0.938, -0.075049]
+    #params = [-0.621, 0.597, 0.117, 0.938, -0.075049]
 
-plot_brunton(res.x, save=False)
+    plot_brunton(res.x, save=False)
 
-y_unfilt, n_to_c = read_data(file)
-#plot_final_multistep(res.x)
+    y_unfilt, n_to_c = read_data(file)
+    #plot_final_multistep(res.x)
 
@@ -156,6 +156,33 @@ class random_experiment_setter:
 
         return CartPoleInstance # ready to run a random experiment
 
+    def sample_initial_states(self, number_of_states=1, rng=None):
+        """
+        Initial states (number_of_states x 6) and initial target positions drawn as in set,
+        without generating the random target trace and setting up the CartPole - for cheap resets of episodes.
+        """
+        if rng is None:
+            rng = self.rng
+
+        initial_state_stub = create_cartpole_state()
+
+        initial_state_stub[POSITION_IDX] = self.position_init
+        initial_state_stub[POSITIOND_IDX] = self.positionD_init
+        initial_state_stub[ANGLE_IDX] = self.angle_init
+        initial_state_stub[ANGLED_IDX] = self.angleD_init
+
+        initial_states = generate_random_initial_states(initial_state_stub, self.init_limits, rng, number_of_states)
+
+        if self.start_at_target:
+            target_positions = initial_states[:, POSITION_IDX].copy()
+        elif self.target_position_init is None:
+            target_positions = self.track_fraction_usable_for_target_position * TrackHalfLength * \
+                               rng.uniform(-1.0, 1.0, size=number_of_states).astype(np.float32)
+        else:
+            target_positions = np.full(number_of_states, self.target_position_init, dtype=np.float32)
+
+        return initial_states, target_positions
+
 def generate_random_initial_state(init_state_stub, init_limits, rng):
 
     position_init_limits, positionD_init_limits, angle_init_limits, angleD_init_limits = init_limits
@@ -192,6 +219,46 @@ def generate_random_initial_state(init_state_stub, init_limits, rng):
 
     return initial_state_post
 
+
+def generate_random_initial_states(init_state_stub, init_limits, rng, number_of_states):
+    """
+    Vectorized version of generate_random_initial_state: number_of_states independent samples as (number_of_states x 6) array.
+    Draws random numbers in a different order - for the same rng the first sample is not equal to generate_random_initial_state.
+    """
+
+    position_init_limits, positionD_init_limits, angle_init_limits, angleD_init_limits = init_limits
+
+    initial_states = np.zeros((number_of_states, len(init_state_stub)), dtype=np.float32)
+
+    if np.isnan(init_state_stub[POSITION_IDX]):
+        initial_states[:, POSITION_IDX] = rng.uniform(
+            low=-1.0, high=1.0, size=number_of_states) * TrackHalfLength * position_init_limits
+    else:
+        initial_states[:, POSITION_IDX] = init_state_stub[POSITION_IDX]
+
+    if np.isnan(init_state_stub[POSITIOND_IDX]):
+        initial_states[:, POSITIOND_IDX] = rng.uniform(low=-1.0, high=1.0, size=number_of_states) * TrackHalfLength * positionD_init_limits
+    else:
+        initial_states[:, POSITIOND_IDX] = init_state_stub[POSITIOND_IDX]
+
+    if np.isnan(init_state_stub[ANGLE_IDX]):
+        side = np.where(rng.uniform(size=number_of_states) > 0.5, 1.0, -1.0)
+        initial_states[:, ANGLE_IDX] = side * rng.uniform(low=angle_init_limits[0], high=angle_init_limits[1], size=number_of_states) * (np.pi / 180.0)
+    else:
+        initial_states[:, ANGLE_IDX] = init_state_stub[ANGLE_IDX]
+
+    if np.isnan(init_state_stub[ANGLED_IDX]):
+        initial_states[:, ANGLED_IDX] = rng.uniform(low=-1.0, high=1.0, size=number_of_states) * angleD_init_limits * (np.pi / 180.0)
+    else:
+        initial_states[:, ANGLED_IDX] = init_state_stub[ANGLED_IDX]
+
+    # Add cos/sin values to state
+    initial_states[:, ANGLE_COS_IDX] = np.cos(initial_states[:, ANGLE_IDX])
+    initial_states[:, ANGLE_SIN_IDX] = np.sin(initial_states[:, ANGLE_IDX])
+
+    return initial_states
+
+
 def run_data_generator(run_for_ML_Pipeline=False, record_path=None):
     config = load_config("config_data_gen.yml")
 